@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+Where the collision code gets pygame from. Without pygame, or with
+PROTOTYPE_HEADLESS set in the environment, pygame is None and Rect, Sprite
+and Group are plain Python stand ins, enough to run the simulation on a
+machine without SDL and without paying for the pygame import.
+"""
+import os
+from Geometry.Rect import Rect as PlainRect
+
+pygame = None
+if not os.environ.get('PROTOTYPE_HEADLESS'):
+    try:
+        import pygame
+    except ImportError:
+        pygame = None
+
+HEADLESS = pygame is None
+
+
+class PlainSprite(object):
+    """
+
+    The part of pygame.sprite.Sprite the simulation uses.
+    """
+
+    def __init__(self, *groups):
+        self.groups = set()
+        for group in groups:
+            group.add(self)
+
+    def update(self, *args, **kwargs):
+        pass
+
+    def kill(self):
+        for group in list(self.groups):
+            group.remove(self)
+
+
+class PlainGroup(object):
+    """
+
+    The part of pygame.sprite.Group the simulation uses, subclasses can
+    hook add_internal and remove_internal like with pygame.
+    """
+
+    def __init__(self, *sprites):
+        self.sprite_dict = {}
+        self.add(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        self.sprite_dict[sprite] = None
+
+    def remove_internal(self, sprite):
+        del self.sprite_dict[sprite]
+
+    def add(self, *sprites):
+        for sprite in sprites:
+            if sprite not in self.sprite_dict:
+                self.add_internal(sprite)
+                if hasattr(sprite, 'groups'):
+                    sprite.groups.add(self)
+
+    def remove(self, *sprites):
+        for sprite in sprites:
+            if sprite in self.sprite_dict:
+                self.remove_internal(sprite)
+                if hasattr(sprite, 'groups'):
+                    sprite.groups.discard(self)
+
+    def sprites(self):
+        return list(self.sprite_dict)
+
+    def update(self, *args, **kwargs):
+        for sprite in self.sprites():
+            sprite.update(*args, **kwargs)
+
+    def draw(self, surface):
+        pass
+
+    def __iter__(self):
+        return iter(self.sprites())
+
+    def __len__(self):
+        return len(self.sprite_dict)
+
+    def __contains__(self, sprite):
+        return sprite in self.sprite_dict
+
+
+if HEADLESS:
+    Rect = PlainRect
+    Sprite = PlainSprite
+    Group = PlainGroup
+else:
+    Rect = pygame.Rect
+    Sprite = pygame.sprite.Sprite
+    Group = pygame.sprite.Group
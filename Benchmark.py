@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+Times the collision code on generated levels of growing size and with
+growing numbers of entities and platforms.
+
+    python3 Benchmark.py [--quick] [--out FILE] [--headless] [--seed N]
+
+The results are written as JSON (to stdout without --out), one record per
+function and input size with the calls made, ops/sec and the p50, p99 and
+mean time of a call in microseconds. --headless runs on the plain Python
+Rect instead of pygame's.
+"""
+import os
+import sys
+import json
+import time
+import random
+import platform
+
+if '--headless' in sys.argv:
+    os.environ.setdefault('PROTOTYPE_HEADLESS', '1')
+
+from Prototype import make_tileset_group, Player
+from Levels import random_level_group
+from Helpers import (scan_for_tiles_x, scan_for_tiles_y, closest_from_list_x,
+                     closest_from_list_y, scan_for_platforms_x,
+                     scan_for_platforms_y)
+from Broadphase import GridGroup
+from Physics import World, numpy
+from Backend import Sprite, Rect, HEADLESS
+from Trace import TRACE, OFF
+from Geometry.Vector2 import Vector2
+
+MAP_SIZES = [(96, 18), (384, 72), (1536, 288)]
+ENTITY_COUNTS = [1, 32, 256]
+PLATFORM_COUNTS = [0, 16, 256]
+QUICK_MAP_SIZES = [(96, 18), (384, 72)]
+QUICK_ENTITY_COUNTS = [1, 32]
+QUICK_PLATFORM_COUNTS = [0, 16]
+PROBES = 300
+FRAMES = 60
+
+
+class SyntheticPlatform(Sprite):
+    """
+
+    A platform sliding back and forth, enough for the platform scans.
+    @type x: int
+    @type y: int
+    @type distance: int
+    """
+
+    def __init__(self, x, y, distance):
+        Sprite.__init__(self)
+        self.rect = Rect(x, y, 96, 16)
+        self.info = {'normal': Vector2(1, 0)}
+        # the player reacts to the platforms it finds like to solid tiles
+        self.tile_info = {'type': 'solid'}
+        self.first_x = x
+        self.distance = distance
+
+    def update(self, *args):
+        self.rect.x += self.info['normal'].x * 2
+        if not self.first_x <= self.rect.x <= self.first_x + self.distance:
+            self.info['normal'].x = -self.info['normal'].x
+
+
+def make_level(size, seed):
+    """
+
+    @param size: tuple (width, height) in tiles of the first tileset
+    @type seed: int
+    @return: Prototype.TileSetsContainer
+    """
+    return make_tileset_group(random_level_group(size[0], size[1],
+                                                 seed=seed))
+
+
+def make_entities(tileset_group, count, rng):
+    """
+
+    Players in empty cells of the first tileset, moving every which way.
+    @type tileset_group: Prototype.TileSetsContainer
+    @type count: int
+    @type rng: random.Random
+    @return: list of Prototype.Player
+    """
+    tileset = tileset_group.tileset_list[0]
+    tile_size = tileset.size_info['tile']
+    map_size = tileset.size_info['map']
+    entities = []
+    while len(entities) < count:
+        x = rng.randrange(map_size.x)
+        y = rng.randrange(map_size.y - 2)
+        if tileset.get_tile_type(x, y) or tileset.get_tile_type(x, y + 1):
+            continue
+        # noinspection PyTypeChecker
+        player = Player(Vector2(x * tile_size.x + 4, y * tile_size.y),
+                        Vector2(20, 50), None, False)
+        player.velocity.x = rng.choice((-5, -3, 3, 5))
+        player.velocity.y = rng.choice((-14, -4, 0.9, 6, 15))
+        player.update_normal()
+        entities.append(player)
+    return entities
+
+
+def make_platforms(tileset_group, count, rng):
+    """
+
+    @type tileset_group: Prototype.TileSetsContainer
+    @type count: int
+    @type rng: random.Random
+    @return: Broadphase.GridGroup
+    """
+    area = tileset_group.tileset_list[0].rect
+    platforms = GridGroup()
+    for _ in range(count):
+        platforms.add(SyntheticPlatform(rng.randrange(area.width - 96),
+                                        rng.randrange(area.height - 16),
+                                        rng.randrange(32, 256)))
+    return platforms
+
+
+def time_calls(function, arguments):
+    """
+
+    @param function: callable
+    @param arguments: list of argument tuples, one call each
+    @return: list of nanoseconds per call
+    """
+    clock = time.perf_counter_ns
+    durations = []
+    for args in arguments:
+        start = clock()
+        function(*args)
+        durations.append(clock() - start)
+    return durations
+
+
+def percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def summarize(name, params, durations):
+    """
+
+    @type name: str
+    @type params: dict
+    @param durations: list of nanoseconds per call
+    @return: dict
+    """
+    ordered = sorted(durations)
+    total = sum(ordered)
+    return {
+        'name': name,
+        'params': params,
+        'calls': len(ordered),
+        'ops_per_sec': len(ordered) / (total / 1e9) if total else None,
+        'p50_us': percentile(ordered, 0.5) / 1000,
+        'p99_us': percentile(ordered, 0.99) / 1000,
+        'mean_us': total / len(ordered) / 1000
+    }
+
+
+def bench_map(size, seed):
+    """
+
+    The scanners, closest_from_list_* and Player.update against one map.
+    @param size: tuple (width, height) in tiles
+    @type seed: int
+    @return: list of result dicts
+    """
+    rng = random.Random(seed)
+    tileset_group = make_level(size, seed)
+    tileset = tileset_group.tileset_list[0]
+    tile_size = tileset.size_info['tile']
+    probes = make_entities(tileset_group, PROBES, rng)
+    platforms = GridGroup()
+    params = {'width': size[0], 'height': size[1], 'probes': PROBES}
+
+    def row_of(entity):
+        return entity.rect.centery // tile_size.y
+
+    def column_of(entity):
+        return entity.rect.centerx // tile_size.x
+
+    cases = [
+        ('scan_for_tiles_x', scan_for_tiles_x,
+         [(tileset, e) for e in probes]),
+        ('scan_for_tiles_y', scan_for_tiles_y,
+         [(tileset, e) for e in probes if e.info['normal'].y]),
+        ('closest_from_list_x', closest_from_list_x,
+         [(scan_for_tiles_x(tileset, e), e) for e in probes]),
+        ('closest_from_list_y', closest_from_list_y,
+         [(scan_for_tiles_y(tileset, e), e) for e in probes
+          if e.info['normal'].y]),
+        ('TileSet.scan_x_right', tileset.scan_x_right,
+         [(row_of(e), column_of(e) + 1, e) for e in probes]),
+        ('TileSet.scan_x_left', tileset.scan_x_left,
+         [(row_of(e), column_of(e) - 1, e) for e in probes]),
+        ('TileSet.scan_y_bottom', tileset.scan_y_bottom,
+         [(column_of(e), row_of(e) + 1, e) for e in probes]),
+        ('TileSet.scan_y_top', tileset.scan_y_top,
+         [(column_of(e), row_of(e) - 1, e) for e in probes]),
+        ('Player.update', lambda e: e.update(platforms, tileset_group),
+         [(e,) for e in probes])
+    ]
+    results = []
+    for name, function, arguments in cases:
+        # the first call of a tile fills the tile cache, keep it out of the
+        # timing
+        if name != 'Player.update':
+            time_calls(function, arguments)
+        results.append(summarize(name, params,
+                                 time_calls(function, arguments)))
+    return results
+
+
+def bench_crowd(entity_count, platform_count, seed):
+    """
+
+    scan_for_platforms_* and whole frame steps with many entities and
+    platforms on a mid sized map.
+    @type entity_count: int
+    @type platform_count: int
+    @type seed: int
+    @return: list of result dicts
+    """
+    rng = random.Random(seed)
+    tileset_group = make_level(MAP_SIZES[1], seed)
+    entities = make_entities(tileset_group, entity_count, rng)
+    platforms = make_platforms(tileset_group, platform_count, rng)
+    params = {'width': MAP_SIZES[1][0], 'height': MAP_SIZES[1][1],
+              'entities': entity_count, 'platforms': platform_count}
+    results = [
+        summarize('scan_for_platforms_x', params,
+                  time_calls(scan_for_platforms_x,
+                             [(e, platforms) for e in entities])),
+        summarize('scan_for_platforms_y', params,
+                  time_calls(scan_for_platforms_y,
+                             [(e, platforms) for e in entities]))
+    ]
+
+    world = World(tileset_group, platforms)
+    for entity in entities:
+        world.add(entity)
+
+    def step():
+        for entity in entities:
+            entity.velocity.x = rng.choice((-5, -3, 0, 3, 5))
+            if entity.info['on_ground'] and rng.random() < 0.05:
+                entity.velocity.y = -14
+                entity.info['on_ground'] = False
+        platforms.update(entities)
+        world.step()
+
+    timings = time_calls(step, [()] * FRAMES)
+    # the world only builds its tile grids once it steps a batch in bulk,
+    # below min_batch entities or without numpy they go one by one
+    frame_params = dict(params, batched=world.grids is not None)
+    results.append(summarize('frame_step', frame_params, timings))
+    return results
+
+
+def run(quick=False, seed=0, progress=None):
+    """
+
+    @param quick: bool only the smaller sizes
+    @type seed: int
+    @param progress: file to report progress to, or None
+    @return: dict with the environment and the list of results
+    """
+    map_sizes = QUICK_MAP_SIZES if quick else MAP_SIZES
+    entity_counts = QUICK_ENTITY_COUNTS if quick else ENTITY_COUNTS
+    platform_counts = QUICK_PLATFORM_COUNTS if quick else PLATFORM_COUNTS
+    results = []
+    # trace events are still kept, printing them is left out of the timing
+    echo_level = TRACE.echo_level
+    TRACE.echo_level = OFF
+    try:
+        for size in map_sizes:
+            if progress:
+                print('map', size, file=progress)
+            results.extend(bench_map(size, seed))
+        for entity_count in entity_counts:
+            for platform_count in platform_counts:
+                if progress:
+                    print('entities', entity_count, 'platforms',
+                          platform_count, file=progress)
+                results.extend(bench_crowd(entity_count, platform_count,
+                                           seed))
+    finally:
+        TRACE.echo_level = echo_level
+    return {
+        'python': platform.python_version(),
+        'backend': 'plain' if HEADLESS else 'pygame',
+        'numpy': numpy is not None,
+        'seed': seed,
+        'results': results
+    }
+
+
+def main(argv):
+    out = None
+    seed = 0
+    args = iter(argv)
+    for arg in args:
+        if arg == '--out':
+            out = next(args)
+        elif arg == '--seed':
+            seed = int(next(args))
+    report = run('--quick' in argv, seed, sys.stderr)
+    if out is None:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    else:
+        with open(out, 'w') as out_file:
+            json.dump(report, out_file, indent=1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# coding=utf-8
+from Backend import Group
+from Geometry.Vector2 import Vector2
+from Geometry.Contact import Contact
+
+
+class SpatialGrid(object):
+    """
+
+    Uniform grid for moving things with a rect. Every object is kept in the
+    cells its rect covers and is only moved between cells when its rect
+    crosses into other ones.
+    @param cell_size: int
+    """
+
+    def __init__(self, cell_size=128):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.ranges = {}
+
+    def cell_range(self, rect):
+        """
+
+        @type rect: pygame.Rect
+        @return: tuple (first x, first y, last x, last y) all included
+        """
+        return (int(rect.left // self.cell_size),
+                int(rect.top // self.cell_size),
+                int((rect.right - 1) // self.cell_size),
+                int((rect.bottom - 1) // self.cell_size))
+
+    def insert(self, obj):
+        """
+
+        @param obj: anything with a rect
+        """
+        cell_range = self.cell_range(obj.rect)
+        self.ranges[obj] = cell_range
+        self.add_to_cells(obj, cell_range)
+
+    def remove(self, obj):
+        """
+
+        @param obj: anything given to insert() before
+        """
+        cell_range = self.ranges.pop(obj, None)
+        if cell_range is not None:
+            self.remove_from_cells(obj, cell_range)
+
+    def update(self, obj):
+        """
+
+        Move obj to the cells of its current rect if it changed cells.
+        @param obj: anything given to insert() before
+        """
+        cell_range = self.cell_range(obj.rect)
+        old_range = self.ranges.get(obj)
+        if cell_range == old_range:
+            return
+        if old_range is not None:
+            self.remove_from_cells(obj, old_range)
+        self.ranges[obj] = cell_range
+        self.add_to_cells(obj, cell_range)
+
+    def add_to_cells(self, obj, cell_range):
+        for cell_y in range(cell_range[1], cell_range[3] + 1):
+            for cell_x in range(cell_range[0], cell_range[2] + 1):
+                self.cells.setdefault((cell_x, cell_y), []).append(obj)
+
+    def remove_from_cells(self, obj, cell_range):
+        for cell_y in range(cell_range[1], cell_range[3] + 1):
+            for cell_x in range(cell_range[0], cell_range[2] + 1):
+                cell = self.cells[cell_x, cell_y]
+                cell.remove(obj)
+                if not cell:
+                    del self.cells[cell_x, cell_y]
+
+    def query(self, rect):
+        """
+
+        Everything in the cells rect covers, each object once.
+        @type rect: pygame.Rect
+        @return: list
+        """
+        first_x, first_y, last_x, last_y = self.cell_range(rect)
+        found = []
+        seen = set()
+        for cell_y in range(first_y, last_y + 1):
+            for cell_x in range(first_x, last_x + 1):
+                for obj in self.cells.get((cell_x, cell_y), ()):
+                    if obj not in seen:
+                        seen.add(obj)
+                        found.append(obj)
+        return found
+
+
+class GridGroup(Group):
+    """
+
+    Sprite group that keeps its sprites in a SpatialGrid, sprites are
+    re-binned after every update() so moving platforms stay findable.
+    @param cell_size: int
+    """
+
+    def __init__(self, *sprites, cell_size=128):
+        self.grid = SpatialGrid(cell_size)
+        Group.__init__(self, *sprites)
+
+    def add_internal(self, sprite, layer=None):
+        Group.add_internal(self, sprite, layer)
+        self.grid.insert(sprite)
+
+    def remove_internal(self, sprite):
+        Group.remove_internal(self, sprite)
+        self.grid.remove(sprite)
+
+    def update(self, *args, **kwargs):
+        Group.update(self, *args, **kwargs)
+        for sprite in self.sprites():
+            self.grid.update(sprite)
+
+    def moved(self, sprite):
+        """
+
+        Re-bin a sprite that was moved outside of update().
+        @type sprite: pygame.sprite.Sprite
+        """
+        self.grid.update(sprite)
+
+    def query(self, rect):
+        """
+
+        @type rect: pygame.Rect
+        @return: list of sprites near rect
+        """
+        return self.grid.query(rect)
+
+
+class SweepAndPrune(object):
+    """
+
+    Entity vs entity collisions. Entities are kept sorted by their left edge
+    between frames, since they barely move the list is almost sorted and
+    re-sorting it is close to linear. Sweeping it on x only pairs up
+    entities whose x ranges overlap, the y test is done on those pairs.
+    """
+
+    def __init__(self):
+        self.order = []
+        self.members = set()
+
+    def collide(self, entities):
+        """
+
+        @param entities: list of Prototype.Entity
+        @return: list of Geometry.Contact, a and b set to the pair
+        """
+        if self.members != set(entities):
+            self.members = set(entities)
+            self.order = list(entities)
+        self.order.sort(key=lambda e: e.rect.left)
+        contacts = []
+        active = []
+        for entity in self.order:
+            rect = entity.rect
+            active = [other for other in active if other.rect.right > rect.left]
+            for other in active:
+                if other.rect.top < rect.bottom and rect.top < other.rect.bottom:
+                    contacts.append(self.make_contact(other, entity))
+            active.append(entity)
+        return contacts
+
+    @staticmethod
+    def make_contact(a, b):
+        """
+
+        The normal points from a to b along the axis of least penetration,
+        dist is negative while the two overlap.
+        @type a: Prototype.Entity
+        @type b: Prototype.Entity
+        @return: Geometry.Contact
+        """
+        overlap = a.rect.clip(b.rect)
+        if overlap.width < overlap.height:
+            side = 1 if b.rect.centerx >= a.rect.centerx else -1
+            normal = Vector2(side, 0)
+            dist = -overlap.width
+        else:
+            side = 1 if b.rect.centery >= a.rect.centery else -1
+            normal = Vector2(0, side)
+            dist = -overlap.height
+        return Contact(normal, dist, Vector2(overlap.centerx, overlap.centery),
+                       a, b)
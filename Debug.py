@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# coding=utf-8
+from Backend import pygame
+
+HIGHLIGHT = 0
+QUERY_RANGE = 1
+CONTACT = 2
+
+
+class DebugOverlay(object):
+    """
+
+    Collects debug primitives (highlighted tiles, query ranges, contacts)
+    while a frame is updated and draws all of them at once in camera space.
+    While disabled nothing is recorded, allocated or drawn, so callers only
+    have to check overlay.enabled before building their arguments.
+    @param enabled: bool
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.commands = []
+        self.surfaces = {}
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        del self.commands[:]
+
+    def highlight_tile(self, rect, colour):
+        """
+
+        @param rect: pygame.Rect in world space
+        @param colour: tuple
+        """
+        if self.enabled:
+            self.commands.append((HIGHLIGHT, rect.x, rect.y, rect.width,
+                                  rect.height, colour))
+
+    def query_range(self, rect, colour):
+        """
+
+        @param rect: pygame.Rect in world space
+        @param colour: tuple
+        """
+        if self.enabled:
+            self.commands.append((QUERY_RANGE, rect.x, rect.y, rect.width,
+                                  rect.height, colour))
+
+    def contact(self, x, y, normal, colour=(255, 255, 0)):
+        """
+
+        @param x: int world position of the contact
+        @param y: int world position of the contact
+        @param normal: Geometry.Vector2
+        @param colour: tuple
+        """
+        if self.enabled:
+            self.commands.append((CONTACT, x, y, normal.x, normal.y, colour))
+
+    def get_surface(self, width, height, colour):
+        """
+
+        Filled surface shared by every highlight of that size and colour.
+        @return: pygame.Surface
+        """
+        key = (width, height, colour)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            # noinspection PyArgumentList
+            surface = pygame.Surface((width, height))
+            surface.fill(colour)
+            surface.set_alpha(160)
+            self.surfaces[key] = surface
+        return surface
+
+    def draw(self, screen, camera, dirty=None):
+        """
+
+        Draw and forget everything collected since the last draw.
+        @type screen: pygame.Surface
+        @param camera: Helpers.Camera
+        @param dirty: Rendering.DirtyRects
+        """
+        if not self.commands:
+            return
+        offset_x, offset_y = camera.state.topleft
+        for command, x, y, a, b, colour in self.commands:
+            x += offset_x
+            y += offset_y
+            if command == HIGHLIGHT:
+                area = screen.blit(self.get_surface(a, b, colour), (x, y))
+            elif command == QUERY_RANGE:
+                area = pygame.draw.rect(screen, colour, (x, y, a, b), 1)
+            else:
+                area = pygame.draw.line(screen, colour, (x, y),
+                                        (x + a * 8, y + b * 8), 2)
+            if dirty is not None:
+                dirty.add(area)
+        del self.commands[:]
+
+
+OVERLAY = DebugOverlay()
@@ -3,8 +3,10 @@ from . import Vector2
 
 
 class Contact(object):
-    def __init__(self, normal, dist, p):  # ( n:Vector2, dist:Number, p:Vector2 ):void
+    def __init__(self, normal, dist, p, a=None, b=None):  # ( n:Vector2, dist:Number, p:Vector2 ):void
         self.normal = normal
         self.dist = dist
         self.impulse = 0
         self.p = p
+        self.a = a
+        self.b = b
@@ -0,0 +1,17 @@
+# coding=utf-8
+
+
+class Hit(object):
+    """
+    First contact found by a swept box query.
+
+    @param time: float fraction of the velocity travelled before the contact
+    @param normal: Geometry.Vector2
+    @param tile: Prototype.Tile
+    @param t_type: str
+    """
+    def __init__(self, time, normal, tile, t_type):
+        self.time = time
+        self.normal = normal
+        self.tile = tile
+        self.t_type = t_type
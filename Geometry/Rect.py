@@ -0,0 +1,178 @@
+# coding=utf-8
+import math
+
+
+def round_half_away(value):
+    if value >= 0:
+        return int(math.floor(value + 0.5))
+    return int(math.ceil(value - 0.5))
+
+
+class Rect(object):
+    """
+    PLAIN PYTHON STAND IN FOR pygame.Rect
+    Only the part the collision code uses, with the same rounding: floats
+    given to the constructor, move() and inflate() are truncated, floats
+    assigned to an edge or a center are rounded half away from zero.
+    """
+    __slots__ = ('x', 'y', 'width', 'height')
+
+    def __init__(self, *args):
+        if len(args) == 1:
+            args = tuple(args[0])
+        if len(args) == 2:
+            args = tuple(args[0]) + tuple(args[1])
+        set_slot = object.__setattr__
+        set_slot(self, 'x', int(args[0]))
+        set_slot(self, 'y', int(args[1]))
+        set_slot(self, 'width', int(args[2]))
+        set_slot(self, 'height', int(args[3]))
+
+    def __setattr__(self, name, value):
+        if name in Rect.__slots__ and not isinstance(value, int):
+            value = round_half_away(value)
+        object.__setattr__(self, name, value)
+
+    def get_left(self):
+        return self.x
+
+    def set_left(self, value):
+        self.x = value
+
+    def get_top(self):
+        return self.y
+
+    def set_top(self, value):
+        self.y = value
+
+    def get_right(self):
+        return self.x + self.width
+
+    def set_right(self, value):
+        self.x = round_half_away(value) - self.width
+
+    def get_bottom(self):
+        return self.y + self.height
+
+    def set_bottom(self, value):
+        self.y = round_half_away(value) - self.height
+
+    def get_centerx(self):
+        return self.x + self.width // 2
+
+    def set_centerx(self, value):
+        self.x = round_half_away(value) - self.width // 2
+
+    def get_centery(self):
+        return self.y + self.height // 2
+
+    def set_centery(self, value):
+        self.y = round_half_away(value) - self.height // 2
+
+    def get_center(self):
+        return self.get_centerx(), self.get_centery()
+
+    def set_center(self, value):
+        self.set_centerx(value[0])
+        self.set_centery(value[1])
+
+    def get_topleft(self):
+        return self.x, self.y
+
+    def set_topleft(self, value):
+        self.x = value[0]
+        self.y = value[1]
+
+    def get_size(self):
+        return self.width, self.height
+
+    def set_size(self, value):
+        self.width = value[0]
+        self.height = value[1]
+
+    def get_w(self):
+        return self.width
+
+    def set_w(self, value):
+        self.width = value
+
+    def get_h(self):
+        return self.height
+
+    def set_h(self, value):
+        self.height = value
+
+    left = property(get_left, set_left)
+    top = property(get_top, set_top)
+    right = property(get_right, set_right)
+    bottom = property(get_bottom, set_bottom)
+    centerx = property(get_centerx, set_centerx)
+    centery = property(get_centery, set_centery)
+    center = property(get_center, set_center)
+    topleft = property(get_topleft, set_topleft)
+    size = property(get_size, set_size)
+    w = property(get_w, set_w)
+    h = property(get_h, set_h)
+
+    def copy(self):
+        return Rect(self.x, self.y, self.width, self.height)
+
+    def move(self, x, y):
+        return Rect(self.x + int(x), self.y + int(y), self.width, self.height)
+
+    def move_ip(self, x, y):
+        self.x += int(x)
+        self.y += int(y)
+
+    def inflate(self, x, y):
+        x = int(x)
+        y = int(y)
+        return Rect(self.x - int(x / 2), self.y - int(y / 2),
+                    self.width + x, self.height + y)
+
+    def union(self, rect):
+        left = min(self.x, rect.x)
+        top = min(self.y, rect.y)
+        right = max(self.x + self.width, rect.x + rect.width)
+        bottom = max(self.y + self.height, rect.y + rect.height)
+        return Rect(left, top, right - left, bottom - top)
+
+    def clip(self, rect):
+        left = max(self.x, rect.x)
+        top = max(self.y, rect.y)
+        right = min(self.x + self.width, rect.x + rect.width)
+        bottom = min(self.y + self.height, rect.y + rect.height)
+        if right <= left or bottom <= top:
+            return Rect(self.x, self.y, 0, 0)
+        return Rect(left, top, right - left, bottom - top)
+
+    def colliderect(self, rect):
+        return (self.x < rect.x + rect.width and rect.x < self.x + self.width
+                and self.y < rect.y + rect.height and
+                rect.y < self.y + self.height and self.width > 0 and
+                self.height > 0 and rect.width > 0 and rect.height > 0)
+
+    def __iter__(self):
+        return iter((self.x, self.y, self.width, self.height))
+
+    def __len__(self):
+        return 4
+
+    def __getitem__(self, index):
+        return (self.x, self.y, self.width, self.height)[index]
+
+    def __eq__(self, other):
+        try:
+            return tuple(self) == tuple(other)
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "<rect(%d, %d, %d, %d)>" % (self.x, self.y, self.width,
+                                         self.height)
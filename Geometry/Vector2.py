@@ -9,12 +9,100 @@ class Vector2(object):
     THIS WILL BE A TRANSLATION OF A VECTOR2 FUNCTION
     BECAUSE I DONT LIKE THE PYGAME MATH VERSION,
     I WILL ADD ALL THE METHODS TO IT
+    The operators work like the methods, a + b makes a new Vector2 while
+    a += b changes a in place. Numbers work on both axes. There is no
+    __eq__ so vectors stay hashable by identity, use equal() instead.
     """
+    __slots__ = ('x', 'y')
 
     def __init__(self, x=0, y=0):
         self.x = x
         self.y = y
 
+    def set(self, x, y):
+        self.x = x
+        self.y = y
+        return self
+
+    def __add__(self, other):
+        if isinstance(other, Vector2):
+            return Vector2(self.x + other.x, self.y + other.y)
+        return Vector2(self.x + other, self.y + other)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, Vector2):
+            return Vector2(self.x - other.x, self.y - other.y)
+        return Vector2(self.x - other, self.y - other)
+
+    def __rsub__(self, other):
+        return Vector2(other - self.x, other - self.y)
+
+    def __mul__(self, other):
+        if isinstance(other, Vector2):
+            return Vector2(self.x * other.x, self.y * other.y)
+        return Vector2(self.x * other, self.y * other)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, Vector2):
+            return Vector2(self.x / other.x, self.y / other.y)
+        return Vector2(self.x / other, self.y / other)
+
+    def __iadd__(self, other):
+        if isinstance(other, Vector2):
+            self.x += other.x
+            self.y += other.y
+        else:
+            self.x += other
+            self.y += other
+        return self
+
+    def __isub__(self, other):
+        if isinstance(other, Vector2):
+            self.x -= other.x
+            self.y -= other.y
+        else:
+            self.x -= other
+            self.y -= other
+        return self
+
+    def __imul__(self, other):
+        if isinstance(other, Vector2):
+            self.x *= other.x
+            self.y *= other.y
+        else:
+            self.x *= other
+            self.y *= other
+        return self
+
+    def __itruediv__(self, other):
+        if isinstance(other, Vector2):
+            self.x /= other.x
+            self.y /= other.y
+        else:
+            self.x /= other
+            self.y /= other
+        return self
+
+    def __neg__(self):
+        return Vector2(-self.x, -self.y)
+
+    def __abs__(self):
+        return Vector2(abs(self.x), abs(self.y))
+
+    def __iter__(self):
+        yield self.x
+        yield self.y
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, index):
+        return (self.x, self.y)[index]
+
     def add(self, vector):
         return Vector2(self.x + vector.x, self.y + vector.y)
 
@@ -88,8 +176,11 @@ class Vector2(object):
     def dot(self, vector):
         return self.x * vector.x + self.y * vector.y
 
+    def get_len_sqr(self):
+        return self.x * self.x + self.y * self.y
+
     def get_len(self):
-        return math.sqrt(self.get_len_sqr)
+        return math.sqrt(self.x * self.x + self.y * self.y)
 
     def get_abs(self):
         return Vector2(abs(self.x), abs(self.y))
@@ -107,7 +198,7 @@ class Vector2(object):
         self.y = max(min(self.y, max_vector.y), min_vector.y)
 
     def get_perp(self):
-        return Vector2(-self.x, self.y)
+        return Vector2(-self.y, self.x)
 
     def m_neg(self):
         return Vector2(-self.x, -self.y)
@@ -126,8 +217,8 @@ class Vector2(object):
     @staticmethod
     def random_radius(radius):
         return Vector2(
-            random.randint() * 2 - 1,
-            random.randint() * 2 - 1
+            random.random() * 2 - 1,
+            random.random() * 2 - 1
         ).mul_scalar(radius)
 
     @staticmethod
@@ -159,7 +250,10 @@ class Vector2(object):
         self.y = min(self.y, vector.y)
 
     def max(self, vector):
-        return Vector2(self.x, self.y).max_into(vector)
+        return Vector2(max(self.x, vector.x), max(self.y, vector.y))
+
+    def min(self, vector):
+        return Vector2(min(self.x, vector.x), min(self.y, vector.y))
 
     def abs_to(self):
         self.x = abs(self.x)
@@ -167,6 +261,6 @@ class Vector2(object):
 
     def get_major_axis(self):
         if abs(self.x) > abs(self.y):
-            return Vector2(Scalar().sign(self.x), 0)
+            return Vector2(Scalar.sign(self.x), 0)
         else:
-            return Vector2(0, Scalar().sign(self.y))
+            return Vector2(0, Scalar.sign(self.y))
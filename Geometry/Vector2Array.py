@@ -0,0 +1,152 @@
+# coding=utf-8
+from array import array
+from .Vector2 import Vector2
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class Vector2Array(object):
+    """
+    N vectors kept as two contiguous columns, one per axis, so code handling
+    many entities can update them all in one call instead of going through
+    one Vector2 at a time. The columns are array('d') or, through
+    from_columns(), numpy arrays. add_to, scale and clamp_into change the
+    columns in place and never build new ones.
+    @param vectors: iterable of Geometry.Vector2
+    """
+    __slots__ = ('x', 'y')
+
+    def __init__(self, vectors=()):
+        self.x = array('d')
+        self.y = array('d')
+        for vector in vectors:
+            self.x.append(vector.x)
+            self.y.append(vector.y)
+
+    @staticmethod
+    def zeros(count):
+        vectors = Vector2Array()
+        vectors.x = array('d', bytes(8 * count))
+        vectors.y = array('d', bytes(8 * count))
+        return vectors
+
+    @staticmethod
+    def from_columns(x, y):
+        """
+
+        Wrap two columns of the same length without copying them.
+        @param x: array('d') or numpy array
+        @param y: array('d') or numpy array
+        @return: Geometry.Vector2Array
+        """
+        vectors = Vector2Array()
+        vectors.x = x
+        vectors.y = y
+        return vectors
+
+    def is_numpy(self):
+        return numpy is not None and isinstance(self.x, numpy.ndarray)
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, index):
+        return Vector2(self.x[index], self.y[index])
+
+    def __setitem__(self, index, vector):
+        self.x[index] = vector.x
+        self.y[index] = vector.y
+
+    def append(self, vector):
+        self.x.append(vector.x)
+        self.y.append(vector.y)
+
+    def get_into(self, index, vector):
+        """
+
+        Copy one vector out without making a new Vector2.
+        @type index: int
+        @type vector: Geometry.Vector2
+        """
+        vector.x = self.x[index]
+        vector.y = self.y[index]
+
+    def add_to(self, other):
+        """
+
+        @param other: Geometry.Vector2Array of the same length, or a Vector2
+        added to every vector
+        """
+        if self.is_numpy():
+            numpy.add(self.x, other.x, out=self.x)
+            numpy.add(self.y, other.y, out=self.y)
+            return
+        xs = self.x
+        ys = self.y
+        if isinstance(other, Vector2Array):
+            other_xs = other.x
+            other_ys = other.y
+            for i in range(len(xs)):
+                xs[i] += other_xs[i]
+                ys[i] += other_ys[i]
+        else:
+            other_x = other.x
+            other_y = other.y
+            for i in range(len(xs)):
+                xs[i] += other_x
+                ys[i] += other_y
+
+    def scale(self, scalar):
+        """
+
+        @type scalar: float
+        """
+        if self.is_numpy():
+            numpy.multiply(self.x, scalar, out=self.x)
+            numpy.multiply(self.y, scalar, out=self.y)
+            return
+        xs = self.x
+        ys = self.y
+        for i in range(len(xs)):
+            xs[i] *= scalar
+            ys[i] *= scalar
+
+    def clamp_into(self, min_vector, max_vector):
+        """
+
+        @type min_vector: Geometry.Vector2
+        @type max_vector: Geometry.Vector2
+        """
+        low_x, high_x = min_vector.x, max_vector.x
+        low_y, high_y = min_vector.y, max_vector.y
+        if self.is_numpy():
+            numpy.clip(self.x, low_x, high_x, out=self.x)
+            numpy.clip(self.y, low_y, high_y, out=self.y)
+            return
+        xs = self.x
+        ys = self.y
+        for i in range(len(xs)):
+            xs[i] = max(min(xs[i], high_x), low_x)
+            ys[i] = max(min(ys[i], high_y), low_y)
+
+    def dot(self, other):
+        """
+
+        @param other: Geometry.Vector2Array of the same length, or a Vector2
+        @return: one dot product per vector, a numpy array for numpy
+            columns and an array('d') otherwise
+        """
+        if self.is_numpy():
+            return self.x * other.x + self.y * other.y
+        if isinstance(other, Vector2Array):
+            return array('d', [ax * bx + ay * by for ax, ay, bx, by in
+                               zip(self.x, self.y, other.x, other.y)])
+        other_x = other.x
+        other_y = other.y
+        return array('d', [x * other_x + y * other_y
+                           for x, y in zip(self.x, self.y)])
+
+    def to_vectors(self):
+        return [Vector2(x, y) for x, y in zip(self.x, self.y)]
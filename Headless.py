@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+Runs the simulation without a display as fast as it goes and reports the
+steps per second.
+
+    python3 Headless.py [steps] [--players N] [--script FILE] [--pygame]
+        [--verbose] [--profile FILE] [--level FILE] [--stream block|solid]
+        [--cache DIR] [--trace SPEC] [--trace-out FILE] [--record FILE]
+        [--replay FILE]
+
+A script file has one line per stretch of input: how many steps it lasts
+followed by the actions held down ('left', 'right', 'up', 'down', 'jump',
+'speed'), like "60 right jump". It repeats when it runs out. Without one
+the player runs right and left and jumps now and then. pygame is not even
+imported unless --pygame is given. --profile times the phases of every
+step and writes them to FILE as CSV or JSON, see Profiler. --level plays
+a level file made with LevelFile.py instead of the demo level. --stream
+pages the tiles in chunks around the players, see StreamingTileSet.
+--cache reads the compiled level from DIR, compiling it there the first
+time, see LevelCache. The time the level took to load is reported.
+--trace sets the levels of the trace channels, like "ladder=debug", and
+--trace-out writes the last trace events to FILE at the end, see Trace.
+Only errors are printed as they happen unless --verbose is given.
+--record writes the input to an input log and --replay plays one back,
+recorded here or in the game, instead of the script, see Replay.
+"""
+import os
+import sys
+import time
+
+if '--pygame' not in sys.argv:
+    os.environ.setdefault('PROTOTYPE_HEADLESS', '1')
+
+from Prototype import (make_tileset_group, compile_tileset_group,
+                       make_player, apply_input, replay_events, STEP_MS)
+from Levels import DEMO_LEVEL
+from LevelFile import load_level
+from Trace import TRACE, INFO, ERROR
+from Replay import (InputRecorder, load_replay, rect_checksum, PRESS,
+                    PRESS_SPEED, RELEASE)
+from Broadphase import GridGroup, SweepAndPrune
+from Physics import World
+from Profiler import PROFILER
+
+
+def default_script(steps=600):
+    """
+
+    @param steps: int
+    @return: list of sets of actions, one per step
+    """
+    script = []
+    for step in range(steps):
+        held = set()
+        if (step // 60) % 3 == 0:
+            held.add('right')
+        elif (step // 60) % 3 == 1:
+            held.add('left')
+        if step % 47 < 3:
+            held.add('jump')
+        if step % 200 > 150:
+            held.add('up')
+        script.append(held)
+    return script
+
+
+def load_script(path):
+    """
+
+    @param path: str
+    @return: list of sets of actions, one per step
+    """
+    script = []
+    with open(path) as script_file:
+        for line in script_file:
+            words = line.split()
+            if not words or words[0].startswith('#'):
+                continue
+            script.extend(set(words[1:]) for _ in range(int(words[0])))
+    return script
+
+
+def run(steps, script, players=1, level=DEMO_LEVEL, streaming=None,
+        cache_dir=None, recorder=None, replay=None, tileset_group=None):
+    """
+
+    @param steps: int
+    @param script: list of sets of actions, repeated when it runs out
+    @param players: int players all following the same script, spread out
+        along the top of the level
+    @param level: list like Levels.DEMO_LEVEL
+    @param streaming: dict of Prototype.StreamingTileSet options, or None
+    @param cache_dir: str where compiled levels are cached, or None
+    @param recorder: Replay.InputRecorder to record the input to, or None
+    @param replay: Replay.Replay to take the input from instead of script,
+        or None
+    @param tileset_group: Prototype.TileSetsContainer built from level
+        earlier, to play on instead of building it again, or None
+    @return: dict with the steps, seconds, steps_per_second, load_seconds,
+        the last rect of the first player with its checksum and the step a
+        replay diverged at, None if it did not
+    """
+    load_start = time.perf_counter()
+    if tileset_group is None:
+        if cache_dir is None or streaming is not None:
+            tileset_group = make_tileset_group(level, streaming=streaming)
+        else:
+            tileset_group = compile_tileset_group(level, cache_dir)[0]
+    load_seconds = time.perf_counter() - load_start
+    platforms_group = GridGroup()
+    world = World(tileset_group, platforms_group)
+    entity_collisions = SweepAndPrune()
+    entity_list = []
+    map_width = tileset_group.tileset_list[0].rect.width
+    for i in range(players):
+        player = make_player(tileset_group)
+        player.rect.x += (i * 97) % max(map_width - 64, 1)
+        entity_list.append(player)
+        world.add(player)
+
+    previous = set()
+    diverged_at = None
+    start = time.perf_counter()
+    for step in range(steps):
+        phase_start = PROFILER.now()
+        if replay is None:
+            held = script[step % len(script)]
+            events = ()
+            if 'jump' in held and 'jump' not in previous:
+                events = (PRESS_SPEED if 'speed' in held else PRESS,)
+            if 'jump' not in held and 'jump' in previous:
+                events = (RELEASE,)
+        else:
+            held, events = replay.steps[step]
+        for player in entity_list:
+            replay_events(player, events)
+            apply_input(player, held)
+        if recorder is not None:
+            for event in events:
+                if event == RELEASE:
+                    recorder.release()
+                else:
+                    recorder.press(event == PRESS_SPEED)
+        previous = held
+        if tileset_group.streaming:
+            tileset_group.stream([player.rect for player in entity_list])
+        platforms_group.update(entity_list)
+        phase_start = PROFILER.lap('platforms', phase_start)
+        world.step()
+        phase_start = PROFILER.lap('world step', phase_start)
+        for contact in entity_collisions.collide(entity_list):
+            contact.a.collide_entity(contact)
+            contact.b.collide_entity(contact)
+        PROFILER.lap('entity collisions', phase_start)
+        if recorder is not None:
+            recorder.record(held, entity_list[0].rect)
+        if (replay is not None and diverged_at is None and
+                not replay.check(step + 1, entity_list[0].rect)):
+            diverged_at = step + 1
+    seconds = time.perf_counter() - start
+    return {
+        'steps': steps,
+        'players': players,
+        'seconds': seconds,
+        'steps_per_second': steps / seconds if seconds else float('inf'),
+        'load_seconds': load_seconds,
+        'rect': tuple(entity_list[0].rect),
+        'checksum': rect_checksum(entity_list[0].rect),
+        'diverged_at': diverged_at
+    }
+
+
+def main(argv):
+    steps = 2000
+    players = 1
+    script = None
+    profile = None
+    level = DEMO_LEVEL
+    streaming = None
+    cache_dir = None
+    trace_out = None
+    record = None
+    replay = None
+    args = iter(argv)
+    for arg in args:
+        if arg == '--record':
+            record = next(args)
+        elif arg == '--replay':
+            replay = load_replay(next(args))
+        elif arg == '--trace':
+            TRACE.configure(next(args))
+        elif arg == '--trace-out':
+            trace_out = next(args)
+            TRACE.dump_on_crash(trace_out)
+        elif arg == '--cache':
+            cache_dir = next(args)
+        elif arg == '--stream':
+            streaming = {'unloaded': next(args)}
+        elif arg == '--level':
+            level = load_level(next(args))
+        elif arg == '--profile':
+            profile = next(args)
+            PROFILER.enabled = True
+        elif arg == '--players':
+            players = int(next(args))
+        elif arg == '--script':
+            script = load_script(next(args))
+        elif arg.isdigit():
+            steps = int(arg)
+    if script is None:
+        script = default_script()
+    recorder = None
+    if record is not None:
+        recorder = InputRecorder(level, STEP_MS)
+    if replay is not None:
+        replay.check_level(level)
+        steps = len(replay.steps)
+
+    TRACE.echo_level = INFO if '--verbose' in argv else ERROR
+    result = run(steps, script, players, level, streaming, cache_dir,
+                 recorder, replay)
+    if recorder is not None:
+        recorder.save(record)
+    if replay is not None:
+        if result['diverged_at'] is None:
+            print('replay matches the recording')
+        else:
+            print('replay diverged by step', result['diverged_at'])
+    print('level loaded in %.1f ms' % (result['load_seconds'] * 1000))
+    print('%(steps)d steps of %(players)d players in %(seconds).3f s, '
+          '%(steps_per_second).1f steps/s' % result)
+    print('player ends at', result['rect'])
+    if profile is not None:
+        PROFILER.dump(profile)
+    if trace_out is not None:
+        TRACE.dump(trace_out)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
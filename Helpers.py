@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 # coding=utf-8
 from Geometry.Vector2 import Vector2
+from Debug import OVERLAY
+from Trace import TRACE, DEBUG, WARNING
+from bisect import bisect_right
 import math
-import pygame
+from Backend import pygame, Rect
+
+SLOPE_TRACE = TRACE.channel('slope')
+CAMERA_TRACE = TRACE.channel('camera')
 
 
 def intersecting_rows(rect1, rect2):
@@ -31,6 +37,113 @@ def intersecting_columns(rect1, rect2):
     return intersecting_range
 
 
+def swept_aabb(rect, velocity_x, velocity_y, left, top, right, bottom):
+    """
+
+    Time of impact of rect moving by the velocity against the box given by
+    left, top, right and bottom. Boxes that are already overlapped or that
+    are not reached within the move are ignored.
+    @param rect: pygame.Rect
+    @param velocity_x: float
+    @param velocity_y: float
+    @return: tuple (time, normal x, normal y) or None
+    """
+    if velocity_x > 0:
+        x_entry = (left - rect.right) / velocity_x
+        x_exit = (right - rect.left) / velocity_x
+    elif velocity_x < 0:
+        x_entry = (right - rect.left) / velocity_x
+        x_exit = (left - rect.right) / velocity_x
+    elif rect.left < right and rect.right > left:
+        x_entry = -math.inf
+        x_exit = math.inf
+    else:
+        return None
+
+    if velocity_y > 0:
+        y_entry = (top - rect.bottom) / velocity_y
+        y_exit = (bottom - rect.top) / velocity_y
+    elif velocity_y < 0:
+        y_entry = (bottom - rect.top) / velocity_y
+        y_exit = (top - rect.bottom) / velocity_y
+    elif rect.top < bottom and rect.bottom > top:
+        y_entry = -math.inf
+        y_exit = math.inf
+    else:
+        return None
+
+    entry = max(x_entry, y_entry)
+    if entry < 0 or entry > 1 or entry >= min(x_exit, y_exit):
+        return None
+    if x_entry > y_entry:
+        return entry, -1 if velocity_x > 0 else 1, 0
+    return entry, 0, -1 if velocity_y > 0 else 1
+
+
+def build_runs(kinds, kind_names):
+    """
+
+    Turn a line of run kinds (None for nothing) into sorted runs.
+    @param kinds: iterable of Prototype.KIND_* ints or None
+    @param kind_names: tuple of every kind a run can have
+    @return: dict kind -> (list of run starts, list of run ends)
+    """
+    runs = dict((kind, ([], [])) for kind in kind_names)
+    current = None
+    position = 0
+    for position, kind in enumerate(kinds):
+        if kind != current:
+            if current is not None:
+                runs[current][1].append(position)
+            if kind is not None:
+                runs[kind][0].append(position)
+            current = kind
+    else:
+        if current is not None:
+            runs[current][1].append(position + 1)
+    return runs
+
+
+def first_in_runs(runs, position, kinds):
+    """
+
+    First cell at or after position covered by a run of one of the kinds.
+    @param runs: dict kind -> (list of run starts, list of run ends)
+    @param position: int
+    @param kinds: tuple of Prototype.KIND_* ints
+    @return: int or None
+    """
+    found = None
+    for kind in kinds:
+        starts, ends = runs[kind]
+        i = bisect_right(ends, position)
+        if i < len(starts):
+            cell = max(starts[i], position)
+            if found is None or cell < found:
+                found = cell
+    return found
+
+
+def last_in_runs(runs, position, kinds):
+    """
+
+    Last cell at or before position covered by a run of one of the kinds.
+    @param runs: dict kind -> (list of run starts, list of run ends)
+    @param position: int
+    @param kinds: tuple of Prototype.KIND_* ints
+    @return: int or None
+    """
+    found = None
+    for kind in kinds:
+        starts, ends = runs[kind]
+        i = bisect_right(starts, position) - 1
+        if i >= 0:
+            cell = min(ends[i] - 1, position)
+            if found is None or cell > found:
+                found = cell
+    return found
+
+
 def scan_for_tiles_x(tileset, entity):
     """
 
@@ -39,7 +152,7 @@ def scan_for_tiles_x(tileset, entity):
     """
     all_tiles = []
     intersecting_range = intersecting_columns(entity.rect,
-                                              tileset.tile_array[0, 0].rect)
+                                              tileset.tile_rect)
     # print("range x", intersecting_range)
     if entity.info['normal'].x > 0:
         for i in range(intersecting_range[0], intersecting_range[1]):
@@ -57,14 +170,9 @@ def scan_for_tiles_x(tileset, entity):
             all_tiles.extend(tmp_tile_list)
 
     if on_slope_tile(entity, tileset):
-        for i in range(0, len(all_tiles)):
-            for bad_tile in tileset.not_considered_tiles:
-                try:
-                    if all_tiles[i] == bad_tile:
-                        del all_tiles[i]
-                except IndexError:
-                    # print("index error: all_tiles[i]")
-                    pass
+        all_tiles = [tmp_tile for tmp_tile in all_tiles
+                     if not tileset.is_slope_excluded(tmp_tile.tile_coords.x,
+                                                      tmp_tile.tile_coords.y)]
 
     return all_tiles
 
@@ -77,7 +185,7 @@ def scan_for_tiles_y(tileset, entity):
     """
     all_tiles = []
     intersecting_range = intersecting_rows(entity.rect,
-                                           tileset.tile_array[0, 0].rect)
+                                           tileset.tile_rect)
     # print("range y", intersecting_range)
     if entity.info['normal'].y > 0:
         for i in range(intersecting_range[0], intersecting_range[1]):
@@ -94,14 +202,9 @@ def scan_for_tiles_y(tileset, entity):
                                                - 1, entity)
             all_tiles.extend(tmp_tile_list)
     if on_slope_tile(entity, tileset):
-        for i in range(0, len(all_tiles)):
-            for bad_tile in tileset.not_considered_tiles:
-                try:
-                    if all_tiles[i] == bad_tile:
-                        del all_tiles[i]
-                except IndexError:
-                    # print("index error: all_tiles[i]")
-                    pass
+        all_tiles = [tmp_tile for tmp_tile in all_tiles
+                     if not tileset.is_slope_excluded(tmp_tile.tile_coords.x,
+                                                      tmp_tile.tile_coords.y)]
     return all_tiles
 
 
@@ -120,12 +223,8 @@ def closest_tile_x(tiles_to_check, entity):
             closest = tmp_tile
             distance_from_self = abs(tmp_tile.rect.centerx -
                                      entity.rect.centerx)
-    if closest is not None:
-        # noinspection PyArgumentList
-        closest_img = pygame.Surface((closest.rect.width, closest.rect.height))
-        closest_img.fill((0, 100, 255))
-        if entity.debug:
-            entity.debug_draw(closest_img, closest.rect.x, closest.rect.y)
+    if closest is not None and OVERLAY.enabled:
+        OVERLAY.highlight_tile(closest.rect, (0, 100, 255))
     return closest
 
 
@@ -144,12 +243,8 @@ def closest_tile_y(tiles_to_check, entity):
             closest = tmp_tile
             distance_from_self = abs(tmp_tile.rect.centery -
                                      entity.rect.centery)
-    if closest is not None:
-        # noinspection PyArgumentList
-        closest_img = pygame.Surface((closest.rect.width, closest.rect.height))
-        closest_img.fill((0, 100, 255))
-        if entity.debug:
-            entity.debug_draw(closest_img, closest.rect.x, closest.rect.y)
+    if closest is not None and OVERLAY.enabled:
+        OVERLAY.highlight_tile(closest.rect, (0, 100, 255))
     return closest
 
 
@@ -172,12 +267,8 @@ def closest_ladder_x(close_tile_list, entity):
                         distance_from_self = abs(tmp_tile.rect.right -
                                                  entity.rect.left)
 
-    if closest is not None:
-        # noinspection PyArgumentList
-        closest_img = pygame.Surface((closest.rect.width, closest.rect.height))
-        closest_img.fill((123, 50, 50))
-        if entity.debug:
-            entity.debug_draw(closest_img, closest.rect.x, closest.rect.y)
+    if closest is not None and OVERLAY.enabled:
+        OVERLAY.highlight_tile(closest.rect, (123, 50, 50))
     return closest
 
 
@@ -200,12 +291,8 @@ def closest_ladder_y(close_tile_list, entity):
                         distance_from_self = abs(tmp_tile.rect.bottom -
                                                  entity.rect.top)
 
-    if closest is not None:
-        # noinspection PyArgumentList
-        closest_img = pygame.Surface((closest.rect.width, closest.rect.height))
-        closest_img.fill((255, 100, 100))
-        if entity.debug:
-            entity.debug_draw(closest_img, closest.rect.x, closest.rect.y)
+    if closest is not None and OVERLAY.enabled:
+        OVERLAY.highlight_tile(closest.rect, (255, 100, 100))
     return closest
 
 
@@ -238,12 +325,8 @@ def closest_from_list_x(close_tile_list, entity):
                     if slope_tile is not None:
                         closest = slope_tile
 
-    if closest is not None:
-        # noinspection PyArgumentList
-        closest_img = pygame.Surface((closest.rect.width, closest.rect.height))
-        closest_img.fill((50, 50, 50))
-        if entity.debug:
-            entity.debug_draw(closest_img, closest.rect.x, closest.rect.y)
+    if closest is not None and OVERLAY.enabled:
+        OVERLAY.highlight_tile(closest.rect, (50, 50, 50))
     return closest
 
 
@@ -276,12 +359,8 @@ def closest_from_list_y(close_tile_list, entity):
                     if slope_tile is not None:
                         closest = slope_tile
 
-    if closest is not None:
-        # noinspection PyArgumentList
-        closest_img = pygame.Surface((closest.rect.width, closest.rect.height))
-        closest_img.fill((100, 100, 100))
-        if entity.debug:
-            entity.debug_draw(closest_img, closest.rect.x, closest.rect.y)
+    if closest is not None and OVERLAY.enabled:
+        OVERLAY.highlight_tile(closest.rect, (100, 100, 100))
     return closest
 
 
@@ -307,28 +386,52 @@ def on_slope_tile(entity, tileset):
     @return: bool
     """
     intersecting_range = intersecting_rows(entity.rect,
-                                           tileset.tile_array[0, 0].rect)
+                                           tileset.tile_rect)
     bottom_y = math.floor(entity.rect.bottom / tileset.size_info['tile'].x)
     for i in range(intersecting_range[0], intersecting_range[1]):
-        try:
-            tmp_tile = tileset.tile_array[i, bottom_y]
-            if (tmp_tile.tile_info['type'] == 'slope' is True and
-                tmp_tile.tile_info['floor_y'].x != 0 and
-                    tmp_tile.tile_info['floor_y'].y != 0):
-                return True
-        except KeyError:
-            print("on_slope_tile: KeyError out of tileset bounds")
+        if not tileset.in_bounds(i, bottom_y):
+            if SLOPE_TRACE.level <= DEBUG:
+                SLOPE_TRACE.record(DEBUG, 'on_slope_tile out of bounds',
+                                   x=i, y=bottom_y)
+            continue
+        if (tileset.get_tile_type(i, bottom_y) == 'slope' and
+            tileset.get_tile(i, bottom_y).tile_info['floor_y'].x != 0 and
+                tileset.get_tile(i, bottom_y).tile_info['floor_y'].y != 0):
+            return True
     return False
 
 
+PLATFORM_REACH = 64
+
+
+def nearby_sprites(entity, group):
+    """
+
+    Sprites of group around the rect entity sweeps this frame, groups
+    without a broadphase (lists, plain pygame groups) are returned as is.
+    @param entity: Prototype.Entity
+    @param group: Broadphase.GridGroup
+    @return: iterable
+    """
+    if not hasattr(group, 'query'):
+        return group
+    velocity = getattr(entity, 'velocity', None)
+    query_range = entity.rect
+    if velocity is not None:
+        query_range = query_range.union(entity.rect.move(velocity.x,
+                                                         velocity.y))
+    return group.query(query_range.inflate(PLATFORM_REACH * 2,
+                                           PLATFORM_REACH * 2))
+
+
 def collide_platform_x(platform, entities):
     """
 
     @param platform: Prototype.Platform
     @param entities: list
     """
-    for e in entities:
-        if pygame.sprite.collide_rect(platform, e):
+    for e in nearby_sprites(platform, entities):
+        if platform.rect.colliderect(e.rect):
             if (platform.info['normal'].x > 0 and platform.rect.x <
                     e.rect.x and platform.rect.right >= e.rect.left):
                 e.rect.left = platform.rect.right
@@ -343,8 +446,8 @@ def collide_platform_y(platform, entities):
     @param platform: Prototype.Platform
     @param entities: list
     """
-    for e in entities:
-        if pygame.sprite.collide_rect(platform, e):
+    for e in nearby_sprites(platform, entities):
+        if platform.rect.colliderect(e.rect):
             if (platform.info['normal'].y > 0 and platform.rect.bottom >
                 e.rect.top and platform.rect.x <= e.rect.y and e.rect.left >
                     platform.rect.left and e.rect.right < platform.rect.right):
@@ -363,7 +466,7 @@ def scan_for_platforms_x(entity, platform_group):
     @return: list
     """
     platform_list = []
-    for platform in platform_group:
+    for platform in nearby_sprites(entity, platform_group):
         if platform.rect.width >= entity.rect.width:
             if (platform.rect.left <= entity.rect.left <= platform.rect.right or
                 platform.rect.left <= entity.rect.right <=
@@ -392,7 +495,7 @@ def scan_for_platforms_y(entity, platform_group):
     @return: list
     """
     platform_list = []
-    for platform in platform_group:
+    for platform in nearby_sprites(entity, platform_group):
         if platform.rect.height >= entity.rect.height:
             if (platform.rect.top <= entity.rect.top <= platform.rect.bottom or
                 platform.rect.top <= entity.rect.bottom <=
@@ -428,9 +531,10 @@ class Camera(object):
         elif camera_func == "debug":
             self.camera_func = self.debug_camera
         else:
-            print("no camera func defined")
+            CAMERA_TRACE.record(WARNING, 'no camera func defined',
+                                camera_func=camera_func)
         if width is not None and height is not None:
-            self.state = pygame.Rect(0, 0, width, height)
+            self.state = Rect(0, 0, width, height)
 
     def apply(self, target):
         """
@@ -440,6 +544,14 @@ class Camera(object):
         """
         return target.rect.move(self.state.topleft)
 
+    def apply_rect(self, rect):
+        """
+
+        @type rect: pygame.Rect
+        @return: pygame.Rect
+        """
+        return rect.move(self.state.topleft)
+
     def update(self, target, screen_size):
         """
 
@@ -448,6 +560,15 @@ class Camera(object):
         """
         self.state = self.camera_func(self.state, target.rect, screen_size)
 
+    def update_rect(self, rect, screen_size):
+        """
+
+        Follow rect instead of the rect of an entity.
+        @type rect: pygame.Rect
+        @param screen_size: Geometry.Vector2
+        """
+        self.state = self.camera_func(self.state, rect, screen_size)
+
     @staticmethod
     def debug_camera(camera, target_rect, screen_size):
         """
@@ -457,8 +578,10 @@ class Camera(object):
         @param screen_size: Geometry.Vector2
         @return: pygame.Rect
         """
-        print('camera', camera, 'is not used', target_rect, 'is not used')
-        return pygame.Rect(0, 0, screen_size.x, screen_size.y)
+        if CAMERA_TRACE.level <= DEBUG:
+            CAMERA_TRACE.record(DEBUG, 'debug camera', camera=camera,
+                                target_rect=target_rect)
+        return Rect(0, 0, screen_size.x, screen_size.y)
 
     @staticmethod
     def simple_camera(camera, target_rect, screen_size):
@@ -471,7 +594,7 @@ class Camera(object):
         """
         l, t, _, _ = target_rect
         _, _, w, h = camera
-        return pygame.Rect(-l + screen_size.x / 2, -t + screen_size.y / 2, w, h)
+        return Rect(-l + screen_size.x / 2, -t + screen_size.y / 2, w, h)
 
     @staticmethod
     def complex_camera(camera, target_rect, screen_size):
@@ -494,51 +617,7 @@ class Camera(object):
         t = max(-(camera.height - screen_size.y), t)
         t = min(0, t)
         # stop scrolling at the top
-        return pygame.Rect(l, t, w, h)
-
-
-class BackgroundManager(object):
-    """
-
-    @param background_path: str
-    @param parallax: int
-    """
-
-    def __init__(self, background_path, parallax):
-        self.background = pygame.image.load(background_path)
-        self.background_rect = self.background.get_rect()
-        self.parallax = parallax
-        self.position = Vector2(0, 0)
-
-    def update(self, camera, tileset):
-        """
-
-        @param camera: Helpers.Camera
-        @param tileset: Prototype.TileSet
-        """
-        self.position.x = ((-(camera.state.left / self.parallax) //
-                            self.background_rect.width) *
-                           self.background_rect.width)
-        self.position.y = (tileset.size_info['map'].y *
-                           tileset.size_info['tile'].y -
-                           self.background_rect.height)
-        # give parallax effect
-        self.position.x += camera.state.left / self.parallax
-        self.position.y += camera.state.top
-
-    def draw(self, screen, screen_size):
-        """
-
-        @param screen: pygame.Display
-        @param screen_size: Geometry.Vector2
-        """
-        screen.blit(self.background, (self.position.x, self.position.y + 32))
-        copies = (screen_size.x // self.background_rect.width) + 1
-        while copies > 0:
-            self.position.x += self.background_rect.width
-            screen.blit(self.background, (self.position.x,
-                                          self.position.y + 32))
-            copies -= 1
+        return Rect(l, t, w, h)
 
 
 def one_way_platform_checker(entity, tile):
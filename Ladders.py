@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+Ladders as climbable segments: the ladder tiles of a column stacked on top
+of each other merge into one segment, indexed per column by row so the
+segment an entity is on or about to touch is found with a binary search
+instead of a look at every tile around it.
+"""
+import math
+from bisect import bisect_left, bisect_right
+from Backend import Rect
+
+
+class LadderSegment(object):
+    """
+
+    The ladder tiles of column from row top to row bottom, both included.
+    The top row is the top of the ladder, entities can stand on it and
+    climb out over it.
+    @type column: int
+    @type top: int
+    @type bottom: int
+    @param tile_size: Geometry.Vector2
+    """
+
+    def __init__(self, column, top, bottom, tile_size):
+        self.column = column
+        self.top = top
+        self.bottom = bottom
+        # y in pixels of the top edge, where entities stand on the ladder
+        self.top_y = top * tile_size.y
+        self.rect = Rect(column * tile_size.x, top * tile_size.y,
+                         tile_size.x, (bottom - top + 1) * tile_size.y)
+        self.tile_info = {'type': 'ladder'}
+
+    def is_under(self, rect):
+        """
+
+        @type rect: pygame.Rect
+        @return: bool rect stands on the top of the ladder
+        """
+        return (rect.bottom == self.top_y and rect.right > self.rect.left and
+                rect.left < self.rect.right)
+
+    def __repr__(self):
+        return '<LadderSegment(%d, %d-%d)>' % (self.column, self.top,
+                                              self.bottom)
+
+
+class LadderIndex(object):
+    """
+
+    The ladder segments of a tileset by column, each column's sorted by row
+    with the tops and bottoms in lists of their own for bisect.
+    @param tile_size: Geometry.Vector2
+    """
+
+    def __init__(self, tile_size):
+        self.tile_size = tile_size
+        self.segments = {}
+        self.tops = {}
+        self.bottoms = {}
+
+    def __len__(self):
+        return sum(len(segments) for segments in self.segments.values())
+
+    def build(self, cells):
+        """
+
+        @param cells: iterable of (column, row) of every ladder tile
+        """
+        self.segments = {}
+        segment = None
+        for column, row in sorted(cells):
+            if (segment is not None and segment.column == column and
+                    segment.bottom == row - 1):
+                segment.bottom = row
+                segment.rect.height += self.tile_size.y
+                continue
+            segment = LadderSegment(column, row, row, self.tile_size)
+            self.segments.setdefault(column, []).append(segment)
+        self.tops = {column: [segment.top for segment in segments]
+                     for column, segments in self.segments.items()}
+        self.bottoms = {column: [segment.bottom for segment in segments]
+                        for column, segments in self.segments.items()}
+
+    def find(self, rect, velocity):
+        """
+
+        The segment holding the first ladder tile touched by rect while it
+        moves by velocity, going through the rows and then the columns it
+        covers in the direction of the move.
+        @type rect: pygame.Rect
+        @type velocity: Geometry.Vector2
+        @return: Ladders.LadderSegment or None
+        """
+        if not self.segments:
+            return None
+        tile_width = self.tile_size.x
+        tile_height = self.tile_size.y
+        first_column = int(min(rect.left, rect.left + velocity.x) //
+                           tile_width)
+        last_column = int(math.ceil(max(rect.right, rect.right + velocity.x) /
+                                    tile_width)) - 1
+        first_row = int(min(rect.top, rect.top + velocity.y) // tile_height)
+        last_row = int(math.ceil(max(rect.bottom, rect.bottom + velocity.y) /
+                                 tile_height)) - 1
+        upwards = velocity.y < 0
+        leftwards = velocity.x < 0
+        best = None
+        best_key = None
+        for column in range(first_column, last_column + 1):
+            segments = self.segments.get(column)
+            if segments is None:
+                continue
+            if upwards:
+                # the lowest segment starting at or above last_row
+                i = bisect_right(self.tops[column], last_row) - 1
+                if i < 0 or segments[i].bottom < first_row:
+                    continue
+                key = (-min(segments[i].bottom, last_row),
+                       -column if leftwards else column)
+            else:
+                # the highest segment ending at or below first_row
+                i = bisect_left(self.bottoms[column], first_row)
+                if i == len(segments) or segments[i].top > last_row:
+                    continue
+                key = (max(segments[i].top, first_row),
+                       -column if leftwards else column)
+            if best_key is None or key < best_key:
+                best = segments[i]
+                best_key = key
+        return best
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+Compiled levels: what the tilesets of a level derive from it (tile ids, run
+index, slope exclusion flags, ladders and the baked chunk images) kept in a
+cache file named after a hash of the level and the tile assets, so later
+starts read it back instead of building it all again. Prototype's
+compile_tileset_group() does the compiling and loading.
+"""
+import os
+import sys
+import zlib
+import pickle
+import hashlib
+from LevelFile import hash_level
+from Backend import pygame
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = 'cache'
+
+
+def level_key(level, tile_definitions, asset_paths, prebaked):
+    """
+
+    @param level: list of (tiles, tile width, tile height) like
+        Levels.DEMO_LEVEL
+    @param tile_definitions: list of the tile types, their images or
+        colours and slopes, like Prototype.TILE_DEFINITIONS
+    @param asset_paths: list of str files the tiles are drawn from, their
+        bytes go into the key
+    @param prebaked: bool the chunk images are baked into the cache, which
+        needs a display
+    @return: str hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update(('%d %s %r %d' % (CACHE_VERSION, sys.version,
+                                    tile_definitions, prebaked)).encode())
+    hash_level(level, digest)
+    for path in asset_paths:
+        digest.update(path.encode())
+        try:
+            with open(path, 'rb') as asset_file:
+                digest.update(asset_file.read())
+        except IOError:
+            digest.update(b'\0missing')
+    return digest.hexdigest()
+
+
+def cache_path(cache_dir, key):
+    return os.path.join(cache_dir, key + '.lvc')
+
+
+def read_cache(path):
+    """
+
+    @type path: str
+    @return: the compiled level, None if there is none or it is unreadable
+    """
+    try:
+        with open(path, 'rb') as cache_file:
+            compiled = pickle.load(cache_file)
+        if compiled.get('version') != CACHE_VERSION:
+            return None
+    except (IOError, EOFError, pickle.UnpicklingError, ValueError,
+            AttributeError, TypeError, ImportError):
+        return None
+    return compiled
+
+
+def write_cache(path, compiled):
+    """
+
+    Write to a temporary file first so an interrupted write never leaves a
+    broken cache behind.
+    @type path: str
+    @param compiled: dict
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    compiled['version'] = CACHE_VERSION
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as cache_file:
+        pickle.dump(compiled, cache_file, pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+
+
+def pack_surface(surface):
+    """
+
+    @type surface: pygame.Surface
+    @return: tuple (width, height, compressed RGBA bytes)
+    """
+    return (surface.get_width(), surface.get_height(),
+            zlib.compress(pygame.image.tostring(surface, 'RGBA'), 1))
+
+
+def unpack_surface(packed):
+    """
+
+    @param packed: tuple from pack_surface()
+    @return: pygame.Surface
+    """
+    width, height, data = packed
+    surface = pygame.image.fromstring(zlib.decompress(data), (width, height),
+                                      'RGBA')
+    if pygame.display.get_surface() is not None:
+        surface = surface.convert_alpha()
+    return surface
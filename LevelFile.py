@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+Level files: every tileset of a level as a binary grid of 16 bit tile ids
+that TileSet reads straight out of a memory map.
+
+    python3 LevelFile.py SOURCE OUT [--rle] [--tile-size WxH]
+
+converts SOURCE (a .csv, a Tiled .json or .tmx, or 'demo' for
+Levels.DEMO_LEVEL) to the level file OUT.
+
+Layout, all little endian:
+
+    header      4s magic 'PLVL', H version, H layer count
+    per layer   I width, I height, H tile width, H tile height,
+                H priority, H encoding, I body offset, I body size
+    bodies      ENCODING_RAW: width * height H tile ids row by row
+                ENCODING_RLE: (H count, H tile id) pairs row by row
+
+Raw bodies start on an even offset so they can be cast to 16 bit ids in
+place. Run length encoded bodies are decoded into an array on load.
+"""
+import os
+import sys
+import csv
+import json
+import mmap
+import zlib
+import gzip
+import base64
+import struct
+import hashlib
+from array import array
+from xml.etree import ElementTree
+
+MAGIC = b'PLVL'
+VERSION = 1
+ENCODING_RAW = 0
+ENCODING_RLE = 1
+HEADER = struct.Struct('<4sHH')
+LAYER = struct.Struct('<IIHHHHII')
+MAX_TILE_ID = 0xFFFF
+MAX_RUN = 0xFFFF
+# Tiled keeps the flip flags in the top bits of a gid
+TILED_FLIP_BITS = 0xE0000000
+
+
+class LevelFormatError(ValueError):
+    pass
+
+
+class LevelLayer(object):
+    """
+
+    One tileset of a level, what TileSet is built from instead of a list of
+    rows. tile_ids can be anything indexable holding the ids row by row,
+    for a raw layer out of a level file it is a memoryview over the map.
+    @type width: int
+    @type height: int
+    @param tile_ids: array.array or memoryview of 16 bit tile ids
+    """
+
+    def __init__(self, width, height, tile_ids):
+        if len(tile_ids) != width * height:
+            raise LevelFormatError("layer of %dx%d tiles has %d tile ids" %
+                                   (width, height, len(tile_ids)))
+        self.width = width
+        self.height = height
+        self.tile_ids = tile_ids
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+
+        @param rows: list of rows of tile ids
+        @return: LevelFile.LevelLayer
+        """
+        tile_ids = array('H')
+        for row in rows:
+            if len(row) != len(rows[0]):
+                raise LevelFormatError("rows must all be the same length")
+            tile_ids.extend(row)
+        return cls(len(rows[0]), len(rows), tile_ids)
+
+    def get_rows(self):
+        """
+
+        @return: list of rows of tile ids
+        """
+        return [list(self.tile_ids[y * self.width:(y + 1) * self.width])
+                for y in range(self.height)]
+
+
+def encode_rle(tile_ids):
+    """
+
+    @param tile_ids: sequence of tile ids
+    @return: array.array of count, tile id pairs
+    """
+    pairs = array('H')
+    count = 0
+    current = None
+    for tile_id in tile_ids:
+        if tile_id == current and count < MAX_RUN:
+            count += 1
+        else:
+            if count:
+                pairs.append(count)
+                pairs.append(current)
+            current = tile_id
+            count = 1
+    if count:
+        pairs.append(count)
+        pairs.append(current)
+    return pairs
+
+
+def decode_rle(pairs, size):
+    """
+
+    @param pairs: sequence of count, tile id pairs
+    @param size: int how many tile ids they make
+    @return: array.array
+    @raise LevelFormatError: when the pairs are cut short or do not make
+        size tile ids
+    """
+    if len(pairs) % 2:
+        raise LevelFormatError("run length body ends halfway through a "
+                               "pair")
+    tile_ids = array('H')
+    for i in range(0, len(pairs), 2):
+        tile_ids.extend(array('H', (pairs[i + 1],)) * pairs[i])
+    if len(tile_ids) != size:
+        raise LevelFormatError("run length body makes %d tile ids instead "
+                               "of %d" % (len(tile_ids), size))
+    return tile_ids
+
+
+def as_ids(body):
+    """
+
+    @param body: buffer of little endian 16 bit values
+    @return: memoryview of them, or a byte swapped array on big endian
+        machines
+    """
+    if sys.byteorder == 'little':
+        return memoryview(body).cast('H')
+    values = array('H', bytes(body))
+    values.byteswap()
+    return values
+
+
+def hash_level(level, digest=None):
+    """
+
+    Feed the size, the tile size and the tile ids of every layer of level
+    to digest.
+    @param level: list of (tiles, tile width, tile height) like
+        Levels.DEMO_LEVEL
+    @param digest: hashlib hash object, a new sha256 one when None
+    @return: digest
+    """
+    if digest is None:
+        digest = hashlib.sha256()
+    for tiles, tile_width, tile_height in level:
+        if not isinstance(tiles, LevelLayer):
+            tiles = LevelLayer.from_rows(tiles)
+        digest.update(struct.pack('<IIHH', tiles.width, tiles.height,
+                                  tile_width, tile_height))
+        digest.update(memoryview(tiles.tile_ids).cast('B'))
+    return digest
+
+
+def save_level(path, level, rle=False):
+    """
+
+    @type path: str
+    @param level: list of (tiles, tile width, tile height) in priority
+        order like Levels.DEMO_LEVEL, tiles being a list of rows or a
+        LevelLayer
+    @param rle: bool run length encode the layers it makes smaller
+    """
+    layers = []
+    for tiles, tile_width, tile_height in level:
+        if not isinstance(tiles, LevelLayer):
+            tiles = LevelLayer.from_rows(tiles)
+        try:
+            body = array('H', tiles.tile_ids)
+        except OverflowError:
+            raise LevelFormatError("tile ids must fit in 16 bits")
+        encoding = ENCODING_RAW
+        if rle:
+            pairs = encode_rle(body)
+            if len(pairs) < len(body):
+                body = pairs
+                encoding = ENCODING_RLE
+        if sys.byteorder != 'little':
+            body.byteswap()
+        layers.append((tiles, tile_width, tile_height, encoding,
+                       body.tobytes()))
+
+    offset = HEADER.size + LAYER.size * len(layers)
+    table = []
+    for priority, (tiles, tile_width, tile_height, encoding,
+                   body) in enumerate(layers):
+        offset += offset % 2
+        table.append(LAYER.pack(tiles.width, tiles.height, tile_width,
+                                tile_height, priority, encoding, offset,
+                                len(body)))
+        offset += len(body)
+
+    with open(path, 'wb') as level_file:
+        level_file.write(HEADER.pack(MAGIC, VERSION, len(layers)))
+        level_file.write(b''.join(table))
+        for layer in layers:
+            if level_file.tell() % 2:
+                level_file.write(b'\0')
+            level_file.write(layer[4])
+
+
+def load_level(path):
+    """
+
+    Map the file copy on write: raw layers are read straight out of the
+    map and set_tile changes only the memory, never the file.
+    @type path: str
+    @return: list of (LevelLayer, tile width, tile height) sorted by
+        priority, like Levels.DEMO_LEVEL
+    """
+    with open(path, 'rb') as level_file:
+        data = mmap.mmap(level_file.fileno(), 0, access=mmap.ACCESS_COPY)
+    view = memoryview(data)
+    if len(view) < HEADER.size:
+        raise LevelFormatError("%s is too short for a level file" % path)
+    magic, version, layer_count = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise LevelFormatError("%s is not a level file" % path)
+    if version != VERSION:
+        raise LevelFormatError("%s is level file version %d, only %d is "
+                               "known" % (path, version, VERSION))
+
+    layers = []
+    for i in range(layer_count):
+        (width, height, tile_width, tile_height, priority, encoding, offset,
+         size) = LAYER.unpack_from(view, HEADER.size + i * LAYER.size)
+        if offset + size > len(view):
+            raise LevelFormatError("layer %d of %s runs past the end of "
+                                   "the file" % (i, path))
+        body = view[offset:offset + size]
+        if encoding == ENCODING_RAW:
+            if size != width * height * 2:
+                raise LevelFormatError("layer %d of %s has %d bytes of tile "
+                                       "ids for %dx%d tiles" %
+                                       (i, path, size, width, height))
+            tile_ids = as_ids(body)
+        elif encoding == ENCODING_RLE:
+            if size % 4:
+                raise LevelFormatError("layer %d of %s has a run length "
+                                       "body of %d bytes, not whole pairs" %
+                                       (i, path, size))
+            try:
+                tile_ids = decode_rle(as_ids(body), width * height)
+            except LevelFormatError as error:
+                raise LevelFormatError("layer %d of %s: %s" % (i, path,
+                                                               error))
+        else:
+            raise LevelFormatError("layer %d of %s has unknown encoding %d" %
+                                   (i, path, encoding))
+        layers.append((priority, LevelLayer(width, height, tile_ids),
+                       tile_width, tile_height))
+    layers.sort(key=lambda layer: layer[0])
+    return [layer[1:] for layer in layers]
+
+
+def import_csv(path, tile_width=32, tile_height=32):
+    """
+
+    One row of comma separated tile ids per line.
+    @type path: str
+    @type tile_width: int
+    @type tile_height: int
+    @return: list with one (LevelLayer, tile width, tile height)
+    """
+    with open(path, newline='') as csv_file:
+        rows = [[int(cell) for cell in row if cell.strip()]
+                for row in csv.reader(csv_file)]
+    rows = [row for row in rows if row]
+    return [(LevelLayer.from_rows(rows), tile_width, tile_height)]
+
+
+def tiled_tile_ids(gids, first_gid):
+    """
+
+    Tiled numbers the tiles of a map from the first gid of its tileset on,
+    the tile id is how far past it a gid is plus one, 0 staying empty.
+    @param gids: iterable of ints
+    @type first_gid: int
+    @return: array.array
+    """
+    tile_ids = array('H')
+    for gid in gids:
+        gid &= ~TILED_FLIP_BITS
+        tile_id = gid - first_gid + 1 if gid else 0
+        if not 0 <= tile_id <= MAX_TILE_ID:
+            raise LevelFormatError("Tiled gid %d has no tile id" % gid)
+        tile_ids.append(tile_id)
+    return tile_ids
+
+
+def decode_tiled_data(data, encoding, compression):
+    """
+
+    @param data: str or list of the layer data
+    @param encoding: str 'csv', 'base64' or None for a plain list
+    @param compression: str 'zlib', 'gzip' or None
+    @return: list of gids
+    """
+    if encoding == 'csv':
+        return [int(gid) for gid in data.replace('\n', '').split(',')
+                if gid.strip()]
+    if encoding == 'base64':
+        raw = base64.b64decode(data.strip())
+        if compression == 'zlib':
+            raw = zlib.decompress(raw)
+        elif compression == 'gzip':
+            raw = gzip.decompress(raw)
+        elif compression:
+            raise LevelFormatError("Tiled compression %s is not supported" %
+                                   compression)
+        return list(struct.unpack('<%dI' % (len(raw) // 4), raw))
+    return list(data)
+
+
+def tiled_tile_size(properties, tile_width, tile_height):
+    """
+
+    A layer can have its own tile size in the custom properties tile_width
+    and tile_height, the map one is used otherwise.
+    @param properties: dict
+    @return: tuple (tile width, tile height)
+    """
+    return (int(properties.get('tile_width', tile_width)),
+            int(properties.get('tile_height', tile_height)))
+
+
+def import_tiled_json(path):
+    """
+
+    The tile layers of a Tiled JSON map, top one first like the priority
+    order of Levels.DEMO_LEVEL.
+    @type path: str
+    @return: list of (LevelLayer, tile width, tile height)
+    """
+    with open(path) as json_file:
+        tiled = json.load(json_file)
+    tilesets = tiled.get('tilesets') or [{'firstgid': 1}]
+    first_gid = tilesets[0]['firstgid']
+    level = []
+    for layer in tiled['layers']:
+        if layer.get('type') != 'tilelayer':
+            continue
+        properties = dict((prop['name'], prop['value'])
+                          for prop in layer.get('properties', []))
+        gids = decode_tiled_data(layer['data'], layer.get('encoding'),
+                                 layer.get('compression'))
+        level.append((LevelLayer(layer['width'], layer['height'],
+                                 tiled_tile_ids(gids, first_gid)),) +
+                     tiled_tile_size(properties, tiled['tilewidth'],
+                                     tiled['tileheight']))
+    # Tiled lists the layers bottom one first
+    level.reverse()
+    return level
+
+
+def import_tiled_tmx(path):
+    """
+
+    The tile layers of a Tiled TMX map, top one first like the priority
+    order of Levels.DEMO_LEVEL.
+    @type path: str
+    @return: list of (LevelLayer, tile width, tile height)
+    """
+    root = ElementTree.parse(path).getroot()
+    tileset = root.find('tileset')
+    first_gid = int(tileset.get('firstgid')) if tileset is not None else 1
+    level = []
+    for layer in root.iter('layer'):
+        properties = dict((prop.get('name'), prop.get('value'))
+                          for prop in layer.iter('property'))
+        data = layer.find('data')
+        if data.get('encoding'):
+            gids = decode_tiled_data(data.text, data.get('encoding'),
+                                     data.get('compression'))
+        else:
+            gids = [int(tile.get('gid', 0)) for tile in data.iter('tile')]
+        level.append((LevelLayer(int(layer.get('width')),
+                                 int(layer.get('height')),
+                                 tiled_tile_ids(gids, first_gid)),) +
+                     tiled_tile_size(properties, root.get('tilewidth'),
+                                     root.get('tileheight')))
+    # Tiled lists the layers bottom one first
+    level.reverse()
+    return level
+
+
+def import_level(path, tile_width=32, tile_height=32):
+    """
+
+    @param path: str a .csv, .json or .tmx file
+    @param tile_width: int of a CSV level
+    @param tile_height: int of a CSV level
+    @return: list of (LevelLayer, tile width, tile height)
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return import_csv(path, tile_width, tile_height)
+    if extension == '.json':
+        return import_tiled_json(path)
+    if extension == '.tmx':
+        return import_tiled_tmx(path)
+    raise LevelFormatError("don't know how to import %s" % path)
+
+
+def main(argv):
+    paths = [arg for arg in argv if not arg.startswith('--')]
+    tile_width = tile_height = 32
+    if '--tile-size' in argv:
+        size = argv[argv.index('--tile-size') + 1]
+        paths.remove(size)
+        tile_width, tile_height = (int(side) for side in size.split('x'))
+    if len(paths) != 2:
+        print(__doc__)
+        return 2
+    source, out = paths
+    if source == 'demo':
+        from Levels import DEMO_LEVEL
+        level = DEMO_LEVEL
+    else:
+        level = import_level(source, tile_width, tile_height)
+    save_level(out, level, '--rle' in argv)
+    print('wrote', len(level), 'layers to', out, os.path.getsize(out),
+          'bytes')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
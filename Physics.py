@@ -0,0 +1,556 @@
+#!/usr/bin/env python3
+# coding=utf-8
+from Debug import OVERLAY
+from Helpers import nearby_sprites
+from Trace import TRACE
+from Geometry.Vector2 import Vector2
+from Geometry.Vector2Array import Vector2Array
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# tile types the batched sweeps stop at, along x and y
+BLOCKING_TYPES = ('solid',)
+FLOOR_TYPES = ('solid', 'one-way')
+# anything the batch can't resolve in bulk, entities near these tiles go
+# through their own move_x and move_y
+SCALAR_TYPES = ('slope', 'ladder', 'ladder_top')
+MAX_FALL_SPEED = 15
+# the velocities stepped entities end up within
+MIN_VELOCITY = Vector2(-float('inf'), -float('inf'))
+MAX_VELOCITY = Vector2(float('inf'), MAX_FALL_SPEED)
+NO_TILE = 1 << 30
+
+
+def nearest_after(mask):
+    """
+
+    @param mask: 2d array, one line per row
+    @return: 2d array, [line, i] is the first index at or after i where mask
+    is set, the extra last column is past the end of the line
+    """
+    lines, length = mask.shape
+    nearest = numpy.full((lines, length + 1), NO_TILE, numpy.int64)
+    nearest[:, :length] = numpy.where(mask, numpy.arange(length), NO_TILE)
+    return numpy.minimum.accumulate(nearest[:, ::-1], axis=1)[:, ::-1]
+
+
+def nearest_before(mask):
+    """
+
+    @param mask: 2d array, one line per row
+    @return: 2d array, [line, i + 1] is the last index at or before i where
+    mask is set, the extra first column is before the line
+    """
+    lines, length = mask.shape
+    nearest = numpy.full((lines, length + 1), -NO_TILE, numpy.int64)
+    nearest[:, 1:] = numpy.where(mask, numpy.arange(length), -NO_TILE)
+    return numpy.maximum.accumulate(nearest, axis=1)
+
+
+def scan_lines(table, first, last, index, pick, empty):
+    """
+
+    Combine table[line, index] over the lines first to last of every entity.
+    @param table: 2d array from nearest_after or nearest_before
+    @param first: array of first lines
+    @param last: array of last lines, included
+    @param index: array of columns of table
+    @param pick: numpy.minimum or numpy.maximum
+    @param empty: value for entities without any line
+    @return: array
+    """
+    found = numpy.full(len(first), empty, numpy.int64)
+    if not len(first):
+        return found
+    top_line = table.shape[0] - 1
+    for offset in range(int((last - first).max()) + 1):
+        line = first + offset
+        found = numpy.where(line <= last,
+                            pick(found, table[numpy.minimum(line, top_line),
+                                              index]),
+                            found)
+    return found
+
+
+def round_half_away(values):
+    """
+
+    Round like pygame.Rect does when it gets a float.
+    @param values: float array
+    @return: int array
+    """
+    return numpy.where(values >= 0, numpy.floor(values + 0.5),
+                       numpy.ceil(values - 0.5)).astype(numpy.int64)
+
+
+def ceil_div(a, b):
+    return -(-a // b)
+
+
+class TileGrid(object):
+    """
+
+    The collision tables of one TileSet for the batched sweeps. Along every
+    row and column it holds the nearest blocking tile on either side of each
+    cell, and a summed area table of the SCALAR_TYPES cells so a whole swept
+    area can be checked for them at once.
+    @type tileset: Prototype.TileSet
+    """
+
+    def __init__(self, tileset):
+        self.tileset = tileset
+        self.revision = None
+        self.tile_width = tileset.size_info['tile'].x
+        self.tile_height = tileset.size_info['tile'].y
+        self.map_width = tileset.size_info['map'].x
+        self.map_height = tileset.size_info['map'].y
+        self.right = self.left = self.below = self.above = None
+        self.scalar_area = None
+        self.refresh()
+
+    def mask(self, types):
+        return numpy.frombuffer(self.tileset.type_mask(types),
+                                numpy.uint8).reshape(self.map_height,
+                                                     self.map_width) != 0
+
+    def refresh(self):
+        """
+
+        Rebuild the tables if the tileset changed since the last build.
+        """
+        if self.revision == self.tileset.revision:
+            return
+        blocking = self.mask(BLOCKING_TYPES)
+        self.right = nearest_after(blocking)
+        self.left = nearest_before(blocking)
+        self.below = nearest_after(self.mask(FLOOR_TYPES).T)
+        self.above = nearest_before(blocking.T)
+        scalar_area = numpy.zeros((self.map_height + 1, self.map_width + 1),
+                                  numpy.int64)
+        scalar_area[1:, 1:] = self.mask(SCALAR_TYPES).cumsum(0).cumsum(1)
+        self.scalar_area = scalar_area
+        self.revision = self.tileset.revision
+
+    def count_scalar(self, first_column, last_column, first_row, last_row):
+        """
+
+        Number of SCALAR_TYPES cells in every range, ranges are included.
+        @return: array
+        """
+        first_column = numpy.clip(first_column, 0, self.map_width)
+        first_row = numpy.clip(first_row, 0, self.map_height)
+        # one past the end, empty ranges end where they start and count 0
+        end_column = numpy.clip(last_column + 1, first_column, self.map_width)
+        end_row = numpy.clip(last_row + 1, first_row, self.map_height)
+        area = self.scalar_area
+        return (area[end_row, end_column] - area[first_row, end_column] -
+                area[end_row, first_column] + area[first_row, first_column])
+
+    def column_range(self, left, right):
+        return (numpy.maximum(numpy.floor(left / self.tile_width), 0)
+                .astype(numpy.int64),
+                numpy.minimum(numpy.ceil(right / self.tile_width),
+                              self.map_width).astype(numpy.int64) - 1)
+
+    def row_range(self, top, bottom):
+        return (numpy.maximum(numpy.floor(top / self.tile_height), 0)
+                .astype(numpy.int64),
+                numpy.minimum(numpy.ceil(bottom / self.tile_height),
+                              self.map_height).astype(numpy.int64) - 1)
+
+    def needs_scalar_x(self, left, right, top, bottom, velocity_x):
+        """
+
+        True where the swept area of an x move, or the floor under it that
+        decides whether the entity stands on a slope, has a scalar tile.
+        """
+        first_column, last_column = self.column_range(
+            numpy.minimum(left, left + velocity_x),
+            numpy.maximum(right, right + velocity_x))
+        first_row = self.row_range(top, bottom)[0]
+        last_row = numpy.minimum(bottom // self.tile_height,
+                                 self.map_height - 1)
+        return self.count_scalar(first_column, last_column,
+                                 first_row, last_row) > 0
+
+    def needs_scalar_y(self, left, right, top, bottom, velocity_y):
+        """
+
+        True where the swept area of a y move has a scalar tile.
+        """
+        first_column, last_column = self.column_range(left, right)
+        first_row, last_row = self.row_range(
+            numpy.minimum(top, top + velocity_y),
+            numpy.maximum(bottom, bottom + velocity_y))
+        return self.count_scalar(first_column, last_column,
+                                 first_row, last_row) > 0
+
+    def blocking_right(self, right, top, bottom):
+        """
+
+        @return: left edge in pixels of the first blocking tile at or right
+        of right that shares a row with the entity, NO_TILE if none
+        """
+        first_row, last_row = self.row_range(top, bottom)
+        column = numpy.clip(ceil_div(right, self.tile_width), 0,
+                            self.map_width)
+        found = scan_lines(self.right, first_row, last_row, column,
+                           numpy.minimum, NO_TILE)
+        return numpy.where(found == NO_TILE, NO_TILE, found * self.tile_width)
+
+    def blocking_left(self, left, top, bottom):
+        """
+
+        @return: right edge in pixels of the first blocking tile at or left
+        of left that shares a row with the entity, -NO_TILE if none
+        """
+        first_row, last_row = self.row_range(top, bottom)
+        column = numpy.clip(left // self.tile_width - 1, -1,
+                            self.map_width - 1) + 1
+        found = scan_lines(self.left, first_row, last_row, column,
+                           numpy.maximum, -NO_TILE)
+        return numpy.where(found == -NO_TILE, -NO_TILE,
+                           (found + 1) * self.tile_width)
+
+    def blocking_below(self, bottom, left, right):
+        """
+
+        @return: top edge in pixels of the first floor tile at or below
+        bottom that shares a column with the entity, NO_TILE if none
+        """
+        first_column, last_column = self.column_range(left, right)
+        row = numpy.clip(ceil_div(bottom, self.tile_height), 0,
+                         self.map_height)
+        found = scan_lines(self.below, first_column, last_column, row,
+                           numpy.minimum, NO_TILE)
+        return numpy.where(found == NO_TILE, NO_TILE,
+                           found * self.tile_height)
+
+    def blocking_above(self, top, left, right):
+        """
+
+        @return: bottom edge in pixels of the first blocking tile at or above
+        top that shares a column with the entity, -NO_TILE if none
+        """
+        first_column, last_column = self.column_range(left, right)
+        row = numpy.clip(top // self.tile_height - 1, -1,
+                         self.map_height - 1) + 1
+        found = scan_lines(self.above, first_column, last_column, row,
+                           numpy.maximum, -NO_TILE)
+        return numpy.where(found == -NO_TILE, -NO_TILE,
+                           (found + 1) * self.tile_height)
+
+
+class EntityBatch(object):
+    """
+
+    All entities of one kind stepped together. Their positions, velocities
+    and gravity are pulled into Vector2Arrays of numpy columns, their sizes
+    and on_ground, on_ladder and jumping flags into arrays, moved in bulk
+    against the tile grids and pushed back. Entities
+    whose move touches a slope, a ladder or a platform are moved by their
+    own move_x or move_y instead, so every entity ends up where its
+    update() would have put it.
+    Entities need what Prototype.Player has: rect, velocity, info,
+    forward_edge, update(), move_x() and move_y().
+    @param min_batch: int below this many entities each one just runs its
+    own update()
+    """
+
+    def __init__(self, min_batch=8):
+        self.entities = []
+        self.min_batch = min_batch
+        self.position = self.velocity = self.gravity = None
+        self.width = self.height = None
+        self.on_ground = self.on_ladder = self.jumping = None
+        self.normal_x = self.normal_y = None
+
+    def add(self, entity):
+        self.entities.append(entity)
+
+    def remove(self, entity):
+        self.entities.remove(entity)
+
+    def __len__(self):
+        return len(self.entities)
+
+    def pull(self):
+        """
+
+        Copy the state of the entities into the arrays.
+        """
+        entities = self.entities
+        count = len(entities)
+
+        def gather(values, dtype):
+            return numpy.fromiter(values, dtype, count)
+
+        self.position = Vector2Array.from_columns(
+            gather((e.rect.x for e in entities), numpy.int64),
+            gather((e.rect.y for e in entities), numpy.int64))
+        self.width = gather((e.rect.width for e in entities), numpy.int64)
+        self.height = gather((e.rect.height for e in entities), numpy.int64)
+        self.velocity = Vector2Array.from_columns(
+            gather((e.velocity.x for e in entities), float),
+            gather((e.velocity.y for e in entities), float))
+        self.gravity = Vector2Array.from_columns(
+            numpy.zeros(count),
+            gather((e.info['gravity'] for e in entities), float))
+        self.on_ground = gather((e.info['on_ground'] for e in entities), bool)
+        self.on_ladder = gather((e.info['on_ladder'] for e in entities), bool)
+        self.jumping = gather((e.info['jumping'] for e in entities), bool)
+
+    def push(self, first_x, first_y):
+        """
+
+        Copy the arrays back into the entities.
+        @param first_x: x of every entity before the step
+        @param first_y: y of every entity before the step
+        """
+        columns = zip(self.entities, self.position.x.tolist(),
+                      self.position.y.tolist(), self.velocity.x.tolist(),
+                      self.velocity.y.tolist(),
+                      self.on_ground.tolist(), self.on_ladder.tolist(),
+                      self.jumping.tolist())
+        for i, (entity, x, y, velocity_x, velocity_y, on_ground, on_ladder,
+                jumping) in enumerate(columns):
+            entity.rect.x = x
+            entity.rect.y = y
+            entity.velocity.x = velocity_x
+            entity.velocity.y = velocity_y
+            entity.info['on_ground'] = on_ground
+            entity.info['on_ladder'] = on_ladder
+            entity.info['jumping'] = jumping
+            self.push_normal(i, entity, first_x, first_y)
+
+    def push_normal(self, i, entity, first_x, first_y):
+        """
+
+        Set the normal and forward edges of entity the way its
+        update_normal() did at the start of the step.
+        """
+        normal_x = int(self.normal_x[i])
+        normal_y = int(self.normal_y[i])
+        entity.info['normal'].x = normal_x
+        entity.info['normal'].y = normal_y
+        x = int(first_x[i])
+        y = int(first_y[i])
+        if normal_x:
+            entity.forward_edge.x = (x + int(self.width[i]) if normal_x > 0
+                                     else x)
+        else:
+            entity.forward_edge.x = None
+        if normal_y:
+            entity.forward_edge.y = (y + int(self.height[i]) if normal_y > 0
+                                     else y)
+        else:
+            entity.forward_edge.y = None
+
+    def move_scalar(self, i, axis, platform_group, tileset_group, first_x,
+                    first_y):
+        """
+
+        Move entity i along axis with its own code and read the result back.
+        @type i: int
+        @param axis: 'x' or 'y'
+        """
+        entity = self.entities[i]
+        entity.rect.x = int(self.position.x[i])
+        entity.rect.y = int(self.position.y[i])
+        entity.velocity.x = float(self.velocity.x[i])
+        entity.velocity.y = float(self.velocity.y[i])
+        entity.info['on_ground'] = bool(self.on_ground[i])
+        entity.info['on_ladder'] = bool(self.on_ladder[i])
+        entity.info['jumping'] = bool(self.jumping[i])
+        self.push_normal(i, entity, first_x, first_y)
+        if axis == 'x':
+            entity.move_x(platform_group, tileset_group)
+        else:
+            entity.move_y(platform_group, tileset_group)
+        self.position.x[i] = entity.rect.x
+        self.position.y[i] = entity.rect.y
+        self.velocity.x[i] = entity.velocity.x
+        self.velocity.y[i] = entity.velocity.y
+        self.on_ground[i] = entity.info['on_ground']
+        self.on_ladder[i] = entity.info['on_ladder']
+        self.jumping[i] = entity.info['jumping']
+
+    def near_platforms(self, moving, platform_group):
+        """
+
+        @param moving: indices of the entities about to move
+        @return: bool array, True for the ones with a platform close by
+        """
+        near = numpy.zeros(len(moving), bool)
+        if len(platform_group):
+            for j, i in enumerate(moving.tolist()):
+                entity = self.entities[i]
+                entity.rect.x = int(self.position.x[i])
+                entity.rect.y = int(self.position.y[i])
+                near[j] = bool(list(nearby_sprites(entity, platform_group)))
+        return near
+
+    def step(self, grids, platform_group, tileset_group):
+        """
+
+        @param grids: list of Physics.TileGrid, one per tileset, or None to
+            update the entities one by one
+        @param platform_group: Broadphase.GridGroup
+        @param tileset_group: Prototype.TileSetsContainer
+        """
+        if (grids is None or len(self.entities) < self.min_batch or
+                OVERLAY.enabled):
+            for entity in self.entities:
+                entity.update(platform_group, tileset_group)
+            return
+
+        self.pull()
+        first_x = self.position.x.copy()
+        first_y = self.position.y.copy()
+        self.normal_x = numpy.sign(self.velocity.x).astype(numpy.int64)
+        self.normal_y = numpy.sign(self.velocity.y).astype(numpy.int64)
+
+        for axis in ('x', 'y'):
+            normal = self.normal_x if axis == 'x' else self.normal_y
+            moving = numpy.flatnonzero(normal)
+            if not len(moving):
+                continue
+            scalar = self.near_platforms(moving, platform_group)
+            for grid in grids:
+                scalar |= self.needs_scalar(grid, axis, moving)
+            for i in moving[scalar].tolist():
+                self.move_scalar(i, axis, platform_group, tileset_group,
+                                 first_x, first_y)
+            if axis == 'x':
+                self.move_x(grids, moving[~scalar])
+            else:
+                self.move_y(grids, moving[~scalar])
+
+        self.jumping &= self.velocity.y < 0
+        self.velocity.x[:] = 0
+        self.velocity.add_to(self.gravity)
+        self.velocity.clamp_into(MIN_VELOCITY, MAX_VELOCITY)
+        self.push(first_x, first_y)
+
+    def needs_scalar(self, grid, axis, moving):
+        left = self.position.x[moving]
+        top = self.position.y[moving]
+        right = left + self.width[moving]
+        bottom = top + self.height[moving]
+        if axis == 'x':
+            return grid.needs_scalar_x(left, right, top, bottom,
+                                       self.velocity.x[moving])
+        return grid.needs_scalar_y(left, right, top, bottom,
+                                   self.velocity.y[moving])
+
+    def move_x(self, grids, moving):
+        """
+
+        Move the entities in moving along x, stopping flush against the first
+        blocking tile in the way like Player.react_x.
+        """
+        if not len(moving):
+            return
+        left = self.position.x[moving]
+        top = self.position.y[moving]
+        width = self.width[moving]
+        right = left + width
+        bottom = top + self.height[moving]
+        velocity = self.velocity.x[moving]
+        forward = velocity > 0
+        wall_right = numpy.full(len(moving), NO_TILE, numpy.int64)
+        wall_left = numpy.full(len(moving), -NO_TILE, numpy.int64)
+        for grid in grids:
+            wall_right = numpy.minimum(wall_right,
+                                       grid.blocking_right(right, top,
+                                                           bottom))
+            wall_left = numpy.maximum(wall_left,
+                                      grid.blocking_left(left, top, bottom))
+        moved = round_half_away(left + velocity)
+        hit_right = forward & (wall_right < right + velocity)
+        hit_left = ~forward & (wall_left > left + velocity)
+        moved = numpy.where(hit_right, wall_right - width, moved)
+        moved = numpy.where(hit_left, wall_left, moved)
+        self.position.x[moving] = moved
+
+    def move_y(self, grids, moving):
+        """
+
+        Move the entities in moving along y, landing on floors like
+        Player.react_y and bouncing off ceilings with a velocity of 0.5.
+        """
+        if not len(moving):
+            return
+        left = self.position.x[moving]
+        top = self.position.y[moving]
+        height = self.height[moving]
+        right = left + self.width[moving]
+        bottom = top + height
+        velocity = self.velocity.y[moving]
+        forward = velocity > 0
+        floor = numpy.full(len(moving), NO_TILE, numpy.int64)
+        ceiling = numpy.full(len(moving), -NO_TILE, numpy.int64)
+        for grid in grids:
+            floor = numpy.minimum(floor,
+                                  grid.blocking_below(bottom, left, right))
+            ceiling = numpy.maximum(ceiling,
+                                    grid.blocking_above(top, left, right))
+        moved = round_half_away(top + velocity)
+        landed = forward & (floor < bottom + velocity)
+        bumped = ~forward & (ceiling > top + velocity)
+        moved = numpy.where(landed, floor - height, moved)
+        moved = numpy.where(bumped, ceiling, moved)
+        self.position.y[moving] = moved
+        self.on_ground[moving[landed]] = True
+        self.velocity.y[moving[bumped]] = 0.5
+
+
+class World(object):
+    """
+
+    Steps every entity added to it, in one EntityBatch per entity class.
+    @type tileset_group: Prototype.TileSetsContainer
+    @param platform_group: Broadphase.GridGroup
+    @param min_batch: int
+    """
+
+    def __init__(self, tileset_group, platform_group, min_batch=8):
+        self.tileset_group = tileset_group
+        self.platform_group = platform_group
+        self.min_batch = min_batch
+        self.batches = {}
+        self.grids = None
+
+    def add(self, entity):
+        batch = self.batches.get(type(entity))
+        if batch is None:
+            batch = self.batches[type(entity)] = EntityBatch(self.min_batch)
+        batch.add(entity)
+
+    def remove(self, entity):
+        self.batches[type(entity)].remove(entity)
+
+    def get_grids(self):
+        """
+
+        @return: list of Physics.TileGrid, rebuilt for changed tilesets
+        """
+        if self.grids is None:
+            self.grids = [TileGrid(tileset)
+                          for tileset in self.tileset_group.tileset_list]
+        for grid in self.grids:
+            grid.refresh()
+        return self.grids
+
+    def step(self):
+        TRACE.frame += 1
+        grids = None
+        for batch in self.batches.values():
+            # the tables cover whole maps, streamed tilesets go one by one
+            if (numpy is not None and grids is None and
+                    not self.tileset_group.streaming and
+                    len(batch) >= batch.min_batch):
+                grids = self.get_grids()
+            batch.step(grids, self.platform_group, self.tileset_group)
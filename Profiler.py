@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# coding=utf-8
+import csv
+import json
+import time
+from Backend import pygame
+
+HUD_REFRESH_FRAMES = 30
+HUD_COLOUR = (255, 255, 255)
+HUD_BACKGROUND = (0, 0, 0)
+
+
+class PhaseStats(object):
+    """
+
+    The last window durations of one phase in a ring, plus the count and
+    the longest one since the start. Recording is a store and a compare,
+    the sorting for the percentiles only happens when they are asked for.
+    @param window: int how many of the last durations are kept
+    """
+
+    def __init__(self, window):
+        self.samples = [0] * window
+        self.index = 0
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, duration):
+        """
+
+        @param duration: int nanoseconds
+        """
+        self.samples[self.index] = duration
+        self.index += 1
+        if self.index == len(self.samples):
+            self.index = 0
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def get_summary(self):
+        """
+
+        @return: dict with the count and the mean, p95, p99 and max of the
+            window and the max since the start, in microseconds
+        """
+        ordered = sorted(self.samples[:min(self.count, len(self.samples))])
+        if not ordered:
+            ordered = [0]
+        last = len(ordered) - 1
+        return {
+            'count': self.count,
+            'mean_us': sum(ordered) / len(ordered) / 1000,
+            'p95_us': ordered[min(int(len(ordered) * 0.95), last)] / 1000,
+            'p99_us': ordered[min(int(len(ordered) * 0.99), last)] / 1000,
+            'max_us': ordered[last] / 1000,
+            'all_time_max_us': self.max / 1000,
+            'all_time_mean_us': (self.total / self.count / 1000
+                                 if self.count else 0)
+        }
+
+
+class Profiler(object):
+    """
+
+    Times the phases of a frame. A phase is timed by taking start = now()
+    before it and start = lap(name, start) after it, so back to back phases
+    share one clock read. While disabled now() and lap() return 0 without
+    reading the clock, and the HUD is only drawn when hud is set.
+    @param enabled: bool
+    @param window: int how many of the last durations of every phase the
+        percentiles are taken over
+    """
+
+    def __init__(self, enabled=False, window=600):
+        self.enabled = enabled
+        self.hud = False
+        self.window = window
+        self.phases = {}
+        self.frames = 0
+        self.hud_surface = None
+        self.font = None
+
+    def toggle_hud(self):
+        """
+
+        Show or hide the HUD, showing it also starts the profiling.
+        """
+        self.hud = not self.hud
+        if self.hud:
+            self.enabled = True
+        self.hud_surface = None
+
+    def reset(self):
+        """
+
+        Forget every phase recorded so far.
+        """
+        self.phases = {}
+        self.hud_surface = None
+
+    def now(self):
+        """
+
+        @return: int nanoseconds, 0 while disabled
+        """
+        if self.enabled:
+            return time.perf_counter_ns()
+        return 0
+
+    def lap(self, name, start):
+        """
+
+        Record the time from start to now as one run of the phase name.
+        @type name: str
+        @param start: int what now() or lap() returned before the phase
+        @return: int nanoseconds, the start of the next phase
+        """
+        if not self.enabled:
+            return 0
+        now = time.perf_counter_ns()
+        self.record(name, now - start)
+        return now
+
+    def record(self, name, duration):
+        """
+
+        @type name: str
+        @param duration: int nanoseconds
+        """
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats(self.window)
+        stats.record(duration)
+
+    def get_report(self):
+        """
+
+        @return: list of dicts, one per phase in the order they were first
+            recorded
+        """
+        report = []
+        for name, stats in self.phases.items():
+            summary = stats.get_summary()
+            summary['phase'] = name
+            for key in summary:
+                if key.endswith('_us'):
+                    summary[key] = round(summary[key], 3)
+            report.append(summary)
+        return report
+
+    def dump(self, path):
+        """
+
+        Write the report as CSV if path ends in .csv, as JSON otherwise.
+        @type path: str
+        """
+        report = self.get_report()
+        with open(path, 'w', newline='') as out_file:
+            if path.endswith('.csv'):
+                fields = ['phase', 'count', 'mean_us', 'p95_us', 'p99_us',
+                          'max_us', 'all_time_mean_us', 'all_time_max_us']
+                writer = csv.DictWriter(out_file, fields)
+                writer.writeheader()
+                writer.writerows(report)
+            else:
+                json.dump(report, out_file, indent=1)
+
+    def draw(self, screen, dirty=None):
+        """
+
+        Draw the HUD in the top left corner. The text is only rendered again
+        every HUD_REFRESH_FRAMES frames, in between the last one is blitted.
+        @type screen: pygame.Surface
+        @param dirty: Rendering.DirtyRects
+        """
+        if not self.hud:
+            return
+        self.frames += 1
+        if self.hud_surface is None or self.frames >= HUD_REFRESH_FRAMES:
+            self.frames = 0
+            self.hud_surface = self.render_hud()
+        area = screen.blit(self.hud_surface, (4, 4))
+        if dirty is not None:
+            dirty.add(area)
+
+    def render_hud(self):
+        """
+
+        @return: pygame.Surface
+        """
+        if self.font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            self.font = pygame.font.SysFont('monospace', 13)
+        font = self.font
+        lines = ['%-22s %8s %8s %8s %8s' % ('phase (us)', 'mean', 'p95',
+                                              'p99', 'max')]
+        for summary in self.get_report():
+            lines.append('%(phase)-22s %(mean_us)8.1f %(p95_us)8.1f '
+                         '%(p99_us)8.1f %(max_us)8.1f' % summary)
+        images = [font.render(line, True, HUD_COLOUR, HUD_BACKGROUND)
+                  for line in lines]
+        width = max(image.get_width() for image in images)
+        height = sum(image.get_height() for image in images)
+        # noinspection PyArgumentList
+        surface = pygame.Surface((width, height))
+        surface.fill(HUD_BACKGROUND)
+        y = 0
+        for image in images:
+            surface.blit(image, (0, y))
+            y += image.get_height()
+        surface.set_alpha(200)
+        return surface
+
+
+PROFILER = Profiler()
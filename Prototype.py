@@ -20,10 +20,272 @@ Prototype is going to try to make a reusable version of Tile Base (Smooth)
 
 """
 
+import time
+# the clock for the time to first frame starts before the other imports
+STARTED = time.perf_counter()
 import sys
+import atexit
+from array import array
+from collections import OrderedDict
 from Helpers import *
+from Geometry.Hit import Hit
+from Rendering import (ChunkRenderer, DirtyRects, ParallaxBackground,
+                       ParallaxLayer)
+from Debug import OVERLAY
+from Profiler import PROFILER
+from Trace import TRACE, DEBUG, INFO, WARNING
+from Broadphase import GridGroup, SweepAndPrune
+from Physics import World
+from Timestep import FixedTimestep, Interpolation
+from Backend import Rect, Sprite
+from Levels import DEMO_LEVEL
+from LevelFile import LevelLayer, load_level
+from Ladders import LadderIndex
+from Replay import InputRecorder, load_replay, PRESS, RELEASE
+from LevelCache import (level_key, cache_path, read_cache, write_cache,
+                        pack_surface, DEFAULT_CACHE_DIR)
+
+# the simulation runs in fixed steps of STEP_MS, the old frame length, and
+# catches up at most MAX_CATCH_UP_STEPS per rendered frame
+STEP_MS = 15
+MAX_CATCH_UP_STEPS = 5
+RENDER_FPS = 144
+
+EMPTY_TILE = 0
+
+BACKGROUND_COLOUR = (125, 199, 245)
+# background layers back to front: (image path, scroll (x, y), how far the
+# bottom of the image hangs below the bottom of the map, repeat_x,
+# repeat_y), see Rendering.ParallaxLayer
+BACKGROUND_LAYERS = [
+    ('data/Background/blocks.png', (0.5, 1), 32, True, False),
+]
+
+# tile id -> (type, image path or fill colour, slope points)
+TILE_DEFINITIONS = [
+    ('', (0, 0, 0, 0), None),
+    ('solid', (150, 79, 35), None),
+    ('solid', (245, 208, 0), None),
+    ('solid', (0, 247, 0), None),
+    ('solid', (0, 100, 0), None),
+    ('', (248, 144, 72), None),
+    ('', (88, 200, 255), None),
+    ('', (128, 184, 80), None),
+    ('', (224, 224, 224), None),
+    ('slope', 'data/Tiles/Slope/Left/frame752.png', [0, 32]),
+    ('slope', 'data/Tiles/Slope/Left/frame818.png', [0, 32]),
+    ('slope', 'data/Tiles/Slope/Left/frame877.png', [0, 16]),
+    ('slope', 'data/Tiles/Slope/Left/frame878.png', [17, 32]),
+    ('slope', 'data/Tiles/Slope/Right/frame750.png', [32, 0]),
+    ('slope', 'data/Tiles/Slope/Right/frame815.png', [32, 0]),
+    ('slope', 'data/Tiles/Slope/Right/frame707.png', [16, 0]),
+    ('slope', 'data/Tiles/Slope/Right/frame706.png', [32, 17]),
+    ('one-way', (0, 224, 24), None),
+    ('ladder', (255, 255, 255), None),
+    #  ('ladder_top', (255, 150, 200), None),
+    ('ladder', (255, 255, 255), None),
+]
+
+TILES_TRACE = TRACE.channel('tiles')
+SLOPE_TRACE = TRACE.channel('slope')
+LADDER_TRACE = TRACE.channel('ladder')
+STARTUP_TRACE = TRACE.channel('startup')
+REPLAY_TRACE = TRACE.channel('replay')
+# where F5 writes the trace when no --trace-out is given
+DEFAULT_TRACE_PATH = 'trace.jsonl'
+
+# collision kinds, compared instead of the tile type strings in hot loops
+KIND_NONE, KIND_SOLID, KIND_ONE_WAY, KIND_SLOPE, KIND_LADDER = range(5)
+TYPE_KINDS = {
+    'solid': KIND_SOLID,
+    'one-way': KIND_ONE_WAY,
+    'slope': KIND_SLOPE,
+    'ladder': KIND_LADDER,
+    'ladder_top': KIND_LADDER
+}
+
+# kinds of runs kept in the per row and per column index of a TileSet
+RUN_KINDS = (KIND_SOLID, KIND_ONE_WAY, KIND_SLOPE, KIND_LADDER)
+BLOCKING_RUNS = (KIND_SOLID, KIND_SLOPE)
+SCAN_X_RUNS = (KIND_SOLID, KIND_SLOPE, KIND_LADDER)
+SWEEP_RUNS = (KIND_SOLID, KIND_ONE_WAY, KIND_SLOPE)
+# kinds of tiles that can be stood on
+GROUND_KINDS = (KIND_SOLID, KIND_ONE_WAY, KIND_SLOPE)
+
+# what a StreamingTileSet answers for the tiles of a chunk that is not
+# loaded when it takes those for solid
+UNLOADED_TILE = 1
+# rough sizes in bytes of what a loaded chunk holds, for the memory budget:
+# a run start and end in the run lists, the runs of one row or column and
+# a Tile built by get_tile
+RUN_BYTES = 72
+LINE_BYTES = 400
+TILE_BYTES = 600
+
+# slope points are given in pixels of a tile this big and scaled to the
+# size of the tiles they are used in
+SLOPE_UNIT = 32
+
+
+class TileType(object):
+    """
+
+    Everything the tiles of one id share. The image is loaded once and
+    handed to every tile of this type. Solid, one-way and slope tiles have
+    a floor, the distance from the top of the tile down to the ground in
+    every pixel column, made once per tile size.
+    @type tile_id: int
+    @type t_type: str
+    @param img_path: str or tuple fill colour
+    @type slope_pts: list
+    """
+
+    def __init__(self, tile_id, t_type, img_path, slope_pts=None):
+        self.tile_id = tile_id
+        self.t_type = t_type
+        self.img_path = img_path
+        self.kind = TYPE_KINDS.get(t_type, KIND_NONE)
+        if self.kind == KIND_NONE:
+            self.run_kind = None
+        else:
+            self.run_kind = self.kind
+        self.images = {}
+        self.floors = {}
+
+        self.info = {
+            'type': t_type,
+            'floor_y': None,
+            'adjacent_tile': False
+        }
+
+        if self.kind == KIND_SLOPE:
+            self.info['floor_y'] = Vector2(slope_pts[0], slope_pts[1])
+            if slope_pts[0] == 0:
+                self.info['adjacent_tile'] = 'left'
+            elif slope_pts[1] == 0:
+                self.info['adjacent_tile'] = 'right'
+            self.get_floor(Vector2(SLOPE_UNIT, SLOPE_UNIT))
+
+    def get_floor(self, size):
+        """
+
+        The ground of this type in tiles of the given size, made once per
+        size.
+        @type size: Geometry.Vector2
+        @return: array.array of the pixels from the top of the tile down to
+            the ground, one per pixel column, None for tiles without ground
+        """
+        key = (size.x, size.y)
+        floor = self.floors.get(key)
+        if floor is not None or self.kind not in GROUND_KINDS:
+            return floor
+        if self.kind == KIND_SLOPE:
+            left = self.info['floor_y'].x * size.y / SLOPE_UNIT
+            right = self.info['floor_y'].y * size.y / SLOPE_UNIT
+            # sampled in the middle of every column
+            floor = array('H', (int(left + (right - left) * (i + 0.5) /
+                                    size.x + 0.5) for i in range(size.x)))
+        else:
+            floor = array('H', bytes(2 * size.x))
+        self.floors[key] = floor
+        return floor
+
+    def floor_under(self, left, right, size):
+        """
+
+        Highest ground under the span from left to right, both in pixels
+        from the left edge of the tile. Spans reaching past the tile take
+        the ground at its nearest edge.
+        @type left: int
+        @type right: int
+        @type size: Geometry.Vector2
+        @return: int pixels from the top of the tile down to the ground
+        """
+        floor = self.get_floor(size)
+        first = min(max(int(left), 0), size.x - 1)
+        last = min(max(int(math.ceil(right)) - 1, first), size.x - 1)
+        return min(floor[first:last + 1])
+
+    def get_image(self, size):
+        """
+
+        Image of this type for tiles of the given size, made once per size.
+        @type size: Geometry.Vector2
+        @return: pygame.Surface, None without pygame
+        """
+        key = (size.x, size.y)
+        if key in self.images:
+            return self.images[key]
+        if pygame is None:
+            # headless, nothing is ever drawn
+            return None
+        if type(self.img_path) is str and self.images:
+            # file images do not depend on the tile size
+            image = next(iter(self.images.values()))
+        elif type(self.img_path) is str:
+            try:
+                image = pygame.image.load(self.img_path)
+                if pygame.display.get_surface() is not None:
+                    image = image.convert_alpha()
+            except (pygame.error, IOError):
+                TILES_TRACE.record(WARNING, 'image missing',
+                                   path=self.img_path)
+                # noinspection PyArgumentList
+                image = pygame.Surface(key, pygame.SRCALPHA)
+                image.fill((1, 1, 1))
+        else:
+            # noinspection PyArgumentList
+            image = pygame.Surface(key, pygame.SRCALPHA)
+            image.fill(self.img_path)
+            if pygame.display.get_surface() is not None:
+                image = image.convert_alpha()
+        self.images[key] = image
+        return image
+
 
-FPS = 1000 / 15
+class TileTypeRegistry(object):
+    """
+
+    One TileType per tile id, plus flat per id tables for the hot loops.
+    """
+
+    def __init__(self):
+        self.types = []
+        self.kinds = []
+        self.run_kinds = []
+        self.adjacent = []
+
+    def register(self, tile_id, t_type, img_path, slope_pts=None):
+        """
+
+        @type tile_id: int
+        @type t_type: str
+        @param img_path: str or tuple fill colour
+        @type slope_pts: list
+        @return: Prototype.TileType
+        """
+        tile_type = TileType(tile_id, t_type, img_path, slope_pts)
+        while len(self.types) <= tile_id:
+            self.types.append(None)
+            self.kinds.append(KIND_NONE)
+            self.run_kinds.append(None)
+            self.adjacent.append(False)
+        self.types[tile_id] = tile_type
+        self.kinds[tile_id] = tile_type.kind
+        self.run_kinds[tile_id] = tile_type.run_kind
+        self.adjacent[tile_id] = tile_type.info['adjacent_tile']
+        return tile_type
+
+    def __getitem__(self, tile_id):
+        return self.types[tile_id]
+
+    def __len__(self):
+        return len(self.types)
+
+
+TILE_REGISTRY = TileTypeRegistry()
+for _tile_id, _definition in enumerate(TILE_DEFINITIONS):
+    TILE_REGISTRY.register(_tile_id, *_definition)
 
 
 class TileSetsContainer(object):
@@ -36,8 +298,18 @@ class TileSetsContainer(object):
         self.tileset_list = tileset_list
         self.tileset_order = {}
         for tmp_tileset in tileset_list:
-            tmp_tileset.draw()
             self.tileset_order[tmp_tileset.priority] = tmp_tileset
+        self.streaming = any(tileset.streaming for tileset in tileset_list)
+
+    def stream(self, areas):
+        """
+
+        Page the chunks of every StreamingTileSet in and out around areas.
+        @param areas: list of pygame.Rect in world space
+        """
+        for tileset in self.tileset_list:
+            if tileset.streaming:
+                tileset.stream(areas)
 
     def draw(self, screen, camera):
         """
@@ -46,73 +318,456 @@ class TileSetsContainer(object):
         @param camera: Helpers.Camera
         """
         for i in range(len(self.tileset_order) - 1, -1, -1):
-            screen.blit(self.tileset_order[i].image,
-                        camera.apply(self.tileset_order[i]))
+            self.tileset_order[i].draw(screen, camera)
+
+    def sweep(self, rect, velocity):
+        """
+
+        First blocking contact over all tilesets.
+        @type rect: pygame.Rect
+        @type velocity: Geometry.Vector2
+        @return: Geometry.Hit
+        """
+        first_hit = None
+        for tileset in self.tileset_list:
+            hit = tileset.sweep(rect, velocity)
+            if hit is not None and (first_hit is None or
+                                    hit.time < first_hit.time):
+                first_hit = hit
+        return first_hit
+
+    def ground_height(self, left, right, top, bottom):
+        """
+
+        Highest ground of all the tilesets, see TileSet.ground_height().
+        @type left: int
+        @type right: int
+        @type top: int
+        @type bottom: int
+        @return: int world y of the ground, None when there is none
+        """
+        highest = None
+        for tileset in self.tileset_list:
+            ground = tileset.ground_height(left, right, top, bottom)
+            if ground is not None and (highest is None or ground < highest):
+                highest = ground
+        return highest
+
+    def sweep_ladder(self, rect, velocity):
+        """
+
+        @type rect: pygame.Rect
+        @type velocity: Geometry.Vector2
+        @return: Ladders.LadderSegment or None
+        """
+        for tileset in self.tileset_list:
+            ladder = tileset.sweep_ladder(rect, velocity)
+            if ladder is not None:
+                return ladder
+        return None
 
 
 class TileSet(object):
     """
 
-    @type level: list
+    @param level: list of rows of tile ids, or a LevelFile.LevelLayer whose
+        tile ids are used as they are
     @type screen: pygame.Surface
     @type tile_size: Geometry.Vector2
     @type priority: int
     @param debugging: bool
+    @param indexes: dict from get_indexes() of a tileset of the same level
+        to use instead of building them, or None
     """
+    streaming = False
 
-    def __init__(self, level, screen, tile_size, priority, debugging):
+    def __init__(self, level, screen, tile_size, priority, debugging,
+                 indexes=None):
+        if not isinstance(level, LevelLayer):
+            level = LevelLayer.from_rows(level)
         self.size_info = dict()
         self.size_info['tile'] = tile_size
-        self.size_info['map'] = Vector2(len(level[0]), len(level))
-
-        # noinspection PyArgumentList
-        self.image = pygame.Surface((self.size_info['map'].x *
-                                     self.size_info['tile'].x,
-                                     self.size_info['map'].y *
-                                     self.size_info['tile'].y),
-                                    pygame.SRCALPHA)
-        self.rect = pygame.Rect(0, 0, self.size_info['map'].x *
-                                self.size_info['tile'].x,
-                                self.size_info['map'].y *
-                                self.size_info['tile'].y)
-        self.tile_array = {}
-        for x in range(0, self.size_info['map'].x):
-            for y in range(0, self.size_info['map'].y):
-                # noinspection PyTypeChecker
-                self.tile_array[x, y] = (self.make_tile
-                                         (level[y][x],
-                                          Vector2(
-                                              x * self.size_info['tile'].x,
-                                              y * self.size_info['tile'].y),
-                                          self.size_info['tile']))
+        self.size_info['map'] = Vector2(level.width, level.height)
+
+        self.rect = Rect(0, 0, self.size_info['map'].x *
+                         self.size_info['tile'].x,
+                         self.size_info['map'].y *
+                         self.size_info['tile'].y)
+        self.tile_rect = Rect(0, 0, self.size_info['tile'].x,
+                              self.size_info['tile'].y)
+
+        # tile ids are stored row by row, the cell (x, y) lives at
+        # tile_ids[y * map width + x]
+        self.tile_ids = level.tile_ids
+        self.tile_cache = {}
+        self.tile_array = TileArray(self)
+
         self.ladder_list = []
-        for x in range(0, self.size_info['map'].x):
-            for y in range(0, self.size_info['map'].y):
-                if (self.tile_array[x, y].tile_info['type'] == 'ladder' or
-                        self.tile_array[x, y].tile_info['type'] == 'ladder_top'):  # TODO add logic for top_ladder
-                    self.ladder_list.append(self.tile_array[x, y])
+        self.ladders = LadderIndex(self.size_info['tile'])
+        self.row_runs = []
+        self.column_runs = []
+        self.slope_excluded = None
+        if indexes is None:
+            self.build_indexes()
+        else:
+            self.load_indexes(indexes)
 
         self.priority = priority
-        self.not_considered_tiles = []
+        self.renderer = ChunkRenderer(self)
+        # bumped by set_tile so things built from the grid know to rebuild
+        self.revision = 0
 
-        self.debug_screen = None
-        self.debug_img = None
         if debugging:
-            self.debug = True
-            self.debug_init(screen)
-        else:
-            self.debug = False
+            OVERLAY.enabled = True
+
+    def build_indexes(self):
+        """
+
+        Build the ladder list, the run index and the slope exclusion flags
+        of the whole tileset.
+        """
+        self.build_ladder_list()
+        self.build_run_index()
+        # 1 for tiles next to the tall edge of a slope, they are left out of
+        # the x collision checks while standing on a slope
+        self.slope_excluded = bytearray(len(self.tile_ids))
+        for y in range(0, self.size_info['map'].y):
+            for x in range(0, self.size_info['map'].x):
+                self.update_slope_excluded(x, y)
+
+    def get_indexes(self):
+        """
+
+        What build_indexes() made, as plain data that can be stored.
+        @return: dict
+        """
+        return {
+            'row_runs': self.row_runs,
+            'column_runs': self.column_runs,
+            'slope_excluded': bytes(self.slope_excluded),
+            'ladders': [(ladder.tile_coords.x, ladder.tile_coords.y)
+                        for ladder in self.ladder_list]
+        }
+
+    def load_indexes(self, indexes):
+        """
+
+        @param indexes: dict from get_indexes()
+        """
+        self.row_runs = indexes['row_runs']
+        self.column_runs = indexes['column_runs']
+        self.slope_excluded = bytearray(indexes['slope_excluded'])
+        self.ladder_list = [self.get_tile(x, y) for x, y in indexes['ladders']]
+        self.ladders.build(indexes['ladders'])
+
+    def build_ladder_list(self):
+        """
+
+        Collect every ladder tile of the tileset into self.ladder_list and
+        index them as segments in self.ladders.
+        """
+        self.ladder_list = []
+        for y in range(0, self.size_info['map'].y):
+            row = y * self.size_info['map'].x
+            for x in range(0, self.size_info['map'].x):
+                if TILE_REGISTRY.kinds[self.tile_ids[row + x]] == KIND_LADDER:
+                    self.ladder_list.append(self.get_tile(x, y))
+        self.ladders.build((ladder.tile_coords.x, ladder.tile_coords.y)
+                           for ladder in self.ladder_list)
+
+    def build_run_index(self):
+        """
+
+        Index the solid, one-way, slope and ladder runs of every row and
+        column so the nearest one can be found with a binary search.
+        """
+        self.row_runs = [self.build_row_runs(y)
+                         for y in range(0, self.size_info['map'].y)]
+        self.column_runs = [self.build_column_runs(x)
+                            for x in range(0, self.size_info['map'].x)]
+
+    def build_row_runs(self, y):
+        """
+
+        @type y: int
+        @return: dict
+        """
+        row = y * self.size_info['map'].x
+        return build_runs([TILE_REGISTRY.run_kinds[tile_id] for tile_id in
+                           self.tile_ids[row:row + self.size_info['map'].x]],
+                          RUN_KINDS)
+
+    def build_column_runs(self, x):
+        """
 
-    def debug_init(self, screen):
+        @type x: int
+        @return: dict
+        """
+        return build_runs([TILE_REGISTRY.run_kinds[tile_id] for tile_id in
+                           self.tile_ids[x::self.size_info['map'].x]],
+                          RUN_KINDS)
+
+    # The find_* methods search no further than last when it is given, a
+    # StreamingTileSet uses it to leave chunks out of reach alone.
+
+    def find_right(self, y, x, kinds=BLOCKING_RUNS, last=None):
+        """
+
+        First column at or right of x in row y holding one of kinds.
+        @type y: int
+        @type x: int
+        @type kinds: tuple
+        @param last: int last column searched, or None for the whole row
+        @return: int or None
+        """
+        if not 0 <= y < self.size_info['map'].y:
+            return None
+        found = first_in_runs(self.row_runs[y], max(x, 0), kinds)
+        if last is not None and found is not None and found > last:
+            return None
+        return found
+
+    def find_left(self, y, x, kinds=BLOCKING_RUNS, last=None):
+        """
+
+        Last column at or left of x in row y holding one of kinds.
+        @type y: int
+        @type x: int
+        @type kinds: tuple
+        @param last: int last column searched, or None for the whole row
+        @return: int or None
+        """
+        if not 0 <= y < self.size_info['map'].y or x < 0:
+            return None
+        found = last_in_runs(self.row_runs[y], x, kinds)
+        if last is not None and found is not None and found < last:
+            return None
+        return found
+
+    def find_below(self, x, y, kinds=BLOCKING_RUNS, last=None):
+        """
+
+        First row at or below y in column x holding one of kinds.
+        @type x: int
+        @type y: int
+        @type kinds: tuple
+        @param last: int last row searched, or None for the whole column
+        @return: int or None
+        """
+        if not 0 <= x < self.size_info['map'].x:
+            return None
+        found = first_in_runs(self.column_runs[x], max(y, 0), kinds)
+        if last is not None and found is not None and found > last:
+            return None
+        return found
+
+    def find_above(self, x, y, kinds=BLOCKING_RUNS, last=None):
         """
 
-        @param screen: pygame.Display
+        Last row at or above y in column x holding one of kinds.
+        @type x: int
+        @type y: int
+        @type kinds: tuple
+        @param last: int last row searched, or None for the whole column
+        @return: int or None
+        """
+        if not 0 <= x < self.size_info['map'].x or y < 0:
+            return None
+        found = last_in_runs(self.column_runs[x], y, kinds)
+        if last is not None and found is not None and found < last:
+            return None
+        return found
+
+    def scan_end(self, start, step):
         """
-        self.debug_screen = screen
-        # noinspection PyArgumentList
-        self.debug_img = pygame.Surface((self.size_info['tile'].x,
-                                         self.size_info['tile'].y))
-        self.debug_img.fill((255, 0, 0))
+
+        Last cell the scan_* methods look at, going from start by step.
+        @type start: int
+        @param step: int 1 or -1
+        @return: int or None for up to the edge of the map
+        """
+        return None
+
+    def update_slope_excluded(self, x, y):
+        """
+
+        Recompute the slope exclusion flag of the tile at (x, y) from its
+        left and right neighbours.
+        @type x: int
+        @type y: int
+        """
+        row = y * self.size_info['map'].x
+        adjacent = TILE_REGISTRY.adjacent
+        excluded = ((x + 1 < self.size_info['map'].x and
+                     adjacent[self.tile_ids[row + x + 1]] == 'left') or
+                    (x > 0 and adjacent[self.tile_ids[row + x - 1]] == 'right'))
+        self.slope_excluded[row + x] = excluded
+
+    def is_slope_excluded(self, x, y):
+        """
+
+        @type x: int
+        @type y: int
+        @return: bool
+        """
+        return (self.in_bounds(x, y) and
+                self.slope_excluded[y * self.size_info['map'].x + x] == 1)
+
+    def on_slope(self, rect):
+        """
+
+        True when a slope tile is under the bottom edge of rect.
+        @type rect: pygame.Rect
+        @return: bool
+        """
+        first_column = max(rect.left // self.size_info['tile'].x, 0)
+        last_column = min((rect.right - 1) // self.size_info['tile'].x,
+                          self.size_info['map'].x - 1)
+        for y in {(rect.bottom - 1) // self.size_info['tile'].y,
+                  rect.bottom // self.size_info['tile'].y}:
+            if 0 <= y < self.size_info['map'].y:
+                x = self.find_right(y, first_column, (KIND_SLOPE,),
+                                    last_column)
+                if x is not None:
+                    return True
+        return False
+
+    def ground_height(self, left, right, top, bottom):
+        """
+
+        Highest ground under the span from left to right in the rows from
+        top to bottom, going by the floors of the tile types.
+        @param left: int world x
+        @param right: int world x, left out
+        @param top: int world y
+        @param bottom: int world y, left out
+        @return: int world y of the ground, None when there is none
+        """
+        tile_size = self.size_info['tile']
+        first_column = max(left // tile_size.x, 0)
+        last_column = min((right - 1) // tile_size.x,
+                          self.size_info['map'].x - 1)
+        first_row = max(top // tile_size.y, 0)
+        last_row = min((bottom - 1) // tile_size.y,
+                       self.size_info['map'].y - 1)
+        kinds = TILE_REGISTRY.kinds
+        for y in range(first_row, last_row + 1):
+            ground = None
+            row = self.get_row(y, first_column, last_column + 1)
+            for i, tile_id in enumerate(row):
+                if kinds[tile_id] not in GROUND_KINDS:
+                    continue
+                x = (first_column + i) * tile_size.x
+                floor = y * tile_size.y + TILE_REGISTRY[tile_id].floor_under(
+                    left - x, right - x, tile_size)
+                if ground is None or floor < ground:
+                    ground = floor
+            # the ground of any lower row is below the top of this one
+            if ground is not None:
+                return ground
+        return None
+
+    def in_bounds(self, x, y):
+        """
+
+        @type x: int
+        @type y: int
+        @return: bool
+        """
+        return (0 <= x < self.size_info['map'].x and
+                0 <= y < self.size_info['map'].y)
+
+    def get_tile_id(self, x, y):
+        """
+
+        @type x: int
+        @type y: int
+        @return: int
+        """
+        if not self.in_bounds(x, y):
+            raise KeyError((x, y))
+        return self.tile_ids[y * self.size_info['map'].x + x]
+
+    def get_row(self, y, first_x, last_x):
+        """
+
+        @type y: int
+        @type first_x: int
+        @param last_x: int first column left out
+        @return: sequence of tile ids
+        """
+        row = y * self.size_info['map'].x
+        return self.tile_ids[row + first_x:row + last_x]
+
+    def get_tile_type(self, x, y):
+        """
+
+        @type x: int
+        @type y: int
+        @return: str
+        """
+        return TILE_REGISTRY[self.get_tile_id(x, y)].t_type
+
+    def get_tile_kind(self, x, y):
+        """
+
+        @type x: int
+        @type y: int
+        @return: int
+        """
+        return TILE_REGISTRY.kinds[self.get_tile_id(x, y)]
+
+    def get_tile(self, x, y):
+        """
+
+        Tiles are only built when something asks for them, after that the
+        same Tile is handed out until the cell changes.
+        @type x: int
+        @type y: int
+        @return: Prototype.Tile
+        """
+        try:
+            return self.tile_cache[x, y]
+        except KeyError:
+            tile = self.make_tile(self.get_tile_id(x, y),
+                                  Vector2(x * self.size_info['tile'].x,
+                                          y * self.size_info['tile'].y),
+                                  self.size_info['tile'])
+            self.tile_cache[x, y] = tile
+            return tile
+
+    def set_tile(self, x, y, tile_id):
+        """
+
+        @type x: int
+        @type y: int
+        @type tile_id: int
+        """
+        old_kind = self.get_tile_kind(x, y)
+        self.tile_ids[y * self.size_info['map'].x + x] = tile_id
+        self.tile_cache.pop((x, y), None)
+        self.row_runs[y] = self.build_row_runs(y)
+        self.column_runs[x] = self.build_column_runs(x)
+        for neighbour_x in range(max(x - 1, 0),
+                                 min(x + 2, self.size_info['map'].x)):
+            self.update_slope_excluded(neighbour_x, y)
+        self.renderer.invalidate(x, y)
+        self.revision += 1
+        if (old_kind == KIND_LADDER or
+                TILE_REGISTRY.kinds[tile_id] == KIND_LADDER):
+            self.build_ladder_list()
+
+    def type_mask(self, types):
+        """
+
+        1 for every cell holding a tile of one of types, row by row like
+        tile_ids.
+        @type types: tuple
+        @return: bytes
+        """
+        lookup = bytes(TILE_REGISTRY[tile_id].t_type in types
+                       for tile_id in range(len(TILE_REGISTRY)))
+        return bytes(lookup[tile_id] for tile_id in self.tile_ids)
 
     @staticmethod
     def make_tile(tile_id, tile_position, tile_size):
@@ -122,76 +777,36 @@ class TileSet(object):
         @type tile_position: Geometry.Vector2
         @param tile_size: Geometry.Vector2
         """
-        tile = None
-        if tile_id == 0:
-            tile = Tile(tile_position, '', tile_size, (0, 0, 0, 0))
-        elif tile_id == 1:
-            tile = Tile(tile_position, 'solid', tile_size, (150, 79, 35))
-        elif tile_id == 2:
-            tile = Tile(tile_position, 'solid', tile_size, (245, 208, 0))
-        elif tile_id == 3:
-            tile = Tile(tile_position, 'solid', tile_size, (0, 247, 0))
-        elif tile_id == 4:
-            tile = Tile(tile_position, 'solid', tile_size, (0, 100, 0))
-        elif tile_id == 5:
-            tile = Tile(tile_position, '', tile_size, (248, 144, 72))
-        elif tile_id == 6:
-            tile = Tile(tile_position, '', tile_size, (88, 200, 255))
-        elif tile_id == 7:
-            tile = Tile(tile_position, '', tile_size, (128, 184, 80))
-        elif tile_id == 8:
-            tile = Tile(tile_position, '', tile_size, (224, 224, 224))
-        elif tile_id == 9:
-            tile = Tile(tile_position, 'slope', tile_size,
-                        'data/Tiles/Slope/Left/frame752.png', [0, 32])
-        elif tile_id == 10:
-            tile = Tile(tile_position, 'slope', tile_size,
-                        'data/Tiles/Slope/Left/frame818.png', [0, 32])
-        elif tile_id == 11:
-            tile = Tile(tile_position, 'slope', tile_size,
-                        'data/Tiles/Slope/Left/frame877.png', [0, 16])
-        elif tile_id == 12:
-            tile = Tile(tile_position, 'slope', tile_size,
-                        'data/Tiles/Slope/Left/frame878.png', [17, 32])
-        elif tile_id == 13:
-            tile = Tile(tile_position, 'slope', tile_size,
-                        'data/Tiles/Slope/Right/frame750.png', [32, 0])
-        elif tile_id == 14:
-            tile = Tile(tile_position, 'slope', tile_size,
-                        'data/Tiles/Slope/Right/frame815.png', [32, 0])
-        elif tile_id == 15:
-            tile = Tile(tile_position, 'slope', tile_size,
-                        'data/Tiles/Slope/Right/frame707.png', [16, 0])
-        elif tile_id == 16:
-            tile = Tile(tile_position, 'slope', tile_size,
-                        'data/Tiles/Slope/Right/frame706.png', [32, 17])
-        elif tile_id == 17:
-            tile = Tile(tile_position, 'one-way', tile_size, (0, 224, 24))
-        elif tile_id == 18:
-            tile = Tile(tile_position, 'ladder', tile_size, (255, 255, 255))
-        elif tile_id == 19:
-            #  tile = Tile(tile_position, 'ladder_top', tile_size, (255, 150, 200))
-            tile = Tile(tile_position, 'ladder', tile_size, (255, 255, 255))
-        return tile
-
-    def draw(self):
-        """
-
-        Draw tiles on tileset image
-        """
-        for x in range(0, self.size_info['map'].x):
-            for y in range(0, self.size_info['map'].y):
-                tmp_tile = self.tile_array[x, y]
-                self.image.blit(tmp_tile.image,
-                                (tmp_tile.rect.x, tmp_tile.rect.y))
-
-    def debug_draw(self, x, y):
-        """
-
-        @param x: int
-        @param y: int
-        """
-        self.debug_screen.blit(self.debug_img, (x, y))
+        return Tile(tile_position, TILE_REGISTRY[tile_id], tile_size)
+
+    def draw(self, screen, camera):
+        """
+
+        @type screen: pygame.Surface
+        @param camera: Helpers.Camera
+        """
+        self.renderer.draw(screen, camera)
+
+    def draw_tiles(self, surface, first_x, first_y, last_x, last_y):
+        """
+
+        Draw the tiles from (first_x, first_y) up to but not including
+        (last_x, last_y) on surface, the first tile goes at (0, 0).
+        @type surface: pygame.Surface
+        @type first_x: int
+        @type first_y: int
+        @type last_x: int
+        @type last_y: int
+        """
+        for y in range(first_y, last_y):
+            for x, tile_id in enumerate(self.get_row(y, first_x, last_x),
+                                        first_x):
+                if tile_id == EMPTY_TILE:
+                    continue
+                surface.blit(TILE_REGISTRY[tile_id].get_image(
+                                 self.size_info['tile']),
+                             ((x - first_x) * self.size_info['tile'].x,
+                              (y - first_y) * self.size_info['tile'].y))
 
     # noinspection PyUnusedLocal
     def scan_x_right(self, y, tile_x, entity):
@@ -203,32 +818,11 @@ class TileSet(object):
         @return: list
         """
         solid_tile_list = []
-        for x in range(tile_x - 1, self.size_info['map'].x):
-            try:
-                tmp_tile = self.tile_array[x, y]
-                if tmp_tile.tile_info['type'] != '':
-                    if tmp_tile.tile_info['type'] == 'slope':
-                        solid_tile_list.append(tmp_tile)
-                        if tmp_tile.tile_info['adjacent_tile'] == 'left':
-                            self.not_considered_tiles.append(
-                                self.tile_array[x - 1, y])
-                        elif tmp_tile.tile_info['adjacent_tile'] == 'right':
-                            self.not_considered_tiles.append(
-                                self.tile_array[x + 1, y])
-                        if self.debug:
-                            self.debug_draw(tmp_tile.rect.x, tmp_tile.rect.y)
-                    elif tmp_tile.tile_info['type'] == 'one-way':
-                        pass
-                    elif tmp_tile.tile_info['type'] == 'ladder' or tmp_tile.tile_info['type'] == 'ladder_top':
-                        solid_tile_list.append(tmp_tile)
-                        if self.debug:
-                            self.debug_draw(tmp_tile.rect.x, tmp_tile.rect.y)
-                    else:
-                        solid_tile_list.append(tmp_tile)
-                        if self.debug:
-                            self.debug_draw(tmp_tile.rect.x, tmp_tile.rect.y)
-            except KeyError:
-                print("scan_y_right: KeyError out of tileset bounds")
+        last = self.scan_end(tile_x - 1, 1)
+        x = self.find_right(y, tile_x - 1, SCAN_X_RUNS, last)
+        while x is not None:
+            solid_tile_list.append(self.scanned_tile(x, y))
+            x = self.find_right(y, x + 1, SCAN_X_RUNS, last)
         return solid_tile_list
 
     # noinspection PyUnusedLocal
@@ -241,34 +835,27 @@ class TileSet(object):
         @return: list
         """
         solid_tile_list = []
-        for x in range(tile_x, -1, -1):
-            try:
-                tmp_tile = self.tile_array[x, y]
-                if tmp_tile.tile_info['type'] != '':
-                    if tmp_tile.tile_info['type'] == 'slope':
-                        solid_tile_list.append(tmp_tile)
-                        if tmp_tile.tile_info['adjacent_tile'] == 'left':
-                            self.not_considered_tiles.append(
-                                self.tile_array[x - 1, y])
-                        elif tmp_tile.tile_info['adjacent_tile'] == 'right':
-                            self.not_considered_tiles.append(
-                                self.tile_array[x + 1, y])
-                        if self.debug:
-                            self.debug_draw(tmp_tile.rect.x, tmp_tile.rect.y)
-                    elif tmp_tile.tile_info['type'] == 'one-way':
-                        pass
-                    elif tmp_tile.tile_info['type'] == 'ladder' or tmp_tile.tile_info['type'] == 'ladder_top':
-                        solid_tile_list.append(tmp_tile)
-                        if self.debug:
-                            self.debug_draw(tmp_tile.rect.x, tmp_tile.rect.y)
-                    else:
-                        solid_tile_list.append(tmp_tile)
-                        if self.debug:
-                            self.debug_draw(tmp_tile.rect.x, tmp_tile.rect.y)
-            except KeyError:
-                print("scan_y_left: KeyError out of tileset bounds")
+        tile_x = min(tile_x, self.size_info['map'].x - 1)
+        last = self.scan_end(tile_x, -1)
+        x = self.find_left(y, tile_x, SCAN_X_RUNS, last)
+        while x is not None:
+            solid_tile_list.append(self.scanned_tile(x, y))
+            x = self.find_left(y, x - 1, SCAN_X_RUNS, last)
         return solid_tile_list
 
+    def scanned_tile(self, x, y):
+        """
+
+        Tile at (x, y) found by one of the x scans.
+        @type x: int
+        @type y: int
+        @return: Prototype.Tile
+        """
+        tmp_tile = self.get_tile(x, y)
+        if OVERLAY.enabled:
+            OVERLAY.highlight_tile(tmp_tile.rect, (255, 0, 0))
+        return tmp_tile
+
     def scan_y_bottom(self, x, tile_y, entity):
         """
 
@@ -278,23 +865,13 @@ class TileSet(object):
         @return: list
         """
         solid_tile_list = []
-        for y in range(tile_y - 1, self.size_info['map'].y):
-            try:
-                tmp_tile = self.tile_array[x, y]
-                if tmp_tile.tile_info['type'] != '':
-                    if tmp_tile.tile_info['type'] == 'one-way':
-                        if one_way_platform_checker(entity, tmp_tile):
-                            solid_tile_list.append(tmp_tile)
-                    elif tmp_tile.tile_info['type'] == 'ladder' or tmp_tile.tile_info['type'] == 'ladder_top':
-                        solid_tile_list.append(tmp_tile)
-                        if self.debug:
-                            self.debug_draw(tmp_tile.rect.x, tmp_tile.rect.y)
-                    else:
-                        solid_tile_list.append(tmp_tile)
-                        if self.debug:
-                            self.debug_draw(tmp_tile.rect.x, tmp_tile.rect.y)
-            except KeyError:
-                print("scan_y_bottom: KeyError out of tileset bounds")
+        last = self.scan_end(tile_y - 1, 1)
+        y = self.find_below(x, tile_y - 1, RUN_KINDS, last)
+        while y is not None:
+            tmp_tile = self.scanned_tile_y(x, y, entity)
+            if tmp_tile is not None:
+                solid_tile_list.append(tmp_tile)
+            y = self.find_below(x, y + 1, RUN_KINDS, last)
         return solid_tile_list
 
     def scan_y_top(self, x, tile_y, entity):
@@ -306,27 +883,733 @@ class TileSet(object):
         @return: list
         """
         solid_tile_list = []
-        for y in range(tile_y, -1, -1):
-            try:
-                tmp_tile = self.tile_array[x, y]
-                if tmp_tile.tile_info['type'] != '':
-                    if tmp_tile.tile_info['type'] == 'one-way':
-                        if one_way_platform_checker(entity, tmp_tile):
-                            solid_tile_list.append(tmp_tile)
-                    elif tmp_tile.tile_info['type'] == 'ladder' or tmp_tile.tile_info['type'] == 'ladder_top':
-                        solid_tile_list.append(tmp_tile)
-                        if self.debug:
-                            self.debug_draw(tmp_tile.rect.x, tmp_tile.rect.y)
-                    else:
-                        solid_tile_list.append(tmp_tile)
-                        if self.debug:
-                            self.debug_draw(tmp_tile.rect.x, tmp_tile.rect.y)
-            except KeyError:
-                print("scan_y_top: KeyError out of tileset bounds")
+        tile_y = min(tile_y, self.size_info['map'].y - 1)
+        last = self.scan_end(tile_y, -1)
+        y = self.find_above(x, tile_y, RUN_KINDS, last)
+        while y is not None:
+            tmp_tile = self.scanned_tile_y(x, y, entity)
+            if tmp_tile is not None:
+                solid_tile_list.append(tmp_tile)
+            y = self.find_above(x, y - 1, RUN_KINDS, last)
         return solid_tile_list
 
+    def scanned_tile_y(self, x, y, entity):
+        """
+
+        Tile at (x, y) found by one of the y scans, None for one-way tiles
+        the entity is not standing above.
+        @type x: int
+        @type y: int
+        @type entity: Prototype.Entity
+        @return: Prototype.Tile
+        """
+        tmp_tile = self.get_tile(x, y)
+        if tmp_tile.tile_type.kind == KIND_ONE_WAY:
+            if one_way_platform_checker(entity, tmp_tile):
+                return tmp_tile
+            return None
+        if OVERLAY.enabled:
+            OVERLAY.highlight_tile(tmp_tile.rect, (255, 0, 0))
+        return tmp_tile
+
+    def swept_range(self, rect, velocity):
+        """
+
+        Columns and rows covered by rect moving by velocity, ordered in the
+        direction of the move.
+        @type rect: pygame.Rect
+        @type velocity: Geometry.Vector2
+        @return: tuple (columns, rows)
+        """
+        tile_width = self.size_info['tile'].x
+        tile_height = self.size_info['tile'].y
+        first_column = max(int(min(rect.left, rect.left + velocity.x) //
+                               tile_width), 0)
+        last_column = min(int(math.ceil(max(rect.right,
+                                            rect.right + velocity.x) /
+                                        tile_width)),
+                          self.size_info['map'].x) - 1
+        first_row = max(int(min(rect.top, rect.top + velocity.y) //
+                            tile_height), 0)
+        last_row = min(int(math.ceil(max(rect.bottom,
+                                         rect.bottom + velocity.y) /
+                                     tile_height)),
+                       self.size_info['map'].y) - 1
+        if velocity.x < 0:
+            columns = range(last_column, first_column - 1, -1)
+        else:
+            columns = range(first_column, last_column + 1)
+        if velocity.y < 0:
+            rows = range(last_row, first_row - 1, -1)
+        else:
+            rows = range(first_row, last_row + 1)
+        return columns, rows
+
+    def sweep(self, rect, velocity):
+        """
+
+        Swept box query, moves rect by velocity and returns the first
+        blocking tile it runs into. Every row (or column) under the swept box
+        is searched through the run index in the direction of the move and
+        stops at its first contact.
+        @type rect: pygame.Rect
+        @type velocity: Geometry.Vector2
+        @return: Geometry.Hit
+        """
+        if velocity.x == 0 and velocity.y == 0:
+            return None
+        columns, rows = self.swept_range(rect, velocity)
+        if not columns or not rows:
+            return None
+
+        best = None
+        if abs(velocity.x) >= abs(velocity.y):
+            skip_excluded = self.on_slope(rect)
+            for y in rows:
+                if velocity.x > 0:
+                    x = self.find_right(y, columns[0], SWEEP_RUNS,
+                                        columns[-1])
+                else:
+                    x = self.find_left(y, columns[0], SWEEP_RUNS, columns[-1])
+                while x is not None and x in columns:
+                    if skip_excluded and self.is_slope_excluded(x, y):
+                        contact = None
+                    else:
+                        contact = self.sweep_tile(rect, velocity, x, y)
+                    if contact is not None:
+                        if best is None or contact[0] < best[0]:
+                            best = contact
+                        break
+                    if velocity.x > 0:
+                        x = self.find_right(y, x + 1, SWEEP_RUNS, columns[-1])
+                    else:
+                        x = self.find_left(y, x - 1, SWEEP_RUNS, columns[-1])
+        else:
+            for x in columns:
+                if velocity.y > 0:
+                    y = self.find_below(x, rows[0], SWEEP_RUNS, rows[-1])
+                else:
+                    y = self.find_above(x, rows[0], SWEEP_RUNS, rows[-1])
+                while y is not None and y in rows:
+                    contact = self.sweep_tile(rect, velocity, x, y)
+                    if contact is not None:
+                        if best is None or contact[0] < best[0]:
+                            best = contact
+                        break
+                    if velocity.y > 0:
+                        y = self.find_below(x, y + 1, SWEEP_RUNS, rows[-1])
+                    else:
+                        y = self.find_above(x, y - 1, SWEEP_RUNS, rows[-1])
+        if best is None:
+            return None
+        return Hit(best[0], Vector2(best[1], best[2]),
+                   self.get_tile(best[3], best[4]), best[5])
+
+    def sweep_tile(self, rect, velocity, x, y):
+        """
+
+        Contact of rect moving by velocity with the tile at (x, y).
+        @type rect: pygame.Rect
+        @type velocity: Geometry.Vector2
+        @type x: int
+        @type y: int
+        @return: tuple (time, normal x, normal y, x, y, type) or None
+        """
+        tile_width = self.size_info['tile'].x
+        tile_height = self.size_info['tile'].y
+        tile_type = TILE_REGISTRY[self.get_tile_id(x, y)]
+        if tile_type.kind == KIND_ONE_WAY:
+            if velocity.y <= 0 or rect.bottom - 1 > y * tile_height:
+                return None
+        elif tile_type.kind != KIND_SOLID and tile_type.kind != KIND_SLOPE:
+            return None
+        if (tile_type.kind == KIND_SLOPE and
+                rect.right > x * tile_width and
+                rect.left < (x + 1) * tile_width and
+                rect.bottom > y * tile_height and
+                rect.top < (y + 1) * tile_height):
+            # the floor of a slope is inside its tile, reaching it from
+            # within the tile counts as standing on it and anything above it
+            # is open
+            floor = y * tile_height + tile_type.floor_under(
+                min(rect.left, rect.left + velocity.x) - x * tile_width,
+                max(rect.right, rect.right + velocity.x) - x * tile_width,
+                self.size_info['tile'])
+            if velocity.y >= 0 and rect.bottom + velocity.y >= floor:
+                return 0, 0, -1, x, y, tile_type.t_type
+            return None
+        contact = swept_aabb(rect, velocity.x, velocity.y,
+                             x * tile_width, y * tile_height,
+                             (x + 1) * tile_width, (y + 1) * tile_height)
+        if contact is None:
+            return None
+        return contact[0], contact[1], contact[2], x, y, tile_type.t_type
+
+    def sweep_ladder(self, rect, velocity):
+        """
+
+        The ladder segment of the first ladder tile touched by rect while
+        it moves by velocity.
+        @type rect: pygame.Rect
+        @type velocity: Geometry.Vector2
+        @return: Ladders.LadderSegment or None
+        """
+        return self.ladders.find(rect, velocity)
+
+
+class TileChunk(object):
+    """
+
+    The tiles of one chunk of a StreamingTileSet with their run index and
+    slope exclusion flags, in the coordinates of the chunk, and the Tiles
+    built for it so far.
+    @type tile_ids: array.array
+    @type width: int
+    @type height: int
+    """
+
+    def __init__(self, tile_ids, width, height):
+        self.tile_ids = tile_ids
+        self.width = width
+        self.height = height
+        self.row_runs = [self.build_row_runs(y) for y in range(height)]
+        self.column_runs = [self.build_column_runs(x) for x in range(width)]
+        self.slope_excluded = bytearray(width * height)
+        self.tile_cache = {}
+        self.ladders = []
+        # set once a tile changes, the tiles are then kept when evicted
+        self.edited = False
+
+    def build_row_runs(self, y):
+        """
+
+        @type y: int
+        @return: dict
+        """
+        row = y * self.width
+        return build_runs([TILE_REGISTRY.run_kinds[tile_id] for tile_id in
+                           self.tile_ids[row:row + self.width]], RUN_KINDS)
+
+    def build_column_runs(self, x):
+        """
+
+        @type x: int
+        @return: dict
+        """
+        return build_runs([TILE_REGISTRY.run_kinds[tile_id] for tile_id in
+                           self.tile_ids[x::self.width]], RUN_KINDS)
+
+    def get_size(self):
+        """
+
+        @return: int estimated bytes held by the chunk
+        """
+        runs = 0
+        for line in self.row_runs + self.column_runs:
+            for starts, _ in line.values():
+                runs += len(starts)
+        return (len(self.tile_ids) * 3 + runs * RUN_BYTES +
+                (self.width + self.height) * LINE_BYTES +
+                len(self.tile_cache) * TILE_BYTES)
+
+
+class StreamingTileSet(TileSet):
+    """
+
+    A TileSet that only keeps the chunks near the camera and the active
+    entities in memory. stream() loads the chunks within margin of the
+    areas it is given and drops the least recently needed ones, with their
+    baked surfaces, while the estimated size of everything loaded is over
+    budget. Tile ids are read from level as chunks load, for a layer out of
+    a level file that is straight out of the memory map, and edited chunks
+    keep their tiles when they are dropped.
+    A query reaching a chunk that is not loaded loads it on the spot when
+    unloaded is 'block', or takes it for solid tiles when it is 'solid'.
+    Queries without a last cell look at most horizon tiles away.
+    @param level: list of rows of tile ids or a LevelFile.LevelLayer
+    @type screen: pygame.Surface
+    @type tile_size: Geometry.Vector2
+    @type priority: int
+    @param debugging: bool
+    @param chunk_tiles: int tiles along each side of a chunk
+    @param budget: int bytes
+    @param margin: int pixels around the streamed areas that are loaded too
+    @param unloaded: str 'block' or 'solid'
+    @param loads_per_stream: int most chunks loaded by one stream(), the
+        rest follow on the next ones
+    """
+    streaming = True
+
+    def __init__(self, level, screen, tile_size, priority, debugging,
+                 chunk_tiles=32, budget=64 * 1024 * 1024, margin=256,
+                 unloaded='block', loads_per_stream=8):
+        if unloaded not in ('block', 'solid'):
+            raise ValueError("unloaded must be 'block' or 'solid'")
+        if not isinstance(level, LevelLayer):
+            level = LevelLayer.from_rows(level)
+        self.source = level
+        self.chunk_tiles = chunk_tiles
+        self.budget = budget
+        self.margin = margin
+        self.unloaded = unloaded
+        self.loads_per_stream = loads_per_stream
+        self.horizon = chunk_tiles
+        self.chunks = OrderedDict()
+        self.edits = {}
+        self.memory_used = 0
+        self.loads = 0
+        self.evictions = 0
+        TileSet.__init__(self, level, screen, tile_size, priority, debugging)
+        # everything goes through the chunks from here on
+        self.tile_ids = None
+        self.chunk_size = Vector2(chunk_tiles * tile_size.x,
+                                  chunk_tiles * tile_size.y)
+        self.renderer = ChunkRenderer(self, chunk_tiles, budget)
+
+    def build_indexes(self):
+        """
+
+        Nothing is indexed until its chunk loads.
+        """
+        self.ladder_list = []
+
+    def stream(self, areas):
+        """
+
+        Load the chunks within margin of areas, in the order of areas, and
+        evict the least recently needed ones while over budget.
+        @param areas: list of pygame.Rect in world space, like the view of
+            the camera and the rects of the active entities
+        """
+        needed = OrderedDict()
+        map_size = self.size_info['map']
+        for area in areas:
+            first_x = max(int((area.left - self.margin) //
+                              self.chunk_size.x), 0)
+            first_y = max(int((area.top - self.margin) //
+                              self.chunk_size.y), 0)
+            last_x = min(int((area.right + self.margin) //
+                             self.chunk_size.x),
+                         (map_size.x - 1) // self.chunk_tiles)
+            last_y = min(int((area.bottom + self.margin) //
+                             self.chunk_size.y),
+                         (map_size.y - 1) // self.chunk_tiles)
+            for chunk_y in range(first_y, last_y + 1):
+                for chunk_x in range(first_x, last_x + 1):
+                    needed[chunk_x, chunk_y] = None
+        loads = 0
+        for key in needed:
+            if key in self.chunks:
+                self.chunks.move_to_end(key)
+            elif loads < self.loads_per_stream:
+                self.load_chunk(key[0], key[1])
+                loads += 1
+        self.evict(len(needed))
+
+    def evict(self, keep):
+        """
+
+        Drop the least recently needed chunks until under budget, the last
+        keep chunks are never dropped.
+        @type keep: int
+        """
+        while (self.memory_used + self.renderer.memory_used > self.budget and
+               len(self.chunks) > keep):
+            self.evict_chunk(next(iter(self.chunks)))
+
+    def evict_chunk(self, key):
+        """
+
+        @param key: tuple (chunk x, chunk y)
+        """
+        chunk = self.chunks.pop(key)
+        self.memory_used -= chunk.get_size()
+        if chunk.edited:
+            self.edits[key] = chunk.tile_ids
+        self.renderer.forget(key[0], key[1])
+        self.collect_ladders()
+        self.evictions += 1
+
+    def load_chunk(self, chunk_x, chunk_y):
+        """
+
+        @type chunk_x: int
+        @type chunk_y: int
+        @return: Prototype.TileChunk
+        """
+        map_width = self.size_info['map'].x
+        first_x = chunk_x * self.chunk_tiles
+        first_y = chunk_y * self.chunk_tiles
+        width = min(self.chunk_tiles, map_width - first_x)
+        height = min(self.chunk_tiles, self.size_info['map'].y - first_y)
+        tile_ids = self.edits.pop((chunk_x, chunk_y), None)
+        edited = tile_ids is not None
+        if tile_ids is None:
+            tile_ids = array('H')
+            for y in range(first_y, first_y + height):
+                row = y * map_width + first_x
+                tile_ids.extend(self.source.tile_ids[row:row + width])
+        chunk = TileChunk(tile_ids, width, height)
+        chunk.edited = edited
+        self.chunks[chunk_x, chunk_y] = chunk
+        for y in range(first_y, first_y + height):
+            for x in range(first_x, first_x + width):
+                self.update_slope_excluded(x, y)
+        self.find_ladders(chunk, first_x, first_y)
+        self.memory_used += chunk.get_size()
+        self.collect_ladders()
+        self.loads += 1
+        return chunk
+
+    def get_chunk(self, chunk_x, chunk_y, load=None):
+        """
+
+        @type chunk_x: int
+        @type chunk_y: int
+        @param load: bool load the chunk if it is not, None to go by
+            self.unloaded
+        @return: Prototype.TileChunk or None
+        """
+        chunk = self.chunks.get((chunk_x, chunk_y))
+        if chunk is None:
+            if load or load is None and self.unloaded == 'block':
+                chunk = self.load_chunk(chunk_x, chunk_y)
+        return chunk
+
+    def find_ladders(self, chunk, first_x, first_y):
+        """
+
+        @type chunk: Prototype.TileChunk
+        @param first_x: int column of the chunk's first tile
+        @param first_y: int row of the chunk's first tile
+        """
+        chunk.ladders = []
+        for i, tile_id in enumerate(chunk.tile_ids):
+            if TILE_REGISTRY.kinds[tile_id] == KIND_LADDER:
+                chunk.ladders.append(self.get_tile(first_x + i % chunk.width,
+                                                   first_y + i // chunk.width))
+
+    def collect_ladders(self):
+        self.ladder_list = [ladder for chunk in self.chunks.values()
+                            for ladder in chunk.ladders]
+        self.ladders.build((ladder.tile_coords.x, ladder.tile_coords.y)
+                           for ladder in self.ladder_list)
+
+    def peek_tile_id(self, x, y):
+        """
+
+        Tile id at (x, y) without loading anything.
+        @type x: int
+        @type y: int
+        @return: int
+        """
+        chunk_x, local_x = divmod(x, self.chunk_tiles)
+        chunk_y, local_y = divmod(y, self.chunk_tiles)
+        chunk = self.chunks.get((chunk_x, chunk_y))
+        if chunk is not None:
+            return chunk.tile_ids[local_y * chunk.width + local_x]
+        edited = self.edits.get((chunk_x, chunk_y))
+        if edited is not None:
+            width = min(self.chunk_tiles,
+                        self.size_info['map'].x - chunk_x * self.chunk_tiles)
+            return edited[local_y * width + local_x]
+        return self.source.tile_ids[y * self.size_info['map'].x + x]
+
+    def get_tile_id(self, x, y):
+        """
+
+        @type x: int
+        @type y: int
+        @return: int UNLOADED_TILE in a chunk that is not loaded
+        """
+        if not self.in_bounds(x, y):
+            raise KeyError((x, y))
+        chunk_x, local_x = divmod(x, self.chunk_tiles)
+        chunk_y, local_y = divmod(y, self.chunk_tiles)
+        chunk = self.get_chunk(chunk_x, chunk_y)
+        if chunk is None:
+            return UNLOADED_TILE
+        return chunk.tile_ids[local_y * chunk.width + local_x]
+
+    def get_row(self, y, first_x, last_x):
+        """
+
+        Loads the chunks it goes through whatever self.unloaded says.
+        @type y: int
+        @type first_x: int
+        @param last_x: int first column left out
+        @return: sequence of tile ids
+        """
+        chunk_y, local_y = divmod(y, self.chunk_tiles)
+        tile_ids = array('H')
+        x = first_x
+        while x < last_x:
+            chunk_x, local_x = divmod(x, self.chunk_tiles)
+            chunk = self.get_chunk(chunk_x, chunk_y, True)
+            end = min((chunk_x + 1) * self.chunk_tiles, last_x)
+            row = local_y * chunk.width
+            tile_ids.extend(chunk.tile_ids[row + local_x:row + local_x +
+                                           end - x])
+            x = end
+        return tile_ids
+
+    def get_tile(self, x, y):
+        """
+
+        @type x: int
+        @type y: int
+        @return: Prototype.Tile
+        """
+        if not self.in_bounds(x, y):
+            raise KeyError((x, y))
+        chunk_x, local_x = divmod(x, self.chunk_tiles)
+        chunk_y, local_y = divmod(y, self.chunk_tiles)
+        position = Vector2(x * self.size_info['tile'].x,
+                           y * self.size_info['tile'].y)
+        chunk = self.get_chunk(chunk_x, chunk_y)
+        if chunk is None:
+            return self.make_tile(UNLOADED_TILE, position,
+                                  self.size_info['tile'])
+        try:
+            return chunk.tile_cache[x, y]
+        except KeyError:
+            tile = self.make_tile(chunk.tile_ids[local_y * chunk.width +
+                                                 local_x],
+                                  position, self.size_info['tile'])
+            chunk.tile_cache[x, y] = tile
+            self.memory_used += TILE_BYTES
+            return tile
+
+    def set_tile(self, x, y, tile_id):
+        """
+
+        Loads the chunk of (x, y) whatever self.unloaded says.
+        @type x: int
+        @type y: int
+        @type tile_id: int
+        """
+        if not self.in_bounds(x, y):
+            raise KeyError((x, y))
+        chunk_x, local_x = divmod(x, self.chunk_tiles)
+        chunk_y, local_y = divmod(y, self.chunk_tiles)
+        chunk = self.get_chunk(chunk_x, chunk_y, True)
+        self.memory_used -= chunk.get_size()
+        chunk.tile_ids[local_y * chunk.width + local_x] = tile_id
+        chunk.edited = True
+        chunk.tile_cache.pop((x, y), None)
+        chunk.row_runs[local_y] = chunk.build_row_runs(local_y)
+        chunk.column_runs[local_x] = chunk.build_column_runs(local_x)
+        for neighbour_x in range(max(x - 1, 0),
+                                 min(x + 2, self.size_info['map'].x)):
+            self.update_slope_excluded(neighbour_x, y)
+        self.find_ladders(chunk, chunk_x * self.chunk_tiles,
+                          chunk_y * self.chunk_tiles)
+        self.collect_ladders()
+        self.memory_used += chunk.get_size()
+        self.renderer.invalidate(x, y)
+        self.revision += 1
+
+    def peek_row(self, y):
+        """
+
+        Tile ids of row y without loading anything.
+        @type y: int
+        @return: array of tile ids
+        """
+        map_width = self.size_info['map'].x
+        chunk_y, local_y = divmod(y, self.chunk_tiles)
+        tile_ids = array('H')
+        for first_x in range(0, map_width, self.chunk_tiles):
+            chunk_x = first_x // self.chunk_tiles
+            width = min(self.chunk_tiles, map_width - first_x)
+            chunk = self.chunks.get((chunk_x, chunk_y))
+            source = self.edits.get((chunk_x, chunk_y))
+            if chunk is not None:
+                source = chunk.tile_ids
+            if source is None:
+                row = y * map_width + first_x
+                tile_ids.extend(self.source.tile_ids[row:row + width])
+            else:
+                row = local_y * width
+                tile_ids.extend(source[row:row + width])
+        return tile_ids
+
+    def type_mask(self, types):
+        """
+
+        1 for every cell holding a tile of one of types, row by row, read
+        from the loaded chunks, the edits and the level without loading
+        anything.
+        @type types: tuple
+        @return: bytes
+        """
+        lookup = bytes(TILE_REGISTRY[tile_id].t_type in types
+                       for tile_id in range(len(TILE_REGISTRY)))
+        mask = bytearray()
+        for y in range(self.size_info['map'].y):
+            mask.extend(lookup[tile_id] for tile_id in self.peek_row(y))
+        return bytes(mask)
+
+    def update_slope_excluded(self, x, y):
+        """
+
+        @type x: int
+        @type y: int
+        """
+        chunk_x, local_x = divmod(x, self.chunk_tiles)
+        chunk_y, local_y = divmod(y, self.chunk_tiles)
+        chunk = self.chunks.get((chunk_x, chunk_y))
+        if chunk is None:
+            return
+        adjacent = TILE_REGISTRY.adjacent
+        chunk.slope_excluded[local_y * chunk.width + local_x] = (
+            (x + 1 < self.size_info['map'].x and
+             adjacent[self.peek_tile_id(x + 1, y)] == 'left') or
+            (x > 0 and adjacent[self.peek_tile_id(x - 1, y)] == 'right'))
+
+    def is_slope_excluded(self, x, y):
+        """
+
+        @type x: int
+        @type y: int
+        @return: bool
+        """
+        if not self.in_bounds(x, y):
+            return False
+        chunk_x, local_x = divmod(x, self.chunk_tiles)
+        chunk_y, local_y = divmod(y, self.chunk_tiles)
+        chunk = self.chunks.get((chunk_x, chunk_y))
+        return (chunk is not None and
+                chunk.slope_excluded[local_y * chunk.width + local_x] == 1)
+
+    def scan_end(self, start, step):
+        return start + step * self.horizon
+
+    def find_forward(self, line, start, kinds, last, along_x):
+        """
+
+        First cell at or after start, up to last, on a row (along_x) or a
+        column holding one of kinds.
+        @param line: int row or column
+        @type start: int
+        @type kinds: tuple
+        @param last: int or None for horizon cells on
+        @type along_x: bool
+        @return: int or None
+        """
+        size = self.size_info['map'].x if along_x else self.size_info['map'].y
+        start = max(start, 0)
+        if last is None:
+            last = start + self.horizon
+        last = min(last, size - 1)
+        line_chunk, local_line = divmod(line, self.chunk_tiles)
+        for i in range(start // self.chunk_tiles,
+                       last // self.chunk_tiles + 1):
+            first = i * self.chunk_tiles
+            if along_x:
+                chunk = self.get_chunk(i, line_chunk)
+            else:
+                chunk = self.get_chunk(line_chunk, i)
+            if chunk is None:
+                if KIND_SOLID not in kinds:
+                    continue
+                found = max(first, start)
+            else:
+                runs = (chunk.row_runs if along_x else
+                        chunk.column_runs)[local_line]
+                found = first_in_runs(runs, max(start - first, 0), kinds)
+                if found is None:
+                    continue
+                found += first
+            return found if found <= last else None
+        return None
+
+    def find_backward(self, line, start, kinds, last, along_x):
+        """
+
+        Last cell at or before start, down to last, on a row (along_x) or a
+        column holding one of kinds.
+        @param line: int row or column
+        @type start: int
+        @type kinds: tuple
+        @param last: int or None for horizon cells back
+        @type along_x: bool
+        @return: int or None
+        """
+        size = self.size_info['map'].x if along_x else self.size_info['map'].y
+        if start < 0:
+            return None
+        start = min(start, size - 1)
+        if last is None:
+            last = start - self.horizon
+        last = max(last, 0)
+        line_chunk, local_line = divmod(line, self.chunk_tiles)
+        for i in range(start // self.chunk_tiles,
+                       last // self.chunk_tiles - 1, -1):
+            first = i * self.chunk_tiles
+            if along_x:
+                chunk = self.get_chunk(i, line_chunk)
+            else:
+                chunk = self.get_chunk(line_chunk, i)
+            if chunk is None:
+                if KIND_SOLID not in kinds:
+                    continue
+                found = min(first + self.chunk_tiles - 1, start)
+            else:
+                runs = (chunk.row_runs if along_x else
+                        chunk.column_runs)[local_line]
+                found = last_in_runs(runs, start - first, kinds)
+                if found is None:
+                    continue
+                found += first
+            return found if found >= last else None
+        return None
+
+    def find_right(self, y, x, kinds=BLOCKING_RUNS, last=None):
+        if not 0 <= y < self.size_info['map'].y:
+            return None
+        return self.find_forward(y, x, kinds, last, True)
+
+    def find_left(self, y, x, kinds=BLOCKING_RUNS, last=None):
+        if not 0 <= y < self.size_info['map'].y:
+            return None
+        return self.find_backward(y, x, kinds, last, True)
+
+    def find_below(self, x, y, kinds=BLOCKING_RUNS, last=None):
+        if not 0 <= x < self.size_info['map'].x:
+            return None
+        return self.find_forward(x, y, kinds, last, False)
+
+    def find_above(self, x, y, kinds=BLOCKING_RUNS, last=None):
+        if not 0 <= x < self.size_info['map'].x:
+            return None
+        return self.find_backward(x, y, kinds, last, False)
+
+
+class TileArray(object):
+    """
+
+    Read-only view that lets tileset.tile_array[x, y] keep working on top of
+    the compact grid, it raises KeyError outside of the tileset like the old
+    dict did.
+    @type tileset: Prototype.TileSet
+    """
+
+    def __init__(self, tileset):
+        self.tileset = tileset
+
+    def __getitem__(self, coords):
+        return self.tileset.get_tile(coords[0], coords[1])
 
-class Entity(pygame.sprite.Sprite):
+    def __contains__(self, coords):
+        return self.tileset.in_bounds(coords[0], coords[1])
+
+    def __len__(self):
+        map_size = self.tileset.size_info['map']
+        return map_size.x * map_size.y
+
+
+class Entity(Sprite):
     """
 
     Entity() is a parent class which will have Children like Player,
@@ -334,63 +1617,47 @@ class Entity(pygame.sprite.Sprite):
     """
 
     def __init__(self):
-        pygame.sprite.Sprite.__init__(self)
+        Sprite.__init__(self)
+
+    def collide_entity(self, contact):
+        """
+
+        Called for every contact this entity is part of, as contact.a or
+        contact.b.
+        @type contact: Geometry.Contact
+        """
+        pass
 
 
 class Tile(Entity):
     """
 
+    A tile only knows where it is, the rest is shared through its TileType.
     @param position: Geometry.Vector2
-    @param t_type: str
+    @param tile_type: Prototype.TileType
     @param dimensions: Geometry.Vector2
-    @param img_path: str
-    @param slope_pts: list
     """
 
-    def __init__(self, position, t_type, dimensions, img_path, slope_pts=None):
+    def __init__(self, position, tile_type, dimensions):
         Entity.__init__(self)
-        self.rect = pygame.Rect(position.x, position.y, dimensions.x,
-                                dimensions.y)
+        self.rect = Rect(position.x, position.y, dimensions.x, dimensions.y)
         self.tile_coords = Vector2(position.x // dimensions.x,
                                    position.y // dimensions.y)
-        # noinspection PyArgumentList
-        self.image = pygame.Surface((self.rect.width, self.rect.height),
-                                    pygame.SRCALPHA)
-        if type(img_path) is str:
-            try:
-                self.image = pygame.image.load(img_path).convert_alpha()
-            except pygame.error:
-                print("Image", img_path, "is missing!")
-                self.image.fill((1, 1, 1))
-        elif type(img_path) is tuple:
-            self.image.fill(img_path)
-
-        self.tile_info = {
-            'type': t_type,
-            'floor_y': None,
-            'tall_edge': None,
-            'short_edge': None,
-            'adjacent_tile': False
-        }
+        self.tile_type = tile_type
+        self.image = tile_type.get_image(dimensions)
+        self.tile_info = tile_type.info
+        self.size = dimensions
 
-        if self.tile_info['type'] == 'slope':
-            self.tile_info['floor_y'] = Vector2(slope_pts[0],
-                                                slope_pts[1])
-            if slope_pts[0] > slope_pts[1]:
-                self.tile_info['tall_edge'] = self.rect.left
-                self.tile_info['short_edge'] = self.rect.right
-            elif slope_pts[0] < slope_pts[1]:
-                self.tile_info['tall_edge'] = self.rect.right
-                self.tile_info['short_edge'] = self.rect.left
-            if slope_pts[0] == 0:
-                self.tile_info['adjacent_tile'] = 'left'
-            elif slope_pts[1] == 0:
-                self.tile_info['adjacent_tile'] = 'right'
-            if ((self.tile_info['floor_y'].x == 0 and self.tile_info['floor_y'].y == 32) or
-                    (self.tile_info['floor_y'].x == 32 and self.tile_info['floor_y'].y == 0)):
-                self.hack_for_slope = True
-            else:
-                self.hack_for_slope = False
+    def get_ground(self, left, right):
+        """
+
+        @param left: int world x
+        @param right: int world x, left out
+        @return: int world y of the highest ground of the tile under the
+            span, see TileType.floor_under()
+        """
+        return self.rect.top + self.tile_type.floor_under(
+            left - self.rect.x, right - self.rect.x, self.size)
 
 
 class Player(Entity):
@@ -404,13 +1671,15 @@ class Player(Entity):
 
     def __init__(self, position, dimensions, screen, debugging):
         Entity.__init__(self)
-        self.rect = pygame.Rect(position.x, position.y,
-                                dimensions.x, dimensions.y)
-        # noinspection PyArgumentList
-        self.image = pygame.Surface((self.rect.width, self.rect.height))
-        self.image.fill((234, 0, 0))
+        self.rect = Rect(position.x, position.y, dimensions.x, dimensions.y)
+        self.image = None
+        if pygame is not None:
+            # noinspection PyArgumentList
+            self.image = pygame.Surface((self.rect.width, self.rect.height))
+            self.image.fill((234, 0, 0))
         self.velocity = Vector2(0, 0)
         self.forward_edge = Vector2()
+        self.sweep_velocity = Vector2()
 
         self.info = {
             'normal': Vector2(0, 0),
@@ -426,25 +1695,31 @@ class Player(Entity):
             'gravity': 0.9
         }
 
-        self.debug_screen = None
         if debugging:
-            self.debug = True
-            self.debug_init(screen)
-        else:
-            self.debug = False
+            OVERLAY.enabled = True
 
-    def debug_init(self, screen):
+    def update(self, platform_group, tileset_group):
         """
 
-        @param screen: pygame.Display
+        @param platform_group: Broadphase.GridGroup
+        @param tileset_group:  Prototype.TileSetContainer
         """
-        self.debug_screen = screen
+        self.update_normal()
+        if self.info['normal'].x:
+            self.move_x(platform_group, tileset_group)
+        if self.info['normal'].y:
+            self.move_y(platform_group, tileset_group)
 
-    def update(self, platform_group, tileset_group):
+        self.info['jumping'] = self.info['jumping'] and self.velocity.y < 0
+        self.velocity.x = 0
+        # if not self.info['on_ladder']:  # Counteract this below
+        self.velocity.y = min(self.velocity.y + self.info['gravity'], 15)
+
+    def update_normal(self):
         """
 
-        @param platform_group: pygame.Sprite.Group
-        @param tileset_group:  Prototype.TileSetContainer
+        Point the normal and the forward edges in the direction of the
+        velocity.
         """
         if self.velocity.x > 0:
             self.info['normal'].x = 1
@@ -466,58 +1741,89 @@ class Player(Entity):
             self.info['normal'].y = 0
             self.forward_edge.y = None
 
-        if self.info['normal'].x:
-            close_tile_list = []
-            possible_platforms = scan_for_platforms_y(self, platform_group)
-            if possible_platforms is not []:
-                for platform in possible_platforms:
-                    close_tile_list.append(platform)
-            for tileset in tileset_group.tileset_list:
-                tiles_to_check = scan_for_tiles_x(tileset, self)
-                close_tile_list.append(closest_tile_x(tiles_to_check, self))
-            new_ladder_closest = closest_ladder_x(close_tile_list, self)
-            new_closest = closest_from_list_x(close_tile_list, self)
-            if new_closest is not None:
-                if (new_closest.tile_info['type'] == 'solid' or
-                        new_closest.tile_info['type'] == 'one-way'):
-                    self.react_x(new_closest)
-                elif new_closest.tile_info['type'] == 'slope':
-                    # print("do x sloped tiles")
-                    self.rect.x += self.velocity.x
-                    self.react_slope_x(new_closest)
-            elif new_ladder_closest is None:
+    def move_x(self, platform_group, tileset_group):
+        """
+
+        Move along x by velocity.x and react to what is in the way.
+        @param platform_group: Broadphase.GridGroup
+        @param tileset_group:  Prototype.TileSetContainer
+        """
+        start = PROFILER.now()
+        close_tile_list = scan_for_platforms_y(self, platform_group)
+        start = PROFILER.lap('player platforms', start)
+        velocity_x = self.sweep_velocity.set(self.velocity.x, 0)
+        hit = tileset_group.sweep(self.rect, velocity_x)
+        if hit is not None:
+            close_tile_list.append(hit.tile)
+        if OVERLAY.enabled:
+            self.debug_sweep(velocity_x, hit)
+        new_ladder_closest = tileset_group.sweep_ladder(self.rect, velocity_x)
+        start = PROFILER.lap('player tiles', start)
+        new_closest = closest_from_list_x(close_tile_list, self)
+        start = PROFILER.lap('player closest', start)
+        if new_closest is not None:
+            if (new_closest.tile_info['type'] == 'solid' or
+                    new_closest.tile_info['type'] == 'one-way'):
+                self.react_x(new_closest)
+            elif new_closest.tile_info['type'] == 'slope':
+                # print("do x sloped tiles")
                 self.rect.x += self.velocity.x
+                self.react_slope_x(new_closest)
+        elif new_ladder_closest is None:
+            self.rect.x += self.velocity.x
 
-            if new_ladder_closest is not None:
-                self.react_ladder_x(new_ladder_closest)
-        if self.info['normal'].y:
-            close_tile_list = []
-            possible_platforms = scan_for_platforms_x(self, platform_group)
-            if possible_platforms is not []:
-                for platform in possible_platforms:
-                    close_tile_list.append(platform)
-            for tileset in tileset_group.tileset_list:
-                tiles_to_check = scan_for_tiles_y(tileset, self)
-                close_tile_list.append(closest_tile_y(tiles_to_check, self))
-            new_ladder_closest = closest_ladder_x(close_tile_list, self)
-            new_closest = closest_from_list_y(close_tile_list, self)
-            if new_closest is not None:
-                if (new_closest.tile_info['type'] == 'solid' or
-                        new_closest.tile_info['type'] == 'one-way'):
-                    self.react_y(new_closest)
-                elif new_closest.tile_info['type'] == 'slope':
-                    # print("do y sloped tiles")
-                    self.react_slope_y(new_closest)
-            elif new_ladder_closest is None:
-                self.rect.y += self.velocity.y
+        if new_ladder_closest is not None:
+            self.react_ladder_x(new_ladder_closest)
+        PROFILER.lap('player react', start)
 
-            if new_ladder_closest is not None:
-                self.react_ladder_y(new_ladder_closest)
+    def move_y(self, platform_group, tileset_group):
+        """
 
-        self.info['jumping'] = self.info['jumping'] and self.velocity.y < 0
-        self.velocity.x = 0
-        # if not self.info['on_ladder']:  # Counteract this below
-        self.velocity.y = min(self.velocity.y + self.info['gravity'], 15)
+        Move along y by velocity.y and react to what is in the way.
+        @param platform_group: Broadphase.GridGroup
+        @param tileset_group:  Prototype.TileSetContainer
+        """
+        start = PROFILER.now()
+        close_tile_list = scan_for_platforms_x(self, platform_group)
+        start = PROFILER.lap('player platforms', start)
+        velocity_y = self.sweep_velocity.set(0, self.velocity.y)
+        hit = tileset_group.sweep(self.rect, velocity_y)
+        if hit is not None:
+            close_tile_list.append(hit.tile)
+        if OVERLAY.enabled:
+            self.debug_sweep(velocity_y, hit)
+        new_ladder_closest = tileset_group.sweep_ladder(self.rect, velocity_y)
+        start = PROFILER.lap('player tiles', start)
+        new_closest = closest_from_list_y(close_tile_list, self)
+        start = PROFILER.lap('player closest', start)
+        if new_closest is not None:
+            if (new_closest.tile_info['type'] == 'solid' or
+                    new_closest.tile_info['type'] == 'one-way'):
+                self.react_y(new_closest)
+            elif new_closest.tile_info['type'] == 'slope':
+                # print("do y sloped tiles")
+                self.react_slope_y(new_closest)
+        elif new_ladder_closest is None:
+            self.rect.y += self.velocity.y
+
+        if new_ladder_closest is not None:
+            self.react_ladder_y(new_ladder_closest)
+        PROFILER.lap('player react', start)
+
+    def debug_sweep(self, velocity, hit):
+        """
+
+        Show the swept area and the contact of a sweep on the debug overlay.
+        @type velocity: Geometry.Vector2
+        @type hit: Geometry.Hit
+        """
+        OVERLAY.query_range(self.rect.union(self.rect.move(velocity.x,
+                                                           velocity.y)),
+                            (0, 255, 255))
+        if hit is not None:
+            OVERLAY.contact(self.rect.centerx + velocity.x * hit.time,
+                            self.rect.centery + velocity.y * hit.time,
+                            hit.normal)
 
     def react_x(self, close_tile):
         """
@@ -562,26 +1868,18 @@ class Player(Entity):
         @param close_tile: Prototype.Tile
         """
         if self.info['normal'].y >= 0:
-            # print("close_tile left:", close_tile.rect.x)
-            if (close_tile.tile_info['floor_y'].x >
-                    close_tile.tile_info['floor_y'].y):
-                t = (self.rect.centerx - close_tile.rect.x) / 32
-            else:
-                t = (self.rect.centerx - close_tile.rect.x) / 32
-                # t = (self.rect.centerx - close_tile.rect.x) / 32
-            floor_y = (((1.0 - t) * close_tile.tile_info['floor_y'].x + t *
-                        close_tile.tile_info['floor_y'].y) +
-                       close_tile.tile_coords.y * close_tile.rect.height -
-                       self.rect.width)
-            print('react_slope_x floor_y:', floor_y)
+            floor_y = close_tile.get_ground(self.rect.left, self.rect.right)
+            if SLOPE_TRACE.level <= DEBUG:
+                SLOPE_TRACE.record(DEBUG, 'floor', entity=id(self),
+                                   x=close_tile.tile_coords.x,
+                                   y=close_tile.tile_coords.y,
+                                   floor_y=floor_y)
             if (self.rect.bottom + self.velocity.y) <= floor_y:
                 # print("going down and not past close_tile")
                 self.rect.y += self.velocity.y
             else:
                 self.rect.bottom = floor_y
                 self.info['on_ground'] = True
-            if self.info['normal'].x < 0 and close_tile.hack_for_slope:
-                self.rect.bottom -= 5
 
     def react_slope_y(self, close_tile):
         """
@@ -589,18 +1887,12 @@ class Player(Entity):
         @param close_tile: Prototype.Tile
         """
         if self.info['normal'].y >= 0:
-            # print("close_tile left:", close_tile.rect.x)
-            if (close_tile.tile_info['floor_y'].x >
-                    close_tile.tile_info['floor_y'].y):
-                t = (self.rect.right - close_tile.rect.x) / 32
-            else:
-                t = (self.rect.left - close_tile.rect.x) / 32
-                # t = (self.rect.centerx - close_tile.rect.x) / 32
-            floor_y = max(close_tile.rect.top,
-                          ((1.0 - t) * close_tile.tile_info['floor_y'].x +
-                           t * close_tile.tile_info['floor_y'].y +
-                           close_tile.tile_coords.y * close_tile.rect.height))
-            print('react_slope_y floor_y:', floor_y)
+            floor_y = close_tile.get_ground(self.rect.left, self.rect.right)
+            if SLOPE_TRACE.level <= DEBUG:
+                SLOPE_TRACE.record(DEBUG, 'floor', entity=id(self),
+                                   x=close_tile.tile_coords.x,
+                                   y=close_tile.tile_coords.y,
+                                   floor_y=floor_y)
             if (self.rect.bottom + self.velocity.y) <= floor_y:
                 # print("going down and not past close_tile")
                 self.rect.y += self.velocity.y
@@ -608,22 +1900,32 @@ class Player(Entity):
                 self.rect.bottom = floor_y
                 self.info['on_ground'] = True
 
-    def pre_react_ladder(self, close_tile):
-        print('on_ladder: ', self.info['on_ladder'])
-        print('hit_up:', self.info['hit_up'])
-        print('hit_down:', self.info['hit_down'])
-        print('hit_jump:', self.info['hit_jump'])
-        if (self.rect.colliderect(close_tile.rect) or self.info['hit_up'] or
+    def pre_react_ladder(self, ladder):
+        """
+
+        Get on a ladder when touching it or climbing, or when climbing down
+        from its top, off it when jumping or no longer touching it.
+        @param ladder: Ladders.LadderSegment
+        """
+        if LADDER_TRACE.level <= DEBUG:
+            LADDER_TRACE.record(DEBUG, 'ladder', entity=id(self),
+                                x=ladder.column, y=ladder.top,
+                                on_ladder=self.info['on_ladder'],
+                                hit_up=self.info['hit_up'],
+                                hit_down=self.info['hit_down'],
+                                hit_jump=self.info['hit_jump'])
+        if (self.rect.colliderect(ladder.rect) or self.info['hit_up'] or
                 self.info['hit_down']):
             self.info['on_ladder'] = True
         if self.info['on_ladder'] and self.info['hit_jump']:
             self.info['on_ladder'] = False
             self.rect.y -= 2
-        if not self.rect.colliderect(close_tile.rect):
-            self.info['on_ladder'] = False
+        if not self.rect.colliderect(ladder.rect):
+            self.info['on_ladder'] = (self.info['hit_down'] and
+                                      ladder.is_under(self.rect))
 
-    def react_ladder_x(self, close_tile):
-        self.pre_react_ladder(close_tile)
+    def react_ladder_x(self, ladder):
+        self.pre_react_ladder(ladder)
         # print('make react_ladder_x')
         if self.info['on_ladder']:
             if self.info['hit_left']:
@@ -633,224 +1935,459 @@ class Player(Entity):
             return
         self.rect.x += self.velocity.x
 
-    def react_ladder_y(self, close_tile):
-        self.pre_react_ladder(close_tile)
-        # print('make react_ladder_y')
+    def react_ladder_y(self, ladder):
+        """
+
+        Climb the ladder, stepping off onto its top when climbing out over
+        it, or land on its top when coming down from above.
+        @param ladder: Ladders.LadderSegment
+        """
+        self.pre_react_ladder(ladder)
+        self.info['on_top_ladder'] = False
         if self.info['on_ladder']:
             if self.info['hit_up']:
                 self.rect.y -= 2
+                if self.rect.bottom <= ladder.top_y:
+                    self.rect.bottom = ladder.top_y
+                    self.info['on_ladder'] = False
+                    self.info['on_top_ladder'] = True
+                    self.info['on_ground'] = True
             elif self.info['hit_down']:
                 self.rect.y += 2
             return
+        if (self.info['normal'].y > 0 and
+                self.rect.bottom <= ladder.top_y and
+                ladder.rect.left < self.rect.right and
+                self.rect.left < ladder.rect.right and
+                self.rect.bottom + self.velocity.y > ladder.top_y):
+            self.rect.bottom = ladder.top_y
+            self.info['on_top_ladder'] = True
+            self.info['on_ground'] = True
+            return
         self.rect.y += self.velocity.y
 
-    def draw(self, screen, camera):
+    def draw(self, screen, camera, rect=None):
         """
 
         @type screen: pygame.Surface
         @param camera: Helpers.Camera
+        @param rect: pygame.Rect to draw at instead of self.rect
         """
-        screen.blit(self.image, camera.apply(self))
+        if rect is None:
+            rect = self.rect
+        screen.blit(self.image, camera.apply_rect(rect))
 
-    def debug_draw(self, img, x, y):
-        """
 
-        @param img: pygame.Surface
-        @param x: int
-        @param y: int
-        """
-        self.debug_screen.blit(img, (x, y))
+def held_actions(keys):
+    """
+
+    @param keys: pygame.key.get_pressed()
+    @return: set of the actions ('left', 'right', 'up', 'down', 'jump',
+        'speed') whose keys are held down
+    """
+    return {action for key, action in ((pygame.K_LEFT, 'left'),
+                                       (pygame.K_RIGHT, 'right'),
+                                       (pygame.K_UP, 'up'),
+                                       (pygame.K_DOWN, 'down'),
+                                       (pygame.K_SPACE, 'jump'),
+                                       (pygame.K_b, 'speed'))
+            if keys[key]}
+
 
+def apply_input(player, held):
+    """
 
-def main(debugging):
+    Turn the actions held down into player velocity and input flags, once
+    per simulation step since every step clears velocity.x.
+    @type player: Prototype.Player
+    @param held: set of actions from held_actions()
+    """
+    speed = 'speed' in held
+    if 'left' in held:
+        if speed:
+            player.velocity.x -= 5
+        else:
+            player.velocity.x -= 3
+    if 'right' in held:
+        if speed:
+            player.velocity.x += 5
+        else:
+            player.velocity.x += 3
+    player.info['hit_up'] = 'up' in held
+    player.info['hit_down'] = 'down' in held
+    player.info['hit_left'] = 'left' in held
+    player.info['hit_right'] = 'right' in held
+    player.info['hit_jump'] = 'jump' in held
+
+
+def press_jump(player, speed):
+    """
+
+    @type player: Prototype.Player
+    @param speed: bool jump higher
+    """
+    if player.info['on_ground']:
+        if speed:
+            player.velocity.y = -16
+        else:
+            player.velocity.y = -14
+        player.info['on_ground'] = False
+        player.info['jumping'] = True
+
+
+def release_jump(player):
+    """
+
+    Letting go of jump early cuts the jump short.
+    @type player: Prototype.Player
+    """
+    if not player.info['on_ground'] and player.velocity.y < 0:
+        player.velocity.y = 0
+        player.info['jumping'] = False
+
+
+def replay_events(player, events):
+    """
+
+    Press and release jump like the input log says.
+    @type player: Prototype.Player
+    @param events: tuple of Replay.PRESS, PRESS_SPEED and RELEASE
+    """
+    for event in events:
+        if event == RELEASE:
+            release_jump(player)
+        else:
+            press_jump(player, event != PRESS)
+
+
+def make_tileset_group(level, debugging=False, streaming=None):
+    """
+
+    @param level: list of (tiles, tile width, tile height) in priority
+        order, like Levels.DEMO_LEVEL
+    @param debugging: bool
+    @param streaming: dict of StreamingTileSet options to stream every
+        tileset with, or None to hold them whole
+    @return: Prototype.TileSetsContainer
+    """
+    tileset_list = []
+    for priority, (tiles, tile_width, tile_height) in enumerate(level):
+        tile_size = Vector2(tile_width, tile_height)
+        if streaming is None:
+            # noinspection PyTypeChecker
+            tileset_list.append(TileSet(tiles, None, tile_size, priority,
+                                        debugging))
+        else:
+            # noinspection PyTypeChecker
+            tileset_list.append(StreamingTileSet(tiles, None, tile_size,
+                                                 priority, debugging,
+                                                 **streaming))
+    return TileSetsContainer(tileset_list)
+
+
+def compile_tileset_group(level, cache_dir=DEFAULT_CACHE_DIR,
+                          debugging=False):
+    """
+
+    make_tileset_group() through a cache of compiled levels. The first time
+    a level is seen its tilesets are built, every chunk is baked, and all
+    of it is written to cache_dir. Later the tilesets are made straight from
+    the cache file, as long as neither the level nor the tile definitions
+    and images changed and the chunks were baked if there is a display to
+    draw them on now.
+    @param level: list like Levels.DEMO_LEVEL
+    @param cache_dir: str
+    @param debugging: bool
+    @return: tuple (Prototype.TileSetsContainer, bool True if it came from
+        the cache)
+    """
+    asset_paths = [definition[1] for definition in TILE_DEFINITIONS
+                   if type(definition[1]) is str]
+    # without a display the chunks are left to be baked when drawn
+    prebaked = pygame is not None and pygame.display.get_surface() is not None
+    path = cache_path(cache_dir, level_key(level, TILE_DEFINITIONS,
+                                           asset_paths, prebaked))
+    compiled = read_cache(path)
+    if compiled is not None:
+        tileset_list = []
+        for priority, record in enumerate(compiled['tilesets']):
+            tile_ids = array('H')
+            tile_ids.frombytes(record['tile_ids'])
+            # noinspection PyTypeChecker
+            tileset = TileSet(LevelLayer(record['width'], record['height'],
+                                         tile_ids),
+                              None, Vector2(*record['tile_size']), priority,
+                              debugging, record['indexes'])
+            if tileset.renderer.chunk_tiles == record['chunk_tiles']:
+                tileset.renderer.prebaked = record['chunks']
+            tileset_list.append(tileset)
+        return TileSetsContainer(tileset_list), True
+
+    tileset_group = make_tileset_group(level, debugging)
+    records = []
+    for tileset in tileset_group.tileset_list:
+        renderer = tileset.renderer
+        if prebaked:
+            for chunk_y in range(renderer.chunk_count.y):
+                for chunk_x in range(renderer.chunk_count.x):
+                    renderer.prebaked[chunk_x, chunk_y] = pack_surface(
+                        renderer.bake(chunk_x, chunk_y))
+        records.append({
+            'width': tileset.size_info['map'].x,
+            'height': tileset.size_info['map'].y,
+            'tile_size': (tileset.size_info['tile'].x,
+                          tileset.size_info['tile'].y),
+            'tile_ids': bytes(array('H', tileset.tile_ids)),
+            'indexes': tileset.get_indexes(),
+            'chunk_tiles': renderer.chunk_tiles,
+            'chunks': renderer.prebaked
+        })
+    write_cache(path, {'tilesets': records})
+    return tileset_group, False
+
+
+def make_background(tileset, screen_size):
+    """
+
+    @param tileset: Prototype.TileSet the layers hang from the bottom of
+    @type screen_size: Geometry.Vector2
+    @return: Rendering.ParallaxBackground with BACKGROUND_LAYERS
+    """
+    background = ParallaxBackground((screen_size.x, screen_size.y),
+                                    BACKGROUND_COLOUR)
+    for path, scroll, drop, repeat_x, repeat_y in BACKGROUND_LAYERS:
+        image = pygame.image.load(path)
+        origin = (0, tileset.rect.height - image.get_height() + drop)
+        background.add_layer(ParallaxLayer(image, scroll, origin, repeat_x,
+                                           repeat_y))
+    return background
+
+
+def make_player(tileset_group, debugging=False):
+    """
+
+    The player starts one tile in from the top left of the first tileset.
+    @type tileset_group: Prototype.TileSetsContainer
+    @param debugging: bool
+    @return: Prototype.Player
+    """
+    tile_size = tileset_group.tileset_list[0].size_info['tile']
+    # noinspection PyTypeChecker
+    return Player(Vector2(tile_size.x, tile_size.y), Vector2(20, 50), None,
+                  debugging)
+
+
+def main(debugging, dirty_rects=False, profile_path=None,
+         level=DEMO_LEVEL, streaming=None, cache_dir=None, trace_path=None,
+         record_path=None, replay_path=None):
     """
 
     The main() is where the main game loop is.
     First initialize stuff then run main game loop.
     @param debugging: bool
+    @param dirty_rects: bool only send the changed parts of the screen to
+        the display while the camera stands still
+    @param profile_path: str time the phases of every frame and write them
+        to this file (.csv or .json) on exit, or None
+    @param level: list like Levels.DEMO_LEVEL or what LevelFile.load_level
+        returns
+    @param streaming: dict of StreamingTileSet options to page the level in
+        chunks around the camera and the player, or None
+    @param cache_dir: str where compiled levels are cached, or None to
+        build the level every time. Streamed levels are never cached.
+    @param trace_path: str write the trace to this file on exit and on a
+        crash, or None. F5 writes it any time.
+    @param record_path: str write the input to this log on exit, or None
+    @param replay_path: str play this input log back one step a frame as
+        fast as it goes instead of reading the keyboard, or None
     """
-    blocks_background = BackgroundManager('data/Background/blocks.png', 2)
+    if profile_path is not None:
+        PROFILER.enabled = True
+        atexit.register(PROFILER.dump, profile_path)
+    if trace_path is not None:
+        atexit.register(TRACE.dump, trace_path)
+        TRACE.dump_on_crash(trace_path)
+    recorder = None
+    if record_path is not None:
+        recorder = InputRecorder(level, STEP_MS)
+        atexit.register(recorder.save, record_path)
+    replay = None
+    if replay_path is not None:
+        replay = load_replay(replay_path)
+        replay.check_level(level)
     screen_size = Vector2(800, 600)
     screen = pygame.display.set_mode((screen_size.x, screen_size.y))
     clock = pygame.time.Clock()
 
-    my_tiles_0 = [
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 17, 1, 19, 1, 17, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 18, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 18, 0, 0, 0, 0, 0, 0, 0, 2, 2, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 18, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 8, 8, 8, 8,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 17, 17, 1, 17, 17, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 8, 8, 8,
-         8, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [1, 1, 11, 12, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 16, 15, 1, 6, 6, 0, 0, 0, 0, 0, 0, 0, 0, 0, 5, 5, 5, 5, 8, 8,
-         8, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [1, 1, 1, 1, 10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 14, 1, 1, 1, 6, 6, 0, 0, 0, 0, 0, 0, 0, 0, 0, 5, 5, 5, 5, 8, 8,
-         8, 0, 0, 0, 0, 0, 0, 0, 2, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [1, 1, 1, 1, 1, 10, 0, 0, 0, 0, 0, 0, 0, 0, 14, 1, 1, 1, 1, 6, 6, 0, 0, 3, 3, 0, 7, 7, 7, 7, 7, 5, 5, 5, 8, 8,
-         8, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 10, 0, 0, 0, 13, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [1, 1, 1, 1, 1, 1, 10, 0, 0, 0, 0, 0, 0, 14, 1, 1, 1, 1, 1, 6, 6, 0, 0, 3, 3, 0, 7, 7, 7, 7, 7, 5, 5, 7, 7, 7,
-         7, 7, 7, 7, 0, 0, 2, 0, 0, 0, 0, 0, 0, 1, 10, 0, 13, 1, 0, 1, 1, 10, 0, 13, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [1, 1, 1, 1, 1, 1, 1, 11, 12, 0, 0, 16, 15, 1, 1, 1, 1, 1, 1, 6, 6, 0, 0, 3, 3, 0, 7, 7, 7, 7, 7, 5, 5, 7, 7, 7,
-         7, 7, 7, 7, 0, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1,
-         0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1,
-         1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0,
-         0, 0, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 1, 1, 1, 1, 1]]
-
-    tw_0 = 32
-    th_0 = 32
-
-    tile_size_0 = Vector2(tw_0, th_0)
-    # noinspection PyTypeChecker
-    tileset_0 = TileSet(my_tiles_0, screen, tile_size_0, 0, debugging)
-
-    my_tiles_1 = [
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 2, 3, 4, 5, 6, 7, 8, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]]
-
-    tw_1 = 64
-    th_1 = 32
-    tile_size_1 = Vector2(tw_1, th_1)
-    # noinspection PyTypeChecker
-    tileset_1 = TileSet(my_tiles_1, screen, tile_size_1, 1, debugging)
-
-    ts_list = [tileset_0, tileset_1]
-    tileset_group = TileSetsContainer(ts_list)
-
-    # noinspection PyTypeChecker
-    player = Player(Vector2(tw_0, th_0), Vector2(20, 50), screen, debugging)
+    if cache_dir is None or streaming is not None:
+        tileset_group = make_tileset_group(level, debugging, streaming)
+    else:
+        tileset_group, cached = compile_tileset_group(level, cache_dir,
+                                                      debugging)
+        STARTUP_TRACE.record(INFO, 'level read from cache' if cached else
+                             'level compiled to cache', cache_dir=cache_dir)
+    tileset_0 = tileset_group.tileset_list[0]
+    background = make_background(tileset_0, screen_size)
+    player = make_player(tileset_group, debugging)
     entity_list = [player]
-    platforms_group = pygame.sprite.Group()
+    entity_collisions = SweepAndPrune()
+    platforms_group = GridGroup()
+    world = World(tileset_group, platforms_group)
+    world.add(player)
+    timestep = FixedTimestep(STEP_MS, MAX_CATCH_UP_STEPS)
+    interpolation = Interpolation()
 
     camera = Camera("complex", tileset_0.size_info['map'].x *
                     tileset_0.size_info['tile'].x,
                     tileset_0.size_info['map'].y *
                     tileset_0.size_info['tile'].y)
 
+    dirty = None
+    if dirty_rects:
+        dirty = DirtyRects()
+
+    first_frame = True
+    step = 0
+    diverged_at = None
+
+    def draw_scene():
+        start = PROFILER.now()
+        background.draw(screen, camera)
+        start = PROFILER.lap('background', start)
+        tileset_group.draw(screen, camera)
+        PROFILER.lap('tiles', start)
+
     while True:
-        speed = False
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_b]:
-            speed = True
+        if replay is None:
+            # the tick waits for the frame rate, the frame is timed after it
+            steps = timestep.advance(clock.tick(RENDER_FPS))
+        else:
+            clock.tick()
+            steps = 1
+            if step == len(replay.steps):
+                REPLAY_TRACE.record(INFO, 'replay finished', steps=step,
+                                    diverged_at=diverged_at)
+                pygame.quit()
+                sys.exit()
+        frame_start = start = PROFILER.now()
+        held = held_actions(pygame.key.get_pressed())
 
         for e in pygame.event.get():
             if (e.type == pygame.QUIT or e.type == pygame.KEYDOWN and
                     e.key == pygame.K_ESCAPE):
                 pygame.quit()
                 sys.exit()
-            if (e.type == pygame.KEYDOWN and e.key == pygame.K_SPACE and
-                    player.info['on_ground']):
-                if speed:
-                    player.velocity.y = -16
-                else:
-                    player.velocity.y = -14
-                player.info['on_ground'] = False
-                player.info['jumping'] = True
-            if (e.type == pygame.KEYUP and e.key == pygame.K_SPACE and
-                    not player.info['on_ground'] and player.velocity.y < 0):
-                player.velocity.y = 0
-                player.info['jumping'] = False
-
-        if keys[pygame.K_LEFT]:
-            if speed:
-                player.velocity.x -= 5
-            else:
-                player.velocity.x -= 3
-        if keys[pygame.K_RIGHT]:
-            if speed:
-                player.velocity.x += 5
-            else:
-                player.velocity.x += 3
-        if keys[pygame.K_UP]:
-            player.info['hit_up'] = True
-        else:
-            player.info['hit_up'] = False
-        if keys[pygame.K_DOWN]:
-            player.info['hit_down'] = True
-        else:
-            player.info['hit_down'] = False
-        if keys[pygame.K_LEFT]:
-            player.info['hit_left'] = True
+            if e.type == pygame.KEYDOWN and e.key == pygame.K_F3:
+                OVERLAY.toggle()
+                if dirty is not None:
+                    dirty.force_full_redraw()
+            if e.type == pygame.KEYDOWN and e.key == pygame.K_F4:
+                PROFILER.toggle_hud()
+                if dirty is not None:
+                    dirty.force_full_redraw()
+            if e.type == pygame.KEYDOWN and e.key == pygame.K_F5:
+                TRACE.dump(trace_path or DEFAULT_TRACE_PATH)
+            if replay is not None:
+                continue
+            if e.type == pygame.KEYDOWN and e.key == pygame.K_SPACE:
+                press_jump(player, 'speed' in held)
+                if recorder is not None:
+                    recorder.press('speed' in held)
+            if e.type == pygame.KEYUP and e.key == pygame.K_SPACE:
+                release_jump(player)
+                if recorder is not None:
+                    recorder.release()
+        start = PROFILER.lap('events', start)
+
+        for _ in range(steps):
+            if replay is not None:
+                held, events = replay.steps[step]
+                replay_events(player, events)
+            apply_input(player, held)
+            interpolation.save(entity_list)
+            platforms_group.update(entity_list)
+            start = PROFILER.lap('platforms', start)
+            world.step()
+            start = PROFILER.lap('world step', start)
+            for contact in entity_collisions.collide(entity_list):
+                contact.a.collide_entity(contact)
+                contact.b.collide_entity(contact)
+            start = PROFILER.lap('entity collisions', start)
+            step += 1
+            if recorder is not None:
+                recorder.record(held, player.rect)
+            if (replay is not None and diverged_at is None and
+                    not replay.check(step, player.rect)):
+                diverged_at = step
+                REPLAY_TRACE.record(WARNING, 'diverged', step=step,
+                                    rect=tuple(player.rect))
+        # a replay does not run on the clock, it always shows the last step
+        player_rect = interpolation.get_rect(
+            player, timestep.get_alpha() if replay is None else 1)
+        camera.update_rect(player_rect, screen_size)
+        if tileset_group.streaming:
+            tileset_group.stream([Rect(-camera.state.left, -camera.state.top,
+                                       screen_size.x, screen_size.y),
+                                  player.rect])
+            start = PROFILER.lap('streaming', start)
+
+        if dirty is None or dirty.begin_frame(camera):
+            draw_scene()
         else:
-            player.info['hit_left'] = False
-        if keys[pygame.K_RIGHT]:
-            player.info['hit_right'] = True
-        else:
-            player.info['hit_right'] = False
-        if keys[pygame.K_SPACE]:
-            player.info['hit_jump'] = True
-        else:
-            player.info['hit_jump'] = False
-
-        camera.update(player, screen_size)
-
-        screen.fill((125, 199, 245))
-        blocks_background.update(camera, tileset_0)
-        blocks_background.draw(screen, screen_size)
-        tileset_group.draw(screen, camera)
-        platforms_group.update(entity_list)
+            dirty.restore(screen, draw_scene)
+        start = PROFILER.now()
         platforms_group.draw(screen)
-        player.update(platforms_group, tileset_group)
-        player.draw(screen, camera)
-        pygame.display.update()
-        clock.tick(FPS)
+        player.draw(screen, camera, player_rect)
+        OVERLAY.draw(screen, camera, dirty)
+        PROFILER.draw(screen, dirty)
+        start = PROFILER.lap('sprites', start)
+        if dirty is None:
+            pygame.display.update()
+        else:
+            for platform in platforms_group:
+                dirty.track(platform, platform.rect)
+            dirty.track(player, camera.apply_rect(player_rect))
+            dirty.update_display()
+        PROFILER.lap('display', start)
+        PROFILER.lap('frame', frame_start)
+        if first_frame:
+            first_frame = False
+            to_first_frame = time.perf_counter() - STARTED
+            STARTUP_TRACE.record(INFO, 'first frame',
+                                 ms=round(to_first_frame * 1000, 1))
+            if PROFILER.enabled:
+                PROFILER.record('time to first frame',
+                                int(to_first_frame * 1e9))
 
 
 if __name__ == "__main__":
     print(__version__, __author__ + '\n')
-    debug = None
-    for arg in sys.argv:
-        if arg == '-d' or arg == '--debug':
-            debug = True
-        else:
-            debug = False
-            # noinspection PyUnboundLocalVariable
-    main(debug)
+    debug = '-d' in sys.argv or '--debug' in sys.argv
+    profile = None
+    if '--profile' in sys.argv:
+        profile = sys.argv[sys.argv.index('--profile') + 1]
+    level_path = None
+    if '--level' in sys.argv:
+        level_path = sys.argv[sys.argv.index('--level') + 1]
+    stream = None
+    if '--stream' in sys.argv:
+        stream = {'unloaded': sys.argv[sys.argv.index('--stream') + 1]}
+    cache = DEFAULT_CACHE_DIR
+    if '--cache' in sys.argv:
+        cache = sys.argv[sys.argv.index('--cache') + 1]
+    if '--no-cache' in sys.argv:
+        cache = None
+    if '--trace' in sys.argv:
+        TRACE.configure(sys.argv[sys.argv.index('--trace') + 1])
+    trace_out = None
+    if '--trace-out' in sys.argv:
+        trace_out = sys.argv[sys.argv.index('--trace-out') + 1]
+    record = None
+    if '--record' in sys.argv:
+        record = sys.argv[sys.argv.index('--record') + 1]
+    replay_file = None
+    if '--replay' in sys.argv:
+        replay_file = sys.argv[sys.argv.index('--replay') + 1]
+    main(debug, '--dirty' in sys.argv, profile,
+         load_level(level_path) if level_path else DEMO_LEVEL, stream, cache,
+         trace_out, record, replay_file)
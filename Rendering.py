@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# coding=utf-8
+from Geometry.Vector2 import Vector2
+from collections import OrderedDict
+from Backend import pygame, Rect
+from LevelCache import unpack_surface
+
+
+class ChunkRenderer(object):
+    """
+
+    Draws a tileset in fixed size chunks. A chunk surface is only baked the
+    first time it is seen by the camera and the least recently drawn chunks
+    are dropped once the baked surfaces go over memory_cap bytes. Chunks
+    found in prebaked, packed by LevelCache.pack_surface(), are unpacked
+    instead of baked.
+    @param tileset: Prototype.TileSet
+    @param chunk_tiles: int tiles along each side of a chunk
+    @param memory_cap: int
+    """
+
+    def __init__(self, tileset, chunk_tiles=16, memory_cap=32 * 1024 * 1024):
+        self.tileset = tileset
+        self.chunk_tiles = chunk_tiles
+        self.chunk_size = Vector2(chunk_tiles * tileset.size_info['tile'].x,
+                                  chunk_tiles * tileset.size_info['tile'].y)
+        self.chunk_count = Vector2(
+            -(-tileset.size_info['map'].x // chunk_tiles),
+            -(-tileset.size_info['map'].y // chunk_tiles))
+        self.memory_cap = memory_cap
+        self.memory_used = 0
+        self.chunks = OrderedDict()
+        self.prebaked = {}
+
+    def bake(self, chunk_x, chunk_y):
+        """
+
+        @type chunk_x: int
+        @type chunk_y: int
+        @return: pygame.Surface
+        """
+        packed = self.prebaked.get((chunk_x, chunk_y))
+        if packed is not None:
+            return unpack_surface(packed)
+        first_x = chunk_x * self.chunk_tiles
+        first_y = chunk_y * self.chunk_tiles
+        last_x = min(first_x + self.chunk_tiles,
+                     self.tileset.size_info['map'].x)
+        last_y = min(first_y + self.chunk_tiles,
+                     self.tileset.size_info['map'].y)
+        # noinspection PyArgumentList
+        surface = pygame.Surface(((last_x - first_x) *
+                                  self.tileset.size_info['tile'].x,
+                                  (last_y - first_y) *
+                                  self.tileset.size_info['tile'].y),
+                                 pygame.SRCALPHA)
+        self.tileset.draw_tiles(surface, first_x, first_y, last_x, last_y)
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+        return surface
+
+    def get_chunk(self, chunk_x, chunk_y):
+        """
+
+        @type chunk_x: int
+        @type chunk_y: int
+        @return: pygame.Surface
+        """
+        key = (chunk_x, chunk_y)
+        surface = self.chunks.get(key)
+        if surface is None:
+            surface = self.bake(chunk_x, chunk_y)
+            self.chunks[key] = surface
+            self.memory_used += surface.get_bytesize() * surface.get_width() \
+                * surface.get_height()
+        else:
+            self.chunks.move_to_end(key)
+        return surface
+
+    def evict(self, keep):
+        """
+
+        Drop the least recently drawn chunks until under memory_cap, the
+        last keep chunks are never dropped.
+        @type keep: int
+        """
+        while self.memory_used > self.memory_cap and len(self.chunks) > keep:
+            _, surface = self.chunks.popitem(last=False)
+            self.memory_used -= surface.get_bytesize() * \
+                surface.get_width() * surface.get_height()
+
+    def invalidate(self, x, y):
+        """
+
+        Forget the chunk holding the tile (x, y) so it is baked again.
+        @type x: int
+        @type y: int
+        """
+        self.prebaked.pop((x // self.chunk_tiles, y // self.chunk_tiles), None)
+        self.forget(x // self.chunk_tiles, y // self.chunk_tiles)
+
+    def forget(self, chunk_x, chunk_y):
+        """
+
+        Drop the surface of a chunk if it is baked.
+        @type chunk_x: int
+        @type chunk_y: int
+        """
+        surface = self.chunks.pop((chunk_x, chunk_y), None)
+        if surface is not None:
+            self.memory_used -= surface.get_bytesize() * \
+                surface.get_width() * surface.get_height()
+
+    def visible_chunks(self, camera, screen_size):
+        """
+
+        @param camera: Helpers.Camera
+        @type screen_size: tuple
+        @return: tuple (first x, first y, last x, last y) last ones excluded
+        """
+        view_left = -camera.state.left
+        view_top = -camera.state.top
+        first_x = max(int(view_left // self.chunk_size.x), 0)
+        first_y = max(int(view_top // self.chunk_size.y), 0)
+        last_x = min(int((view_left + screen_size[0] - 1) //
+                         self.chunk_size.x) + 1, self.chunk_count.x)
+        last_y = min(int((view_top + screen_size[1] - 1) //
+                         self.chunk_size.y) + 1, self.chunk_count.y)
+        return first_x, first_y, last_x, last_y
+
+    def draw(self, screen, camera):
+        """
+
+        @type screen: pygame.Surface
+        @param camera: Helpers.Camera
+        """
+        first_x, first_y, last_x, last_y = self.visible_chunks(
+            camera, screen.get_size())
+        for chunk_y in range(first_y, last_y):
+            for chunk_x in range(first_x, last_x):
+                screen.blit(self.get_chunk(chunk_x, chunk_y),
+                            (chunk_x * self.chunk_size.x + camera.state.left,
+                             chunk_y * self.chunk_size.y + camera.state.top))
+        self.evict(max(last_x - first_x, 0) * max(last_y - first_y, 0))
+
+
+class DirtyRects(object):
+    """
+
+    Keeps track of the screen areas that changed so only they are redrawn
+    and sent to pygame.display.update(). Whenever the camera moves the whole
+    screen is redrawn instead.
+    """
+
+    def __init__(self):
+        self.previous = {}
+        self.rects = []
+        self.added = []
+        self.last_added = []
+        self.last_offset = None
+        self.full_redraw = True
+
+    def begin_frame(self, camera):
+        """
+
+        @param camera: Helpers.Camera
+        @return: bool True when the whole screen has to be redrawn
+        """
+        offset = camera.state.topleft
+        if offset != self.last_offset:
+            self.full_redraw = True
+            self.last_offset = offset
+        self.rects = []
+        self.last_added = self.added
+        self.added = []
+        return self.full_redraw
+
+    def force_full_redraw(self):
+        self.full_redraw = True
+
+    def restore(self, screen, draw_scene):
+        """
+
+        Draw the scene again under everything tracked or added last frame.
+        @type screen: pygame.Surface
+        @param draw_scene: function drawing the background and the tiles
+        """
+        for rect in list(self.previous.values()) + self.last_added:
+            screen.set_clip(rect)
+            draw_scene()
+            self.rects.append(rect)
+        screen.set_clip(None)
+
+    def track(self, key, screen_rect):
+        """
+
+        Something (the player, a platform...) was drawn at screen_rect.
+        @param key: anything identifying what was drawn
+        @type screen_rect: pygame.Rect
+        """
+        screen_rect = Rect(screen_rect)
+        self.previous[key] = screen_rect
+        self.rects.append(screen_rect)
+
+    def forget(self, key):
+        """
+
+        @param key: anything given to track() before
+        """
+        self.previous.pop(key, None)
+
+    def add(self, screen_rect):
+        """
+
+        Mark an area that changed only this frame, like an animated tile or
+        a debug overlay. It is drawn over again next frame.
+        @type screen_rect: pygame.Rect
+        """
+        screen_rect = Rect(screen_rect)
+        self.rects.append(screen_rect)
+        self.added.append(screen_rect)
+
+    def update_display(self):
+        if self.full_redraw:
+            pygame.display.update()
+            self.full_redraw = False
+        elif self.rects:
+            pygame.display.update(self.rects)
+
+
+class ParallaxLayer(object):
+    """
+
+    One layer of the background. It sits at origin on the screen while the
+    camera is at the top left of the world and follows the camera by
+    scroll along each axis, 0 for layers that stay put and 1 for layers
+    that move with the tiles. Along the repeating axes the image is wrapped
+    around.
+    @type image: pygame.Surface
+    @param scroll: tuple (x, y)
+    @param origin: tuple (x, y)
+    @type repeat_x: bool
+    @type repeat_y: bool
+    """
+
+    def __init__(self, image, scroll=(1, 1), origin=(0, 0), repeat_x=True,
+                 repeat_y=False):
+        self.image = image
+        self.scroll = scroll
+        self.origin = origin
+        self.repeat_x = repeat_x
+        self.repeat_y = repeat_y
+        self.strip = None
+        # where it was drawn last, None before the first frame
+        self.offset = None
+
+    def build_strip(self, screen_size):
+        """
+
+        Tile the image along the repeating axes far enough to cover the
+        screen from any offset within one image, in the display format.
+        @type screen_size: tuple
+        """
+        width, height = self.image.get_size()
+        columns = 1
+        rows = 1
+        if self.repeat_x:
+            columns = -(-screen_size[0] // width) + 1
+        if self.repeat_y:
+            rows = -(-screen_size[1] // height) + 1
+        alpha = self.image.get_flags() & pygame.SRCALPHA
+        # noinspection PyArgumentList
+        strip = pygame.Surface((columns * width, rows * height), alpha, 32)
+        for row in range(rows):
+            for column in range(columns):
+                strip.blit(self.image, (column * width, row * height))
+        if pygame.display.get_surface() is not None:
+            strip = strip.convert_alpha() if alpha else strip.convert()
+        self.strip = strip
+
+    def get_offset(self, camera):
+        """
+
+        @param camera: Helpers.Camera
+        @return: tuple (x, y) screen position of the top left of the strip
+        """
+        x = self.origin[0] + camera.state.left * self.scroll[0]
+        y = self.origin[1] + camera.state.top * self.scroll[1]
+        if self.repeat_x:
+            x = x % self.image.get_width() - self.image.get_width()
+        if self.repeat_y:
+            y = y % self.image.get_height() - self.image.get_height()
+        return int(x), int(y)
+
+
+class ParallaxBackground(object):
+    """
+
+    Draws a fill colour and parallax layers, back to front, with one blit
+    per layer. The leading layers that did not move since the last frame
+    come from one cached surface, rebuilt only when they change, so a
+    still camera costs a single blit. blits and cached count what the last
+    draw() did.
+    @type screen_size: tuple
+    @param colour: tuple fill colour behind every layer
+    """
+
+    def __init__(self, screen_size, colour):
+        self.screen_size = (int(screen_size[0]), int(screen_size[1]))
+        self.colour = colour
+        self.layers = []
+        self.base = None
+        self.base_offsets = None
+        self.blits = 0
+        self.cached = 0
+
+    def add_layer(self, layer):
+        """
+
+        @param layer: Rendering.ParallaxLayer, in front of those added
+            before
+        """
+        layer.build_strip(self.screen_size)
+        self.layers.append(layer)
+        self.base = None
+
+    def build_base(self, offsets):
+        """
+
+        @param offsets: list of the offsets of the leading layers to cache
+        """
+        if self.base is None:
+            # noinspection PyArgumentList
+            self.base = pygame.Surface(self.screen_size)
+            if pygame.display.get_surface() is not None:
+                self.base = self.base.convert()
+        self.base.fill(self.colour)
+        for layer, offset in zip(self.layers, offsets):
+            self.base.blit(layer.strip, offset)
+        self.base_offsets = offsets
+
+    def draw(self, screen, camera):
+        """
+
+        @type screen: pygame.Surface
+        @param camera: Helpers.Camera
+        """
+        offsets = [layer.get_offset(camera) for layer in self.layers]
+        still = 0
+        while (still < len(self.layers) and
+               offsets[still] == self.layers[still].offset):
+            still += 1
+        self.blits = 0
+        if still:
+            if self.base_offsets != offsets[:still]:
+                self.build_base(offsets[:still])
+            screen.blit(self.base, (0, 0))
+            self.blits += 1
+        else:
+            screen.fill(self.colour)
+        for layer, offset in zip(self.layers[still:], offsets[still:]):
+            screen.blit(layer.strip, offset)
+            self.blits += 1
+        for layer, offset in zip(self.layers, offsets):
+            layer.offset = offset
+        self.cached = still
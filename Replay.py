@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+Input logs: the actions held down in every simulation step and the jump
+presses and releases in between, recorded by Prototype and Headless with
+--record FILE and played back with --replay FILE.
+
+A log starts with a header (magic, version, step length in ms, checksum
+interval, step count and the sha256 of the level it was recorded on),
+followed by the runs of steps with the same input and then by the CRC32
+of the rect of the first player after every checksum interval steps. A
+run is its length, the held actions as bits and up to four jump events
+packed two bits each, so holding a direction for a minute takes four
+bytes. More events between two steps spill into runs of length 0 whose
+events go to the next step. Playing a log back runs the same steps
+through the same Player.update path and compares the checksums to catch
+divergence.
+"""
+import zlib
+import struct
+from LevelFile import hash_level
+
+MAGIC = b'PRPL'
+VERSION = 1
+HEADER = struct.Struct('<4sHHHI32s')
+RUN = struct.Struct('<HBB')
+COUNT = struct.Struct('<I')
+CHECKSUM = struct.Struct('<I')
+RECT = struct.Struct('<iiii')
+MAX_RUN = 0xFFFF
+MAX_EVENTS = 4
+DEFAULT_CHECKSUM_INTERVAL = 60
+
+# bit i of the held byte is ACTIONS[i]
+ACTIONS = ('left', 'right', 'up', 'down', 'jump', 'speed')
+# jump events between two steps, in the order they happened
+PRESS, PRESS_SPEED, RELEASE = 1, 2, 3
+
+
+class ReplayError(ValueError):
+    pass
+
+
+def pack_held(held):
+    """
+
+    @param held: set of actions
+    @return: int
+    """
+    bits = 0
+    for i, action in enumerate(ACTIONS):
+        if action in held:
+            bits |= 1 << i
+    return bits
+
+
+def unpack_held(bits):
+    """
+
+    @type bits: int
+    @return: frozenset of actions
+    """
+    return frozenset(action for i, action in enumerate(ACTIONS)
+                     if bits & 1 << i)
+
+
+def rect_checksum(rect):
+    """
+
+    @type rect: pygame.Rect
+    @return: int CRC32
+    """
+    return zlib.crc32(RECT.pack(*rect))
+
+
+class InputRecorder(object):
+    """
+
+    Collects the input of a run step by step. press() and release() are
+    called as the jump key goes down and up, record() after every step with
+    what was held during it and the rect of the player after it.
+    @param level: list like Levels.DEMO_LEVEL
+    @param step_ms: int length of a simulation step
+    @param checksum_interval: int steps between two checksums
+    """
+
+    def __init__(self, level, step_ms,
+                 checksum_interval=DEFAULT_CHECKSUM_INTERVAL):
+        self.level_digest = hash_level(level).digest()
+        self.step_ms = step_ms
+        self.checksum_interval = checksum_interval
+        self.runs = []
+        self.checksums = []
+        self.steps = 0
+        self.events = 0
+        self.event_count = 0
+
+    def add_event(self, event):
+        """
+
+        @param event: int PRESS, PRESS_SPEED or RELEASE
+        """
+        if self.event_count == MAX_EVENTS:
+            self.runs.append((0, 0, self.events))
+            self.events = 0
+            self.event_count = 0
+        self.events |= event << 2 * self.event_count
+        self.event_count += 1
+
+    def press(self, speed):
+        """
+
+        @param speed: bool the jump was pressed with speed held
+        """
+        self.add_event(PRESS_SPEED if speed else PRESS)
+
+    def release(self):
+        self.add_event(RELEASE)
+
+    def record(self, held, rect):
+        """
+
+        @param held: set of actions held during the step
+        @param rect: pygame.Rect of the player after the step
+        """
+        bits = pack_held(held)
+        if (self.events == 0 and self.runs and self.runs[-1][2] == 0 and
+                self.runs[-1][1] == bits and self.runs[-1][0] < MAX_RUN):
+            count, _, _ = self.runs[-1]
+            self.runs[-1] = (count + 1, bits, 0)
+        else:
+            self.runs.append((1, bits, self.events))
+        self.events = 0
+        self.event_count = 0
+        self.steps += 1
+        if self.steps % self.checksum_interval == 0:
+            self.checksums.append(rect_checksum(rect))
+
+    def save(self, path):
+        """
+
+        @type path: str
+        """
+        with open(path, 'wb') as log_file:
+            log_file.write(HEADER.pack(MAGIC, VERSION, self.step_ms,
+                                       self.checksum_interval, self.steps,
+                                       self.level_digest))
+            log_file.write(COUNT.pack(len(self.runs)))
+            for run in self.runs:
+                log_file.write(RUN.pack(*run))
+            log_file.write(COUNT.pack(len(self.checksums)))
+            for checksum in self.checksums:
+                log_file.write(CHECKSUM.pack(checksum))
+
+
+class Replay(object):
+    """
+
+    A loaded input log. steps holds a (held actions, jump events) tuple
+    per step.
+    @type level_digest: bytes
+    @type step_ms: int
+    @type checksum_interval: int
+    @param steps: list of tuples
+    @param checksums: list of int
+    """
+
+    def __init__(self, level_digest, step_ms, checksum_interval, steps,
+                 checksums):
+        self.level_digest = level_digest
+        self.step_ms = step_ms
+        self.checksum_interval = checksum_interval
+        self.steps = steps
+        self.checksums = checksums
+
+    def check_level(self, level):
+        """
+
+        @param level: list like Levels.DEMO_LEVEL
+        @raise ReplayError: when the log was recorded on another level
+        """
+        if hash_level(level).digest() != self.level_digest:
+            raise ReplayError("the replay was recorded on another level")
+
+    def check(self, step, rect):
+        """
+
+        @param step: int steps done so far
+        @param rect: pygame.Rect of the player after them
+        @return: bool False when a checksum is due and does not match
+        """
+        if step % self.checksum_interval:
+            return True
+        index = step // self.checksum_interval - 1
+        if index >= len(self.checksums):
+            return True
+        return self.checksums[index] == rect_checksum(rect)
+
+
+def load_replay(path):
+    """
+
+    @type path: str
+    @return: Replay.Replay
+    @raise ReplayError: when the file is not an input log
+    """
+    with open(path, 'rb') as log_file:
+        data = log_file.read()
+    try:
+        (magic, version, step_ms, checksum_interval, step_count,
+         level_digest) = HEADER.unpack_from(data)
+        offset = HEADER.size
+        run_count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        steps = []
+        # events of runs of length 0, for the next step
+        events = []
+        for count, bits, packed in RUN.iter_unpack(
+                data[offset:offset + run_count * RUN.size]):
+            while packed:
+                events.append(packed & 3)
+                packed >>= 2
+            if count:
+                step = (unpack_held(bits), tuple(events))
+                steps.extend([step] * count)
+                events = []
+        offset += run_count * RUN.size
+        checksum_count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        checksums = [checksum for checksum, in CHECKSUM.iter_unpack(
+            data[offset:offset + checksum_count * CHECKSUM.size])]
+    except struct.error:
+        raise ReplayError("%s is cut short" % path)
+    if magic != MAGIC:
+        raise ReplayError("%s is not an input log" % path)
+    if version != VERSION:
+        raise ReplayError("%s is version %d, not %d" % (path, version,
+                                                        VERSION))
+    if len(steps) != step_count or len(checksums) != checksum_count:
+        raise ReplayError("%s is cut short" % path)
+    return Replay(level_digest, step_ms, checksum_interval, steps, checksums)
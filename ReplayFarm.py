@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+Plays many input logs at once, spread over a pool of worker processes.
+
+    python3 ReplayFarm.py [--level FILE]... [--workers N] [--scaling]
+        [--out FILE] LOG...
+
+Every log is played on the level it was recorded on, found by its hash
+among the demo level and the --level files. A worker loads and builds a
+level the first time one of its jobs needs it and keeps it for the jobs
+after. The report is JSON (to stdout without --out): per log the final
+rect and its checksum, the step it diverged at, the steps/sec and the
+timing of every phase, then the totals. --scaling plays the whole set
+with 1, 2, 4 and so on up to --workers processes and reports the
+throughput and speedup of each.
+"""
+import os
+import sys
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault('PROTOTYPE_HEADLESS', '1')
+
+from Headless import run
+from Prototype import make_tileset_group
+from Profiler import PROFILER
+from Trace import TRACE, OFF
+from Replay import load_replay, ReplayError
+from Levels import DEMO_LEVEL
+from LevelFile import load_level, hash_level
+
+# what each worker has loaded so far, level path -> (level, tileset group)
+WORKER_LEVELS = {}
+
+
+def get_level(level_path):
+    """
+
+    @param level_path: str, None for the demo level
+    @return: tuple (level, Prototype.TileSetsContainer), built once per
+        worker
+    """
+    loaded = WORKER_LEVELS.get(level_path)
+    if loaded is None:
+        level = DEMO_LEVEL if level_path is None else load_level(level_path)
+        loaded = WORKER_LEVELS[level_path] = (level,
+                                              make_tileset_group(level))
+    return loaded
+
+
+def play(job):
+    """
+
+    Runs in a worker.
+    @param job: tuple (log path, level path or None, Replay.Replay loaded
+        from the log)
+    @return: dict
+    """
+    log_path, level_path, replay = job
+    level, tileset_group = get_level(level_path)
+    PROFILER.enabled = True
+    PROFILER.reset()
+    # the workers share the terminal with the report
+    TRACE.echo_level = OFF
+    result = run(len(replay.steps), None, level=level, replay=replay,
+                 tileset_group=tileset_group)
+    return {
+        'log': log_path,
+        'level': level_path,
+        'steps': result['steps'],
+        'seconds': result['seconds'],
+        'steps_per_second': result['steps_per_second'],
+        'rect': result['rect'],
+        'checksum': result['checksum'],
+        'diverged_at': result['diverged_at'],
+        'phases': PROFILER.get_report(),
+        'worker': os.getpid()
+    }
+
+
+def find_jobs(log_paths, level_paths):
+    """
+
+    Pair every log with the level it was recorded on. Every log is read
+    here once and handed to the workers loaded.
+    @param log_paths: list of str
+    @param level_paths: list of str
+    @return: tuple (list of jobs, list of error dicts for the logs whose
+        level is not there or that are not input logs)
+    """
+    levels = {hash_level(DEMO_LEVEL).digest(): None}
+    for level_path in level_paths:
+        levels[hash_level(load_level(level_path)).digest()] = level_path
+    jobs = []
+    errors = []
+    for log_path in log_paths:
+        try:
+            replay = load_replay(log_path)
+        except (ReplayError, IOError) as error:
+            errors.append({'log': log_path, 'error': str(error)})
+            continue
+        if replay.level_digest not in levels:
+            errors.append({'log': log_path,
+                           'error': 'recorded on a level not given'})
+            continue
+        jobs.append((log_path, levels[replay.level_digest], replay))
+    return jobs, errors
+
+
+def run_farm(jobs, workers):
+    """
+
+    @param jobs: list of (log path, level path or None, Replay.Replay)
+    @param workers: int processes
+    @return: tuple (list of result dicts in the order of jobs, wall
+        seconds)
+    """
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers) as executor:
+        results = list(executor.map(play, jobs))
+    return results, time.perf_counter() - start
+
+
+def summarize(results, seconds, workers):
+    """
+
+    @param results: list of result dicts
+    @param seconds: float wall time of the whole run
+    @param workers: int
+    @return: dict
+    """
+    steps = sum(result['steps'] for result in results)
+    return {
+        'workers': workers,
+        'jobs': len(results),
+        'steps': steps,
+        'seconds': seconds,
+        'steps_per_second': steps / seconds if seconds else float('inf'),
+        'diverged': sum(result['diverged_at'] is not None
+                        for result in results)
+    }
+
+
+def main(argv):
+    level_paths = []
+    log_paths = []
+    workers = os.cpu_count() or 1
+    out = None
+    args = iter(argv)
+    for arg in args:
+        if arg == '--level':
+            level_paths.append(next(args))
+        elif arg == '--workers':
+            workers = int(next(args))
+        elif arg == '--out':
+            out = next(args)
+        elif arg != '--scaling':
+            log_paths.append(arg)
+
+    jobs, errors = find_jobs(log_paths, level_paths)
+    counts = [workers]
+    if '--scaling' in argv:
+        counts = [1]
+        while counts[-1] * 2 < workers:
+            counts.append(counts[-1] * 2)
+        if counts[-1] != workers:
+            counts.append(workers)
+    scaling = []
+    results = []
+    for count in counts:
+        results, seconds = run_farm(jobs, count)
+        scaling.append(summarize(results, seconds, count))
+        print('%(workers)d workers: %(jobs)d logs, %(steps)d steps in '
+              '%(seconds).3f s, %(steps_per_second).1f steps/s, '
+              '%(diverged)d diverged' % scaling[-1], file=sys.stderr)
+    for summary in scaling:
+        summary['speedup'] = (scaling[0]['seconds'] / summary['seconds']
+                              if summary['seconds'] else float('inf'))
+        summary['efficiency'] = (summary['speedup'] * scaling[0]['workers'] /
+                                 summary['workers'])
+
+    report = {
+        'results': results,
+        'errors': errors,
+        'total': scaling[-1],
+        'scaling': scaling if len(scaling) > 1 else []
+    }
+    if out is None:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    else:
+        with open(out, 'w') as out_file:
+            json.dump(report, out_file, indent=1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# coding=utf-8
+from Backend import Rect
+
+
+class FixedTimestep(object):
+    """
+
+    Turns the time each rendered frame took into a number of simulation
+    steps of step_ms, so the game runs at the same speed whatever the frame
+    rate. Time left over is carried to the next frame and gives the alpha
+    to interpolate with. If rendering falls so far behind that more than
+    max_steps would be needed, the extra time is dropped and the game slows
+    down instead of spending every frame catching up.
+    @param step_ms: int length of one simulation step
+    @param max_steps: int most steps run for one frame
+    """
+
+    def __init__(self, step_ms=15, max_steps=5):
+        self.step_ms = step_ms
+        self.max_steps = max_steps
+        self.accumulator = 0
+
+    def advance(self, elapsed_ms):
+        """
+
+        @param elapsed_ms: int time since the last frame
+        @return: int steps to run this frame
+        """
+        self.accumulator += elapsed_ms
+        steps = int(self.accumulator // self.step_ms)
+        if steps > self.max_steps:
+            steps = self.max_steps
+            self.accumulator %= self.step_ms
+        else:
+            self.accumulator -= steps * self.step_ms
+        return steps
+
+    def get_alpha(self):
+        """
+
+        @return: float how far the frame is between the last two steps
+        """
+        return self.accumulator / self.step_ms
+
+
+class Interpolation(object):
+    """
+
+    Remembers where entities were before the last step so they can be drawn
+    between that and where they are now.
+    """
+
+    def __init__(self):
+        self.previous = {}
+
+    def save(self, entities):
+        """
+
+        Call before every step.
+        @param entities: list of Prototype.Entity
+        """
+        for entity in entities:
+            self.previous[entity] = entity.rect.topleft
+
+    def forget(self, entity):
+        self.previous.pop(entity, None)
+
+    def get_rect(self, entity, alpha):
+        """
+
+        @type entity: Prototype.Entity
+        @type alpha: float
+        @return: pygame.Rect
+        """
+        x, y = entity.rect.topleft
+        previous_x, previous_y = self.previous.get(entity, (x, y))
+        return Rect(round(previous_x + (x - previous_x) * alpha),
+                    round(previous_y + (y - previous_y) * alpha),
+                    entity.rect.width, entity.rect.height)
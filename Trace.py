@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+Structured tracing. Events go to named channels, each with the lowest level
+it lets through, and are kept in a ring of the last events. Callers check
+the level of the channel before building an event:
+
+    if LADDER.level <= DEBUG:
+        LADDER.record(DEBUG, 'state', entity=id(self), on_ladder=...)
+
+so a channel that is off costs one attribute compare. Events at or above
+echo_level are also printed. The levels of the channels come from a spec
+like "ladder=debug,slope=debug,*=warning", see Tracer.configure(), taken
+from the PROTOTYPE_TRACE environment variable at startup.
+"""
+import os
+import sys
+import json
+import time
+
+DEBUG, INFO, WARNING, ERROR, OFF = range(5)
+LEVEL_NAMES = ('debug', 'info', 'warning', 'error', 'off')
+
+
+class Channel(object):
+    """
+
+    @param tracer: Trace.Tracer
+    @type name: str
+    @param level: int lowest level recorded
+    """
+
+    def __init__(self, tracer, name, level):
+        self.tracer = tracer
+        self.name = name
+        self.level = level
+
+    def record(self, level, message, **fields):
+        """
+
+        @param level: int DEBUG, INFO, WARNING or ERROR
+        @type message: str
+        @param fields: the values of the event, like the tile coords
+        """
+        if level >= self.level:
+            self.tracer.record(self.name, level, message, fields)
+
+
+class Tracer(object):
+    """
+
+    The channels and the ring holding the last capacity events. An event is
+    a tuple (sequence, time in ns, frame, channel, level, message, fields),
+    frame being bumped by whatever steps the simulation.
+    @param capacity: int
+    @param default_level: int level of the channels not configured
+    @param echo_level: int events from this level up are printed as well
+    """
+
+    def __init__(self, capacity=8192, default_level=INFO,
+                 echo_level=INFO):
+        self.events = [None] * capacity
+        self.index = 0
+        self.count = 0
+        self.frame = 0
+        self.channels = {}
+        self.levels = {}
+        self.default_level = default_level
+        self.echo_level = echo_level
+
+    def channel(self, name):
+        """
+
+        @type name: str
+        @return: Trace.Channel, the same one every time for a name
+        """
+        channel = self.channels.get(name)
+        if channel is None:
+            channel = self.channels[name] = Channel(
+                self, name, self.levels.get(name, self.default_level))
+        return channel
+
+    def configure(self, spec):
+        """
+
+        Set the levels of channels from a spec of comma separated
+        name=level pairs, * naming every other channel.
+        @param spec: str like "ladder=debug,*=warning"
+        """
+        for part in spec.split(','):
+            if not part.strip():
+                continue
+            name, _, level_name = part.partition('=')
+            level = LEVEL_NAMES.index(level_name.strip().lower())
+            name = name.strip()
+            if name == '*':
+                self.default_level = level
+                for channel in self.channels.values():
+                    if channel.name not in self.levels:
+                        channel.level = level
+            else:
+                self.levels[name] = level
+                self.channel(name).level = level
+
+    def record(self, name, level, message, fields):
+        """
+
+        @param name: str channel
+        @type level: int
+        @type message: str
+        @type fields: dict
+        """
+        self.events[self.index] = (self.count, time.perf_counter_ns(),
+                                   self.frame, name, level, message, fields)
+        self.index += 1
+        if self.index == len(self.events):
+            self.index = 0
+        self.count += 1
+        if level >= self.echo_level:
+            if fields:
+                print('%s: %s' % (name, message),
+                      ' '.join('%s=%s' % item for item in fields.items()))
+            else:
+                print('%s: %s' % (name, message))
+
+    def get_events(self):
+        """
+
+        @return: list of the events in the ring, oldest first
+        """
+        if self.count < len(self.events):
+            return self.events[:self.count]
+        return self.events[self.index:] + self.events[:self.index]
+
+    def dump(self, path):
+        """
+
+        Write the events in the ring as JSON lines.
+        @type path: str
+        """
+        with open(path, 'w') as out_file:
+            for (sequence, time_ns, frame, name, level, message,
+                 fields) in self.get_events():
+                event = {'seq': sequence, 'time_ns': time_ns, 'frame': frame,
+                         'channel': name, 'level': LEVEL_NAMES[level],
+                         'message': message}
+                event.update(fields)
+                out_file.write(json.dumps(event, default=repr) + '\n')
+
+    def dump_on_crash(self, path):
+        """
+
+        Dump the ring to path when an exception gets to the top.
+        @type path: str
+        """
+        previous_hook = sys.excepthook
+
+        def hook(*exc_info):
+            self.dump(path)
+            previous_hook(*exc_info)
+
+        sys.excepthook = hook
+
+
+TRACE = Tracer()
+TRACE.configure(os.environ.get('PROTOTYPE_TRACE', ''))
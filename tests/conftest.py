@@ -0,0 +1,11 @@
+# coding=utf-8
+"""
+The modules live at the top of the repository and Prototype opens a window
+unless told it is headless.
+"""
+import os
+import sys
+
+os.environ.setdefault('PROTOTYPE_HEADLESS', '1')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
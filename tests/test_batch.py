@@ -0,0 +1,83 @@
+# coding=utf-8
+import random
+import pytest
+from Geometry.Vector2 import Vector2
+from Broadphase import GridGroup
+from Levels import DEMO_LEVEL, random_level_group
+from Physics import World, EntityBatch, numpy
+from Prototype import make_tileset_group, Player
+
+pytestmark = pytest.mark.skipif(numpy is None,
+                                reason="World only batches with numpy")
+
+LEVELS = {
+    'demo': DEMO_LEVEL,
+    'random': random_level_group(60, 30, seed=4, slopes=0.05, ladders=0.03,
+                                 one_way=0.05)
+}
+
+
+def play(level, batched, entities=40, steps=300, seed=0):
+    """
+
+    Step entities with random input, through World.step when batched and
+    through their own update() otherwise.
+    @return: list of the state of every entity after every step
+    """
+    rng = random.Random(seed)
+    tileset_group = make_tileset_group(level)
+    map_rect = tileset_group.tileset_list[0].rect
+    players = [Player(Vector2(rng.randrange(32, map_rect.width - 64),
+                              rng.randrange(0, map_rect.height - 64)),
+                      Vector2(rng.choice((20, 24, 40)),
+                              rng.choice((30, 50))), None, False)
+               for _ in range(entities)]
+    platform_group = GridGroup()
+    world = World(tileset_group, platform_group, min_batch=1)
+    for player in players:
+        world.add(player)
+    states = []
+    for _ in range(steps):
+        for player in players:
+            chance = rng.random()
+            if chance < 0.3:
+                player.velocity.x = rng.choice((-5, -3, -2.5, 2.5, 3, 5, 7.3))
+            if chance > 0.9 and player.info['on_ground']:
+                player.velocity.y = rng.choice((-14, -16))
+                player.info['on_ground'] = False
+                player.info['jumping'] = True
+            player.info['hit_up'] = rng.random() < 0.1
+            player.info['hit_down'] = rng.random() < 0.1
+            player.info['hit_jump'] = rng.random() < 0.1
+        if batched:
+            world.step()
+        else:
+            for player in players:
+                player.update(platform_group, tileset_group)
+        states.append([(tuple(player.rect), player.velocity.x,
+                        player.velocity.y, player.info['on_ground'],
+                        player.info['on_ladder'], player.info['jumping'],
+                        player.info['normal'].x, player.info['normal'].y,
+                        player.forward_edge.x, player.forward_edge.y)
+                       for player in players])
+    return states
+
+
+@pytest.mark.parametrize('name', sorted(LEVELS))
+def test_batch_matches_update(name, monkeypatch):
+    calls = {'move_x': 0, 'move_scalar': 0}
+    for method in calls:
+        original = getattr(EntityBatch, method)
+
+        def counted(self, *args, method=method, original=original):
+            calls[method] += 1
+            return original(self, *args)
+
+        monkeypatch.setattr(EntityBatch, method, counted)
+    batched = play(LEVELS[name], True)
+    # both the bulk moves and the fallback to the entities' own moves ran
+    assert calls['move_x'] and calls['move_scalar']
+    monkeypatch.undo()
+    one_by_one = play(LEVELS[name], False)
+    for step, (expected, got) in enumerate(zip(one_by_one, batched)):
+        assert got == expected, "step %d" % step
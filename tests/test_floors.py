@@ -0,0 +1,59 @@
+# coding=utf-8
+import pytest
+from Geometry.Vector2 import Vector2
+from Prototype import (TILE_REGISTRY, TileSet, KIND_SLOPE, KIND_SOLID,
+                       SLOPE_UNIT)
+
+SLOPES = [tile_type for tile_type in (TILE_REGISTRY[tile_id] for tile_id in
+                                      range(len(TILE_REGISTRY)))
+          if tile_type.kind == KIND_SLOPE]
+SIZES = [Vector2(32, 32), Vector2(64, 32), Vector2(16, 16), Vector2(48, 24)]
+
+
+def old_ground(tile_type, size, x):
+    """
+
+    The ground x pixels in from the left of the tile the way the players
+    used to work it out, straight from the slope points.
+    """
+    t = x / size.x
+    return (((1.0 - t) * tile_type.info['floor_y'].x +
+             t * tile_type.info['floor_y'].y) * size.y / SLOPE_UNIT)
+
+
+@pytest.mark.parametrize('size', SIZES, ids=lambda size: '%dx%d' % tuple(size))
+def test_slope_floor_follows_the_slope(size):
+    assert SLOPES
+    for tile_type in SLOPES:
+        floor = tile_type.get_floor(size)
+        assert len(floor) == size.x
+        for x, ground in enumerate(floor):
+            # the column's ground lies between the slope at its two edges
+            edges = (old_ground(tile_type, size, x),
+                     old_ground(tile_type, size, x + 1))
+            assert min(edges) - 0.5 <= ground <= max(edges) + 0.5
+        # made once per size
+        assert tile_type.get_floor(size) is floor
+
+
+def test_floor_under_a_span():
+    size = Vector2(32, 32)
+    for tile_type in SLOPES:
+        floor = tile_type.get_floor(size)
+        assert tile_type.floor_under(4, 20, size) == min(floor[4:20])
+        # past the edges the ground at the nearest edge counts
+        assert tile_type.floor_under(-10, 1, size) == floor[0]
+        assert tile_type.floor_under(31, 50, size) == floor[31]
+
+
+def test_ground_of_tiles():
+    size = Vector2(32, 32)
+    solid_id = next(tile_id for tile_id in range(len(TILE_REGISTRY))
+                    if TILE_REGISTRY[tile_id].kind == KIND_SOLID)
+    slope = SLOPES[0]
+    tileset = TileSet([[0, 0, 0], [0, slope.tile_id, solid_id]], None, size,
+                      0, False)
+    solid = tileset.get_tile(2, 1)
+    assert solid.get_ground(64, 96) == 32
+    tile = tileset.get_tile(1, 1)
+    assert tile.get_ground(40, 50) == 32 + min(slope.get_floor(size)[8:18])
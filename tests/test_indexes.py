@@ -0,0 +1,76 @@
+# coding=utf-8
+import random
+from Geometry.Vector2 import Vector2
+from Backend import Rect
+from Helpers import build_runs, first_in_runs, last_in_runs
+from Ladders import LadderIndex
+from Prototype import RUN_KINDS, BLOCKING_RUNS, KIND_LADDER
+
+TILE = 32
+
+
+def random_line(rng, length):
+    return [rng.choice((None, None) + RUN_KINDS) for _ in range(length)]
+
+
+def test_runs_match_a_scan():
+    rng = random.Random(3)
+    for _ in range(200):
+        line = random_line(rng, rng.randrange(1, 40))
+        runs = build_runs(line, RUN_KINDS)
+        for kinds in ((KIND_LADDER,), BLOCKING_RUNS, RUN_KINDS):
+            for position in range(-2, len(line) + 2):
+                after = [i for i in range(max(position, 0), len(line))
+                         if line[i] in kinds]
+                before = [i for i in range(min(position, len(line) - 1), -1,
+                                           -1) if line[i] in kinds]
+                assert first_in_runs(runs, position, kinds) == (
+                    after[0] if after else None)
+                assert last_in_runs(runs, position, kinds) == (
+                    before[0] if before else None)
+
+
+def find_by_scan(cells, rect, velocity):
+    """
+
+    The first ladder cell touched going through the rows and then the
+    columns rect covers while it moves, in the direction of the move.
+    """
+    first_column = min(rect.left, rect.left + velocity.x) // TILE
+    last_column = -(-max(rect.right, rect.right + velocity.x) // TILE) - 1
+    first_row = min(rect.top, rect.top + velocity.y) // TILE
+    last_row = -(-max(rect.bottom, rect.bottom + velocity.y) // TILE) - 1
+    rows = range(first_row, last_row + 1)
+    columns = range(first_column, last_column + 1)
+    if velocity.y < 0:
+        rows = reversed(rows)
+    if velocity.x < 0:
+        columns = reversed(columns)
+    columns = list(columns)
+    for row in rows:
+        for column in columns:
+            if (column, row) in cells:
+                return column, row
+    return None
+
+
+def test_ladder_index_matches_a_scan():
+    rng = random.Random(7)
+    columns, rows = 30, 20
+    cells = set((column, row) for column in range(columns)
+                for row in range(rows) if rng.random() < 0.2)
+    index = LadderIndex(Vector2(TILE, TILE))
+    index.build(cells)
+    for _ in range(5000):
+        rect = Rect(rng.randrange(-40, columns * TILE),
+                    rng.randrange(-40, rows * TILE),
+                    rng.randrange(1, 50), rng.randrange(1, 70))
+        velocity = Vector2(rng.randrange(-40, 41), rng.randrange(-40, 41))
+        expected = find_by_scan(cells, rect, velocity)
+        segment = index.find(rect, velocity)
+        if expected is None:
+            assert segment is None
+        else:
+            column, row = expected
+            assert segment.column == column
+            assert segment.top <= row <= segment.bottom
@@ -0,0 +1,62 @@
+# coding=utf-8
+from Geometry.Vector2 import Vector2
+from Backend import Rect
+from Broadphase import GridGroup
+from Ladders import LadderIndex
+from Prototype import TileSet, TileSetsContainer, Player, apply_input
+
+SOLID = 1
+LADDER = 18
+
+
+def make_ladder_level():
+    """
+
+    A ladder three tiles high in column 2 standing on the ground.
+    """
+    rows = [[0] * 5 for _ in range(4)] + [[SOLID] * 5]
+    for y in (1, 2, 3):
+        rows[y][2] = LADDER
+    return TileSetsContainer([TileSet(rows, None, Vector2(32, 32), 0,
+                                      False)])
+
+
+def step(player, tileset_group, held, steps=1):
+    for _ in range(steps):
+        apply_input(player, held)
+        player.update(GridGroup(), tileset_group)
+
+
+def test_segments_know_their_top():
+    index = LadderIndex(Vector2(32, 32))
+    index.build([(2, 1), (2, 2), (2, 3), (4, 0)])
+    first, = index.segments[2]
+    assert (first.top, first.bottom, first.top_y) == (1, 3, 32)
+    assert first.is_under(Rect(70, -18, 20, 50))
+    assert not first.is_under(Rect(70, -17, 20, 50))
+    assert not first.is_under(Rect(100, -18, 20, 50))
+
+
+def test_climb_out_and_stand_on_the_top():
+    tileset_group = make_ladder_level()
+    # halfway up the ladder
+    player = Player(Vector2(70, 50), Vector2(20, 50), None, False)
+    step(player, tileset_group, {'up'}, 60)
+    assert player.rect.bottom == 32
+    assert player.info['on_top_ladder'] and not player.info['on_ladder']
+    # standing on the top, not falling back in
+    step(player, tileset_group, set(), 30)
+    assert player.rect.bottom == 32
+    assert player.info['on_top_ladder']
+    # and climbing back down from it
+    step(player, tileset_group, {'down'}, 5)
+    assert player.info['on_ladder']
+    assert player.rect.bottom > 32
+
+
+def test_land_on_the_top():
+    tileset_group = make_ladder_level()
+    player = Player(Vector2(70, -40), Vector2(20, 50), None, False)
+    step(player, tileset_group, set(), 30)
+    assert player.rect.bottom == 32
+    assert player.info['on_top_ladder'] and player.info['on_ground']
@@ -0,0 +1,57 @@
+# coding=utf-8
+import os
+import pickle
+from Levels import DEMO_LEVEL, random_level_group
+from LevelCache import read_cache, CACHE_VERSION
+from Prototype import compile_tileset_group
+
+
+def tileset_state(tileset_group):
+    return [(bytes(tileset.tile_ids), tileset.get_indexes())
+            for tileset in tileset_group.tileset_list]
+
+
+def cache_files(cache_dir):
+    return [os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+            if name.endswith('.lvc')]
+
+
+def test_hit_and_miss(tmp_path):
+    cache_dir = str(tmp_path)
+    built, cached = compile_tileset_group(DEMO_LEVEL, cache_dir)
+    assert not cached
+    loaded, cached = compile_tileset_group(DEMO_LEVEL, cache_dir)
+    assert cached
+    assert tileset_state(loaded) == tileset_state(built)
+    # another level is another file
+    other, cached = compile_tileset_group(random_level_group(20, 10),
+                                          cache_dir)
+    assert not cached
+    assert len(cache_files(cache_dir)) == 2
+
+
+def test_other_version_is_rebuilt(tmp_path):
+    cache_dir = str(tmp_path)
+    built = compile_tileset_group(DEMO_LEVEL, cache_dir)[0]
+    path, = cache_files(cache_dir)
+    with open(path, 'rb') as cache_file:
+        compiled = pickle.load(cache_file)
+    compiled['version'] = CACHE_VERSION + 1
+    with open(path, 'wb') as cache_file:
+        pickle.dump(compiled, cache_file)
+    assert read_cache(path) is None
+    rebuilt, cached = compile_tileset_group(DEMO_LEVEL, cache_dir)
+    assert not cached
+    assert tileset_state(rebuilt) == tileset_state(built)
+    assert read_cache(path)['version'] == CACHE_VERSION
+    assert compile_tileset_group(DEMO_LEVEL, cache_dir)[1]
+
+
+def test_unreadable_is_a_miss(tmp_path):
+    path = str(tmp_path / 'broken.lvc')
+    assert read_cache(path) is None
+    for content in (b'not a pickle', pickle.dumps([1, 2]),
+                    pickle.dumps({'version': CACHE_VERSION})[:-3]):
+        with open(path, 'wb') as cache_file:
+            cache_file.write(content)
+        assert read_cache(path) is None
@@ -0,0 +1,72 @@
+# coding=utf-8
+import json
+import pytest
+from Levels import DEMO_LEVEL, random_level_group
+from LevelFile import (save_level, load_level, hash_level, import_tiled_json,
+                       import_level, LevelFormatError, LevelLayer, HEADER,
+                       LAYER, ENCODING_RAW, ENCODING_RLE)
+
+
+def read_encodings(path):
+    with open(path, 'rb') as level_file:
+        data = level_file.read()
+    _, _, layer_count = HEADER.unpack_from(data)
+    return [LAYER.unpack_from(data, HEADER.size + i * LAYER.size)[5]
+            for i in range(layer_count)]
+
+
+@pytest.mark.parametrize('rle, encoding', [(False, ENCODING_RAW),
+                                           (True, ENCODING_RLE)])
+def test_round_trip(tmp_path, rle, encoding):
+    level = DEMO_LEVEL + random_level_group(40, 20, seed=2)[:1]
+    path = str(tmp_path / 'level.plvl')
+    save_level(path, level, rle)
+    assert set(read_encodings(path)) == {encoding}
+    loaded = load_level(path)
+    assert hash_level(loaded).digest() == hash_level(level).digest()
+    for (tiles, tile_width, tile_height), (layer, width, height) in zip(
+            level, loaded):
+        assert layer.get_rows() == tiles
+        assert (width, height) == (tile_width, tile_height)
+
+
+def test_hash_tells_levels_apart():
+    level = [([[1, 2], [3, 4]], 32, 32)]
+    assert (hash_level(level).digest() ==
+            hash_level([(LevelLayer.from_rows([[1, 2], [3, 4]]), 32,
+                         32)]).digest())
+    for other in ([([[1, 2], [3, 5]], 32, 32)],
+                  [([[1, 2], [3, 4]], 32, 16)],
+                  [([[1, 2, 3, 4]], 32, 32)]):
+        assert hash_level(other).digest() != hash_level(level).digest()
+
+
+@pytest.mark.parametrize('size', [0, 2, 6])
+def test_bad_rle_body(tmp_path, size):
+    path = str(tmp_path / 'level.plvl')
+    save_level(path, [([[1, 1, 1, 2]], 32, 32)], True)
+    with open(path, 'rb') as level_file:
+        data = bytearray(level_file.read())
+    fields = list(LAYER.unpack_from(data, HEADER.size))
+    fields[5] = ENCODING_RLE
+    fields[7] = size
+    LAYER.pack_into(data, HEADER.size, *fields)
+    with open(path, 'wb') as level_file:
+        level_file.write(data)
+    with pytest.raises(LevelFormatError):
+        load_level(path)
+
+
+def test_tiled_top_layer_first(tmp_path):
+    path = str(tmp_path / 'map.json')
+    with open(path, 'w') as json_file:
+        json.dump({'tilewidth': 32, 'tileheight': 32,
+                   'tilesets': [{'firstgid': 1}],
+                   'layers': [{'type': 'tilelayer', 'width': 2, 'height': 1,
+                               'data': [1, 1]},
+                              {'type': 'tilelayer', 'width': 2, 'height': 1,
+                               'data': [2, 2]}]}, json_file)
+    level = import_tiled_json(path)
+    assert [list(layer.tile_ids) for layer, _, _ in level] == [[2, 2],
+                                                             [1, 1]]
+    assert import_level(path)[0][0].get_rows() == [[2, 2]]
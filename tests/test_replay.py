@@ -0,0 +1,53 @@
+# coding=utf-8
+from Headless import run, default_script
+from Levels import DEMO_LEVEL
+from Prototype import STEP_MS
+from Replay import (InputRecorder, load_replay, MAX_EVENTS, PRESS,
+                    PRESS_SPEED, RELEASE)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'run.prpl')
+    recorder = InputRecorder(DEMO_LEVEL, STEP_MS, checksum_interval=30)
+    recorded = run(600, default_script(), recorder=recorder)
+    recorder.save(path)
+
+    replay = load_replay(path)
+    replay.check_level(DEMO_LEVEL)
+    assert len(replay.steps) == 600
+    assert len(replay.checksums) == 20
+    played = run(len(replay.steps), None, replay=replay)
+    assert played['diverged_at'] is None
+    assert played['rect'] == recorded['rect']
+
+
+def test_divergence_is_caught(tmp_path):
+    path = str(tmp_path / 'run.prpl')
+    recorder = InputRecorder(DEMO_LEVEL, STEP_MS, checksum_interval=30)
+    run(600, default_script(), recorder=recorder)
+    recorder.checksums[5] ^= 1
+    recorder.save(path)
+
+    played = run(600, None, replay=load_replay(path))
+    assert played['diverged_at'] == 180
+
+
+def test_events_past_a_run_are_kept(tmp_path):
+    path = str(tmp_path / 'events.prpl')
+    recorder = InputRecorder(DEMO_LEVEL, STEP_MS)
+    events = (PRESS, RELEASE, PRESS_SPEED, RELEASE) * 2 + (PRESS,)
+    assert len(events) > 2 * MAX_EVENTS
+    recorder.record({'right'}, (0, 0, 20, 50))
+    for event in events:
+        if event == RELEASE:
+            recorder.release()
+        else:
+            recorder.press(event == PRESS_SPEED)
+    recorder.record({'right', 'jump'}, (0, 0, 20, 50))
+    recorder.record({'right', 'jump'}, (0, 0, 20, 50))
+    recorder.save(path)
+
+    replay = load_replay(path)
+    assert replay.steps == [(frozenset({'right'}), ()),
+                            (frozenset({'right', 'jump'}), events),
+                            (frozenset({'right', 'jump'}), ())]
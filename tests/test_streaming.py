@@ -0,0 +1,96 @@
+# coding=utf-8
+import random
+import pytest
+from Geometry.Vector2 import Vector2
+from Backend import Rect
+from Levels import random_level
+from Prototype import TileSet, StreamingTileSet, UNLOADED_TILE
+
+TILE_SIZE = Vector2(32, 32)
+CHUNK_TILES = 8
+LEVEL = random_level(45, 30, slopes=0.05, ladders=0.03, one_way=0.05,
+                     seed=5)
+
+
+def hit_state(hit):
+    if hit is None:
+        return None
+    return (hit.time, hit.normal.x, hit.normal.y, hit.t_type,
+            tuple(hit.tile.tile_coords))
+
+
+def ladder_state(ladder):
+    if ladder is None:
+        return None
+    return ladder.column, ladder.top, ladder.bottom
+
+
+def edge_rects(rng, count):
+    """
+
+    Rects around the chunk edges, most of them across one.
+    """
+    chunk = CHUNK_TILES * TILE_SIZE.x
+    for _ in range(count):
+        x = rng.randrange(1, 45 * 32 // chunk + 1) * chunk
+        y = rng.randrange(1, 30 * 32 // chunk + 1) * chunk
+        yield (Rect(x + rng.randrange(-40, 20), y + rng.randrange(-60, 20),
+                    rng.choice((20, 24, 40)), rng.choice((30, 50))),
+               Vector2(rng.choice((-7.5, -3, 0, 3, 5, 40)),
+                       rng.choice((-16, -2, 0, 0.9, 15, 40))))
+
+
+def check_queries(full, streamed, rng):
+    for rect, velocity in edge_rects(rng, 400):
+        assert (hit_state(streamed.sweep(rect, velocity)) ==
+                hit_state(full.sweep(rect, velocity))), (rect, velocity)
+        assert (ladder_state(streamed.sweep_ladder(rect, velocity)) ==
+                ladder_state(full.sweep_ladder(rect, velocity)))
+        assert (streamed.ground_height(rect.left, rect.right, rect.top,
+                                       rect.bottom + 40) ==
+                full.ground_height(rect.left, rect.right, rect.top,
+                                   rect.bottom + 40))
+
+
+@pytest.mark.parametrize('unloaded', ['block', 'solid'])
+def test_streamed_queries_match(unloaded):
+    full = TileSet(LEVEL, None, TILE_SIZE, 0, False)
+    streamed = StreamingTileSet(LEVEL, None, TILE_SIZE, 0, False,
+                                chunk_tiles=CHUNK_TILES, unloaded=unloaded,
+                                loads_per_stream=100)
+    if unloaded == 'solid':
+        # only what is loaded is the real level
+        streamed.stream([full.rect])
+        assert len(streamed.chunks) == 6 * 4
+    check_queries(full, streamed, random.Random(1))
+    types = ('solid', 'slope', 'ladder')
+    assert streamed.type_mask(types) == full.type_mask(types)
+
+
+def test_edits_survive_eviction():
+    full = TileSet(LEVEL, None, TILE_SIZE, 0, False)
+    streamed = StreamingTileSet(LEVEL, None, TILE_SIZE, 0, False,
+                                chunk_tiles=CHUNK_TILES, budget=0)
+    rng = random.Random(2)
+    for _ in range(30):
+        x, y = rng.randrange(45), rng.randrange(30)
+        tile_id = rng.choice((0, 1, 9, 17, 18))
+        full.set_tile(x, y, tile_id)
+        streamed.set_tile(x, y, tile_id)
+    streamed.stream([Rect(0, 0, 32, 32)])
+    assert streamed.edits
+    check_queries(full, streamed, random.Random(3))
+    types = ('solid', 'one-way', 'slope', 'ladder')
+    assert streamed.type_mask(types) == full.type_mask(types)
+
+
+def test_solid_until_loaded():
+    streamed = StreamingTileSet(LEVEL, None, TILE_SIZE, 0, False,
+                                chunk_tiles=CHUNK_TILES, unloaded='solid',
+                                margin=0)
+    streamed.stream([Rect(0, 0, 32, 32)])
+    assert list(streamed.chunks) == [(0, 0)]
+    assert streamed.get_tile_id(40, 25) == UNLOADED_TILE
+    # a move out of the loaded chunk stops at its edge
+    hit = streamed.sweep(Rect(200, 100, 20, 30), Vector2(100, 0))
+    assert hit.tile.tile_coords.x == CHUNK_TILES
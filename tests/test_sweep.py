@@ -0,0 +1,73 @@
+# coding=utf-8
+from Geometry.Vector2 import Vector2
+from Backend import Rect
+from Helpers import swept_aabb
+from Prototype import TileSet, TileSetsContainer
+
+TILE_SIZE = Vector2(32, 32)
+# tile ids of Prototype.TILE_DEFINITIONS
+SOLID = 1
+# ground from the top of the tile at its left edge down to its bottom at
+# the right edge
+SLOPE_DOWN_RIGHT = 9
+
+
+def make_tileset(rows, priority=0):
+    return TileSet(rows, None, TILE_SIZE, priority, False)
+
+
+def test_swept_aabb():
+    rect = Rect(0, 0, 10, 10)
+    assert swept_aabb(rect, 20, 0, 20, 0, 30, 10) == (0.5, -1, 0)
+    assert swept_aabb(rect, -20, 0, -20, 0, -10, 10) == (0.5, 1, 0)
+    assert swept_aabb(rect, 0, 40, 0, 30, 10, 40) == (0.5, 0, -1)
+    assert swept_aabb(rect, 0, -40, 0, -30, 10, -20) == (0.5, 0, 1)
+    # not reached within the move
+    assert swept_aabb(rect, 5, 0, 20, 0, 30, 10) is None
+    # moving away, or beside it
+    assert swept_aabb(rect, -20, 0, 20, 0, 30, 10) is None
+    assert swept_aabb(rect, 20, 0, 20, 20, 30, 30) is None
+    # already overlapped
+    assert swept_aabb(rect, 20, 0, 5, 0, 30, 10) is None
+
+
+def test_sweep_stops_at_the_first_wall():
+    tileset = make_tileset([[0, 0, 0, SOLID, 0, SOLID],
+                            [SOLID] * 6])
+    hit = tileset.sweep(Rect(10, 2, 20, 30), Vector2(100, 0))
+    assert hit.time == (96 - 30) / 100
+    assert (hit.normal.x, hit.normal.y) == (-1, 0)
+    assert tuple(hit.tile.tile_coords) == (3, 0)
+    hit = tileset.sweep(Rect(10, 2, 20, 30), Vector2(0, 10))
+    assert hit.time == 0
+    assert (hit.normal.x, hit.normal.y) == (0, -1)
+    assert tileset.sweep(Rect(10, 2, 20, 30), Vector2(20, 0)) is None
+
+
+def test_sweep_past_a_slope_finds_the_wall():
+    tileset = make_tileset([[0, 0, 0, 0, 0],
+                            [0, SLOPE_DOWN_RIGHT, 0, SOLID, 0],
+                            [SOLID] * 5])
+    # in the slope's tile but above its ground, which is lower on the right
+    rect = Rect(50, 20, 10, 25)
+    hit = tileset.sweep(rect, Vector2(60, 0))
+    assert hit.t_type == 'solid'
+    assert tuple(hit.tile.tile_coords) == (3, 1)
+    assert hit.time == 0.6
+    # standing on the slope still counts as a contact with it
+    ground = 32 + tileset.get_tile(1, 1).tile_type.floor_under(
+        18, 32, TILE_SIZE)
+    rect = Rect(50, ground - 25, 10, 25)
+    hit = tileset.sweep(rect, Vector2(60, 0))
+    assert hit.t_type == 'slope'
+    assert hit.time == 0
+
+
+def test_container_takes_the_earliest_hit():
+    far = make_tileset([[0, 0, 0, 0, SOLID, 0]], 0)
+    near = make_tileset([[0, 0, SOLID, 0, 0, 0]], 1)
+    group = TileSetsContainer([far, near])
+    hit = group.sweep(Rect(0, 0, 20, 30), Vector2(100, 0))
+    assert tuple(hit.tile.tile_coords) == (2, 0)
+    assert hit.time == (64 - 20) / 100
+    assert group.sweep(Rect(0, 0, 20, 30), Vector2(20, 0)) is None
@@ -0,0 +1,61 @@
+# coding=utf-8
+import random
+import pytest
+from Geometry.Vector2 import Vector2
+from Geometry.Vector2Array import Vector2Array, numpy
+
+
+def random_vectors(rng, count):
+    return [Vector2(rng.uniform(-50, 50), rng.uniform(-50, 50))
+            for _ in range(count)]
+
+
+def as_numpy(vectors):
+    return Vector2Array.from_columns(numpy.array(vectors.x),
+                                     numpy.array(vectors.y))
+
+
+def make_arrays(vectors, columns):
+    array = Vector2Array(vectors)
+    if columns == 'numpy':
+        if numpy is None:
+            pytest.skip("numpy is not installed")
+        array = as_numpy(array)
+    return array
+
+
+def assert_matches(array, vectors):
+    assert len(array) == len(vectors)
+    for i, vector in enumerate(vectors):
+        assert array[i].x == pytest.approx(vector.x)
+        assert array[i].y == pytest.approx(vector.y)
+
+
+@pytest.mark.parametrize('columns', ['array', 'numpy'])
+def test_operations_match_vector2(columns):
+    rng = random.Random(11)
+    vectors = random_vectors(rng, 50)
+    others = random_vectors(rng, 50)
+    offset = Vector2(3.5, -1.25)
+    low = Vector2(-20, -10)
+    high = Vector2(15, 30)
+
+    array = make_arrays(vectors, columns)
+    other_array = make_arrays(others, columns)
+    x, y = array.x, array.y
+    array.add_to(other_array)
+    assert_matches(array, [a.add(b) for a, b in zip(vectors, others)])
+    expected = [a.add(b).add(offset).mul_scalar(0.5).clamp(low, high)
+                for a, b in zip(vectors, others)]
+    array.add_to(offset)
+    array.scale(0.5)
+    array.clamp_into(low, high)
+    assert_matches(array, expected)
+    # in place, the columns are the same objects
+    assert array.x is x and array.y is y
+
+    dots = array.dot(other_array)
+    for dot, a, b in zip(dots, expected, others):
+        assert dot == pytest.approx(a.dot(b))
+    for dot, a in zip(array.dot(offset), expected):
+        assert dot == pytest.approx(a.dot(offset))